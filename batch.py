@@ -0,0 +1,163 @@
+"""
+Headless-Stapelkonvertierung von TRA- nach KML-Dateien.
+
+Dieses Modul darf weder tkinter noch PIL oder requests importieren: es wird
+von ``main.py batch`` auch auf Rechnern ohne Display verwendet.
+"""
+import glob
+import os
+import time
+
+import numpy as np
+
+import exporters
+import geometry
+import kmltiles
+import projections
+import stations
+import timing
+import trackcache
+
+
+def available_cpus():
+    """Anzahl der für diesen Prozess verfügbaren CPU-Kerne."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def collect_inputs(patterns):
+    """
+    Löst Verzeichnisse, Glob-Muster und Dateinamen in eine sortierte Liste von
+    TRA-Dateien auf. Verzeichnisse liefern alle darin enthaltenen *.tra-Dateien.
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.tra")) + glob.glob(os.path.join(pattern, "*.TRA"))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.update(os.path.abspath(p) for p in matches if os.path.isfile(p))
+    return sorted(paths)
+
+
+def output_path(tra_path, out_dir=None, extension=".kml"):
+    """Ausgabedateiname: gleicher Basisname wie die TRA-Datei, wahlweise in ``out_dir``."""
+    base = os.path.splitext(os.path.basename(tra_path))[0] + extension
+    return os.path.join(out_dir or os.path.dirname(tra_path), base)
+
+
+def output_collisions(files, out_dir=None, extension=".kml"):
+    """
+    Eingabedateien, die auf dieselbe Ausgabedatei abgebildet würden (z.B. gleicher
+    Basisname in verschiedenen Verzeichnissen bei gemeinsamem ``out_dir``).
+    Gibt {Ausgabedatei: [TRA-Dateien]} für alle mehrfach belegten Ausgaben zurück.
+    """
+    targets = {}
+    for path in files:
+        target = os.path.normcase(os.path.abspath(output_path(path, out_dir, extension)))
+        targets.setdefault(target, []).append(path)
+    return {target: paths for target, paths in targets.items() if len(paths) > 1}
+
+
+def convert_file(tra_path, zone, out_dir=None, kmz=False, spacing=None, max_error=None, km_range=None,
+                 tiles=False, fmt=None, track_cache=False):
+    """
+    Konvertiert eine einzelne TRA-Datei nach KML (bzw. KMZ) oder in das Exportformat
+    ``fmt`` (siehe exporters). Mit ``spacing`` bzw. ``max_error`` werden die Elemente als
+    Geraden, Bögen und Klothoiden verdichtet, sonst werden die Elementanfänge verbunden.
+    ``km_range`` = (Anfang, Ende) in Metern beschränkt den Export auf diesen Stationsbereich.
+    Mit ``tiles`` wird ein gekachelter KML-Baum mit Regions und NetworkLinks geschrieben
+    (siehe kmltiles). Ohne Verdichtung, Kilometerbereich und Kacheln wird die Datei
+    blockweise gestreamt. Mit ``track_cache`` kommen eingelesene und projizierte Trassen
+    stattdessen aus dem trackcache (und werden dort abgelegt).
+    Gibt (Ausgabedatei, Anzahl Punkte, Dauer in Sekunden) zurück.
+    """
+    start = time.perf_counter()
+    exporter = exporters.get_exporter(fmt or ("kmz" if kmz else "kml"))
+    if tiles and exporter.name not in ("kml", "kmz"):
+        raise ValueError("Gekachelter Export ist nur als KML oder KMZ möglich.")
+    outfile = output_path(tra_path, out_dir, exporter.extension)
+    name = os.path.splitext(os.path.basename(tra_path))[0]
+    cache = trackcache.default_cache() if track_cache else False
+    if spacing or max_error or km_range or tiles:
+        track = trackcache.parse_tra_file(tra_path, cache)
+        element = None
+        if spacing or max_error:
+            samples = geometry.densify_track(track, spacing, max_error)
+            station, y, x, element = samples.station, samples.y, samples.x, samples.element
+        else:
+            station, y, x = track.station, track.rY, track.rX
+        if km_range and len(track):
+            index = stations.StationIndex(track)
+            y, x, station = index.cut(km_range[0], km_range[1], station, y, x, return_station=True)
+            element = index.element_at(station) if len(station) else np.empty(0, dtype=np.int64)
+        if spacing or max_error or km_range:
+            lons, lats = projections.gk_to_wgs84(zone, y, x)
+        else:
+            lons, lats = trackcache.track_wgs84(track, zone, cache)
+        if tiles:
+            count, _ = kmltiles.export_tiled(outfile, [(name, lons, lats, station)], exporter.name == "kmz")
+        else:
+            records = track.data if element is None else exporters.point_records(track, element, station, y, x)
+            count = exporter.export(outfile, exporters.ArraySource(records, lons, lats), name)
+    elif cache:
+        track = trackcache.parse_tra_file(tra_path, cache)
+        lons, lats = trackcache.track_wgs84(track, zone, cache)
+        count = exporter.export(outfile, exporters.ArraySource(track.data, lons, lats), name)
+    else:
+        count = exporter.export(outfile, exporters.TRAFileSource(tra_path, zone), name)
+    if count == 0:
+        if os.path.exists(outfile):
+            os.remove(outfile)
+        raise ValueError("Keine Datensätze in der TRA-Datei.")
+    return outfile, count, time.perf_counter() - start
+
+
+def run_batch(patterns, zone, out_dir=None, jobs=None, kmz=False, spacing=None, max_error=None, km_range=None,
+              tiles=False, fmt=None, track_cache=False):
+    """
+    Konvertiert alle über ``patterns`` gefundenen TRA-Dateien parallel in einem
+    Prozesspool und gibt Zeiten und Fehler je Datei aus.
+    Gibt die Anzahl der fehlgeschlagenen Dateien zurück.
+    """
+    projections.get_gk_crs(zone)  # ungültige Zonen und Formate vor dem Start abweisen
+    exporter = exporters.get_exporter(fmt or ("kmz" if kmz else "kml"))
+
+    files = collect_inputs(patterns)
+    if not files:
+        print("Keine TRA-Dateien gefunden.")
+        return 0
+    collisions = output_collisions(files, out_dir, exporter.extension)
+    if collisions:
+        # Sonst überschreiben sich die Prozesse gegenseitig die Ausgabedatei
+        for target, paths in sorted(collisions.items()):
+            print(f"FEHLER gleiche Ausgabedatei {target}: {', '.join(paths)}")
+        print("Abgebrochen: Eingabedateien mit gleichem Basisnamen brauchen getrennte Ausgabeverzeichnisse.")
+        return sum(len(paths) for paths in collisions.values())
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed  # lädt multiprocessing
+
+    jobs = jobs or available_cpus()
+    print(f"Konvertiere {len(files)} TRA-Datei(en) mit {jobs} Prozess(en)...")
+    start = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(timing.worker_call, convert_file, path, zone, out_dir, kmz, spacing, max_error,
+                               km_range, tiles, fmt, track_cache): path for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                outfile, count, seconds = timing.worker_result(future)
+            except Exception as e:
+                failures += 1
+                print(f"FEHLER {path}: {e}")
+            else:
+                print(f"OK     {path} -> {outfile} ({count} Punkte, {seconds:.3f} s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Fertig: {len(files) - failures} erfolgreich, {failures} fehlgeschlagen, {elapsed:.2f} s gesamt.")
+    return failures
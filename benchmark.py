@@ -0,0 +1,301 @@
+"""
+Benchmarks für Einlesen, Transformation, KML-Export und Kartendarstellung.
+
+Die Eingabedaten werden mit synthtra erzeugt; der WMS-Dienst wird durch eine
+Attrappe ersetzt, die ein leeres PNG liefert. Die Ergebnisse werden als JSON
+geschrieben und können gegen die Grenzwerte in benchmark_thresholds.json geprüft
+werden (Exitcode 1 bei Überschreitung).
+
+Geprüft werden keine absoluten Zeiten, sondern das Verhältnis zu einer NumPy-
+Vergleichslast gleicher Größe, die im selben Lauf gemessen wird. So hängen die
+Grenzwerte nicht von der Geschwindigkeit des Rechners (bzw. CI-Runners) ab.
+
+Zusätzlich wird für die Einstiegsmodule in frischen Interpretern geprüft, dass sie
+keine schweren Abhängigkeiten (pyproj, requests, PIL, tkinter; main auch kein NumPy)
+beim Import mitladen. Die Importzeit der eigenen Module (``python -X importtime``, ohne
+Standardbibliothek und Fremdpakete) wird ebenfalls relativ geprüft: gegen die Importzeit
+einiger Module der Standardbibliothek (REFERENCE_IMPORTS), gemessen im selben Lauf.
+
+    python benchmark.py [--sizes 1000 32768 262144] [--repeat 5]
+                        [--output benchmark_results.json] [--check benchmark_thresholds.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import exporters
+import geometry
+import kmlexport
+import overlay
+import parseTRAFile
+import projections
+import simplify
+import synthtra
+import trackcache
+import wmscache
+
+DEFAULT_SIZES = [1000, 32768, 262144]
+DEFAULT_ZONE = "3"
+MAP_WIDTH = 1200
+MAP_HEIGHT = 800
+
+# Einstiegsmodule für die Startzeitmessung und Module, die sie beim Import nicht laden dürfen
+STARTUP_MODULES = ["parseTRAFile", "kmlexport", "batch", "main"]
+HEAVY_MODULES = ["pyproj", "requests", "PIL", "tkinter"]
+LAZY_IMPORTS = {
+    "parseTRAFile": HEAVY_MODULES,
+    "kmlexport": HEAVY_MODULES,
+    "batch": HEAVY_MODULES + ["multiprocessing"],
+    "main": HEAVY_MODULES + ["numpy"],
+}
+
+# Vergleichslast der Startzeitmessung: Importe aus der Standardbibliothek
+REFERENCE_IMPORTS = ["argparse", "json", "decimal", "email.parser", "http.client", "xml.etree.ElementTree"]
+
+
+class StubResponse:
+    headers = {"Content-Type": "image/png"}
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class StubSession:
+    """Ersetzt requests.Session: liefert für jede Anfrage dasselbe leere PNG."""
+
+    def __init__(self, width=MAP_WIDTH, height=MAP_HEIGHT):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new("RGBA", (width, height), (255, 255, 255, 255)).save(buffer, "PNG")
+        self.content = buffer.getvalue()
+
+    def get(self, url, params=None, timeout=None):
+        return StubResponse(self.content)
+
+
+def median_time(func, repeat):
+    """Median der Laufzeiten von ``repeat`` Aufrufen in Sekunden."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def reference_workload(y, x):
+    """Vergleichslast: elementweise NumPy-Arithmetik über die Koordinaten (Maßstab für den Rechner)."""
+    return float(np.hypot(np.sin(y * 1e-6), np.cos(x * 1e-6)).sum())
+
+
+def run_size(count, workdir, repeat):
+    """Führt alle Benchmarks für ein synthetisches Netz mit ``count`` Datensätzen aus."""
+    paths = synthtra.write_tra_network(os.path.join(workdir, f"n{count}"), count)
+
+    def parse():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return [parseTRAFile.parse_tra_track(p) for p in paths]
+
+    tracks = parse()
+    data = np.concatenate([t.data for t in tracks])
+    lons, lats = projections.gk_to_wgs84(DEFAULT_ZONE, data['rY'], data['rX'])
+    kml_path = os.path.join(workdir, "out.kml")
+    export_path = os.path.join(workdir, "out")
+
+    # Zwischenspeicher vorbelegen; gemessen wird der wiederholte Ladevorgang samt WGS84
+    cache = trackcache.TrackCache(os.path.join(workdir, f"cache{count}"))
+
+    def cached_load():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for p in paths:
+                trackcache.track_wgs84(trackcache.parse_tra_file(p, cache), DEFAULT_ZONE, cache)
+
+    cached_load()
+
+    # Karte: Ausschnitt über die ganze Trasse, Grundkarte über die WMS-Attrappe
+    bbox = (float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max()))
+    wms = wmscache.WMSCache(base_url="http://stub.invalid/wms", max_disk_bytes=0, session=StubSession())
+    lod = simplify.LODPyramid(lons, lats, 1e-6)
+    selected = np.ones(len(lons), dtype=bool)
+    selected[len(selected) // 3: len(selected) // 2] = False
+
+    def render():
+        wms.clear_memory()
+        base = wms.get_map(bbox, MAP_WIDTH, MAP_HEIGHT).convert("RGBA")
+        overlay.compose_map(base, overlay.render_overlay(lod, selected, bbox, MAP_WIDTH, MAP_HEIGHT))
+
+    y, x = np.ascontiguousarray(data['rY']), np.ascontiguousarray(data['rX'])
+    reference_seconds = median_time(lambda: reference_workload(y, x), max(repeat, 5))
+    print(f"{'reference':17s} {count:>10d} Datensätze  {reference_seconds * 1000:10.2f} ms")
+
+    benchmarks = {
+        "parse": parse,
+        "cached_load": cached_load,
+        "transform": lambda: projections.gk_to_wgs84(DEFAULT_ZONE, data['rY'], data['rX']),
+        "preview_transform": lambda: projections.gk_to_wgs84_preview(DEFAULT_ZONE, data['rY'], data['rX']),
+        "kml_export": lambda: kmlexport.export_track(kml_path, lons, lats, selected),
+        "geojson_export": lambda: exporters.export_arrays(export_path + ".geojson", data, lons, lats, selected),
+        "csv_export": lambda: exporters.export_arrays(export_path + ".csv", data, lons, lats, selected),
+        "npy_export": lambda: exporters.export_arrays(export_path + ".npy", data, lons, lats, selected),
+        "densify": lambda: geometry.Alignment(data).densify(geometry.DEFAULT_SPACING),
+        "lod_build": lambda: simplify.LODPyramid(lons, lats, 1e-6),
+        "overlay_render": render,
+    }
+    results = []
+    for name, func in benchmarks.items():
+        seconds = median_time(func, repeat)
+        results.append({
+            "benchmark": name,
+            "records": count,
+            "seconds": seconds,
+            "us_per_record": seconds / count * 1e6,
+            "relative": seconds / reference_seconds,
+        })
+        print(f"{name:17s} {count:>10d} Datensätze  {seconds * 1000:10.2f} ms  "
+              f"{seconds / count * 1e6:8.3f} µs/Datensatz  {seconds / reference_seconds:8.2f}× Vergleichslast")
+    return results
+
+
+def own_modules():
+    """Namen der Module dieses Programms (die .py-Dateien neben benchmark.py)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return {name[:-3] for name in os.listdir(here) if name.endswith(".py")}
+
+
+def own_import_ms(importtime_log, modules=None):
+    """
+    Summe der Eigenzeiten (ms) der Module ``modules`` (alle bei None) aus der Ausgabe von
+    ``python -X importtime``.
+    """
+    total_us = 0
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Kopfzeile
+        if modules is None or fields[2].strip().split(".")[0] in modules:
+            total_us += int(fields[0])
+    return total_us / 1000
+
+
+def reference_import_ms(repeat):
+    """Median der Importzeit von REFERENCE_IMPORTS (alle dabei geladenen Module) in frischen Interpretern."""
+    code = f"import {', '.join(REFERENCE_IMPORTS)}"
+    times = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], check=True,
+                              capture_output=True, text=True)
+        times.append(own_import_ms(proc.stderr))
+    return float(np.median(times))
+
+
+def run_startup(repeat):
+    """
+    Importiert jedes Modul aus STARTUP_MODULES in einem frischen Interpreter, listet die
+    dabei mitgeladenen Module aus LAZY_IMPORTS auf und misst die Importzeit der eigenen
+    Module (Median der Eigenzeiten laut ``-X importtime``; NumPy und Standardbibliothek
+    zählen nicht mit), auch im Verhältnis zur Vergleichslast aus reference_import_ms.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    modules = own_modules()
+    reference_ms = reference_import_ms(max(repeat, 5))
+    print(f"import {'reference':15s} {reference_ms:10.2f} ms")
+    results = []
+    for module in STARTUP_MODULES:
+        forbidden = LAZY_IMPORTS.get(module, HEAVY_MODULES)
+        code = (f"import sys, {module}; "
+                f"print(','.join(m for m in {forbidden!r} if m in sys.modules))")
+        times = []
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=here, check=True,
+                                  capture_output=True, text=True)
+            times.append(own_import_ms(proc.stderr, modules))
+        loaded = [m for m in proc.stdout.strip().split(",") if m]
+        ms = float(np.median(times))
+        results.append({"benchmark": "import", "module": module, "ms": ms, "relative": ms / reference_ms,
+                        "heavy_modules": loaded})
+        print(f"import {module:15s} {ms:10.2f} ms  {ms / reference_ms:8.3f}× Vergleichslast"
+              + (f"  lädt {', '.join(loaded)}" if loaded else ""))
+    return results
+
+
+def check_thresholds(results, thresholds):
+    """
+    Vergleicht die Ergebnisse mit den Grenzwerten (Vielfaches der Vergleichslast) und gibt
+    die Liste der Überschreitungen zurück. Kleine Läufe unter ``min_records`` werden nicht
+    geprüft, weil dort Fixkosten dominieren. Bei den Importen darf kein Modul aus
+    LAZY_IMPORTS mitgeladen werden, und die Importzeit der eigenen Module darf das
+    Vielfache aus ``max_import_relative`` nicht überschreiten.
+    """
+    min_records = thresholds.get("min_records", 0)
+    limits = thresholds.get("max_relative", {})
+    import_limits = thresholds.get("max_import_relative", {})
+    failures = []
+    for result in results:
+        if result["benchmark"] == "import":
+            if result["heavy_modules"]:
+                failures.append(f"import {result['module']} lädt {', '.join(result['heavy_modules'])}")
+            limit = import_limits.get(result["module"])
+            if limit is not None and result["relative"] > limit:
+                failures.append(f"import {result['module']}: {result['ms']:.2f} ms, "
+                                f"{result['relative']:.3f}× Vergleichslast > Grenzwert {limit}")
+            continue
+        limit = limits.get(result["benchmark"])
+        if limit is None or result["records"] < min_records:
+            continue
+        if result["relative"] > limit:
+            failures.append(f"{result['benchmark']} ({result['records']} Datensätze): "
+                            f"{result['relative']:.2f}× Vergleichslast > Grenzwert {limit}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TRAtoKML-Benchmarks mit synthetischen TRA-Dateien")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Anzahl Datensätze je Lauf (größer als eine Datei: mehrere Dateien)")
+    parser.add_argument("--repeat", type=int, default=5, help="Wiederholungen je Benchmark (Median zählt)")
+    parser.add_argument("--output", default="benchmark_results.json", help="Ergebnisdatei (JSON)")
+    parser.add_argument("--check", metavar="THRESHOLDS", help="Grenzwertdatei (JSON) prüfen")
+    args = parser.parse_args(argv)
+
+    results = run_startup(args.repeat)
+    with tempfile.TemporaryDirectory(prefix="tratokml-bench-") as workdir:
+        for count in args.sizes:
+            results.extend(run_size(count, workdir, args.repeat))
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Ergebnisse geschrieben: {args.output}")
+
+    if args.check:
+        with open(args.check, encoding="utf-8") as f:
+            failures = check_thresholds(results, json.load(f))
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
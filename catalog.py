@@ -0,0 +1,196 @@
+"""
+Katalog vieler TRA-Dateien in einer lokalen SQLite-Datenbank.
+
+Je Datei werden Anzahl der Datensätze (aus dem Header), GK-Bounding-Box, Stationsbereich,
+Häufigkeit der Elementtypen (nKz) und Inhaltshash gespeichert. Die Werte werden direkt
+aus der per mmap abgebildeten Datei berechnet, ohne Datensätze einzeln zu parsen.
+Beim erneuten Aufbau werden nur Dateien mit geänderter Änderungszeit oder Größe neu
+gelesen; gelöschte Dateien fallen heraus.
+
+Abfragen nach Bounding Box und Stationsbereich laufen über Indizes der Datenbank.
+"""
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+import batch
+import parseTRAFile
+import trackcache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path        TEXT PRIMARY KEY,
+    mtime_ns    INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    digest      TEXT NOT NULL,
+    records     INTEGER NOT NULL,
+    zone        TEXT,
+    min_y       REAL,
+    min_x       REAL,
+    max_y       REAL,
+    max_x       REAL,
+    min_station REAL,
+    max_station REAL,
+    elements    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_y ON files (min_y, max_y);
+CREATE INDEX IF NOT EXISTS files_x ON files (min_x, max_x);
+CREATE INDEX IF NOT EXISTS files_station ON files (min_station, max_station);
+"""
+
+COLUMNS = ("path", "mtime_ns", "size", "digest", "records", "zone", "min_y", "min_x", "max_y", "max_x",
+           "min_station", "max_station", "elements")
+
+
+def default_catalog_path():
+    """Katalogdatei: $TRATOKML_CACHE_DIR/catalog.sqlite oder im Benutzer-Cacheverzeichnis."""
+    if os.environ.get("TRATOKML_CACHE_DIR"):
+        return os.path.join(os.environ["TRATOKML_CACHE_DIR"], "catalog.sqlite")
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "TRAtoKML", "catalog.sqlite")
+
+
+def zone_from_easting(rY):
+    """GK-Zone aus der Kennziffer des Rechtswerts (z.B. 3 500 000 -> '3'), sonst None."""
+    zone = str(int(rY // 1000000))
+    return zone if zone in ("2", "3", "4", "5") else None
+
+
+def file_metadata(path):
+    """
+    Berechnet die Katalogwerte einer TRA-Datei als Dictionary (Spalten wie COLUMNS).
+    Koordinaten und Stationen werden als Spalten der mmap-Abbildung ausgewertet.
+    """
+    st = os.stat(path)
+    header, records = parseTRAFile.map_tra_records(path)
+    if header is None:
+        raise ValueError("Datei zu kurz für einen Header-Datensatz.")
+    meta = {
+        "path": path,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "digest": trackcache.file_digest(path),
+        "records": len(records),
+        "zone": None,
+        "min_y": None, "min_x": None, "max_y": None, "max_x": None,
+        "min_station": None, "max_station": None,
+        "elements": "{}",
+    }
+    if len(records):
+        y, x, s = records['rY'], records['rX'], records['rS']
+        meta.update(min_y=float(y.min()), max_y=float(y.max()), min_x=float(x.min()), max_x=float(x.max()),
+                    min_station=float(s.min()), max_station=float(s.max()),
+                    zone=zone_from_easting(float(y.min())))
+        kinds, counts = np.unique(records['nKz'], return_counts=True)
+        meta["elements"] = json.dumps({str(k): int(c) for k, c in zip(kinds.tolist(), counts.tolist())})
+    return meta
+
+
+class Catalog:
+    """SQLite-Katalog (``path`` = Datenbankdatei) mit inkrementellem Aufbau und Abfragen."""
+
+    def __init__(self, path=None):
+        self.path = path or default_catalog_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def update(self, patterns):
+        """
+        Nimmt alle über ``patterns`` gefundenen TRA-Dateien auf bzw. aktualisiert sie,
+        wenn sich Änderungszeit oder Größe geändert haben, und entfernt Einträge
+        nicht mehr vorhandener Dateien. Gibt (neu/geändert, unverändert, Fehler, entfernt) zurück.
+        """
+        known = {row["path"]: (row["mtime_ns"], row["size"])
+                 for row in self.db.execute("SELECT path, mtime_ns, size FROM files")}
+        changed = unchanged = failed = 0
+        with self.db:
+            for path in batch.collect_inputs(patterns):
+                try:
+                    st = os.stat(path)
+                    if known.get(path) == (st.st_mtime_ns, st.st_size):
+                        unchanged += 1
+                        continue
+                    meta = file_metadata(path)
+                except (OSError, ValueError) as e:
+                    print(f"FEHLER {path}: {e}")
+                    failed += 1
+                    continue
+                self.db.execute(f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) "
+                                f"VALUES ({', '.join('?' * len(COLUMNS))})", [meta[c] for c in COLUMNS])
+                changed += 1
+            removed = [p for p in known if not os.path.exists(p)]
+            self.db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in removed])
+        return changed, unchanged, failed, len(removed)
+
+    def query(self, bbox=None, station_range=None, zone=None):
+        """
+        Dateien, deren GK-Bounding-Box ``bbox`` = (min_y, min_x, max_y, max_x) schneidet
+        und/oder deren Stationsbereich ``station_range`` = (Anfang, Ende) in Metern
+        überlappt, optional nur in GK-Zone ``zone``. Gibt eine Liste von sqlite3.Row zurück.
+        """
+        where, params = [], []
+        if bbox is not None:
+            min_y, min_x, max_y, max_x = bbox
+            where.append("max_y >= ? AND min_y <= ? AND max_x >= ? AND min_x <= ?")
+            params += [min_y, max_y, min_x, max_x]
+        if station_range is not None:
+            where.append("max_station >= ? AND min_station <= ?")
+            params += [station_range[0], station_range[1]]
+        if zone is not None:
+            where.append("zone = ?")
+            params.append(str(zone))
+        sql = "SELECT * FROM files"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self.db.execute(sql + " ORDER BY path", params).fetchall()
+
+
+def format_row(row):
+    """Einzeilige Beschreibung eines Katalogeintrags für die Ausgabe."""
+    if row["records"] and row["min_station"] is not None:
+        stations = f"km {row['min_station'] / 1000:.3f}–{row['max_station'] / 1000:.3f}"
+    else:
+        stations = "leer"
+    return f"{row['path']}  ({row['records']} Datensätze, {stations}, Zone {row['zone'] or '?'})"
+
+
+def run_build(patterns, db_path=None):
+    start = time.perf_counter()
+    with Catalog(db_path) as catalog:
+        changed, unchanged, failed, removed = catalog.update(patterns)
+        print(f"Katalog {catalog.path}: {changed} neu/geändert, {unchanged} unverändert, "
+              f"{failed} fehlerhaft, {removed} entfernt, {len(catalog)} Dateien gesamt "
+              f"({time.perf_counter() - start:.2f} s).")
+    return failed
+
+
+def run_query(db_path=None, bbox=None, station_range=None, zone=None):
+    with Catalog(db_path) as catalog:
+        start = time.perf_counter()
+        rows = catalog.query(bbox, station_range, zone)
+        elapsed = time.perf_counter() - start
+        for row in rows:
+            print(format_row(row))
+        print(f"{len(rows)} Treffer ({elapsed * 1000:.1f} ms).")
+    return 0
@@ -0,0 +1,114 @@
+"""
+Dateiauswahl über den TRA-Katalog (siehe catalog.py).
+
+Zeigt die Katalogeinträge gefiltert nach Kilometerbereich, GK-Zone und optional dem
+aktuellen Kartenausschnitt; die gewählten Dateien werden an ``on_open`` übergeben.
+"""
+import os
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+import catalog
+import stations
+
+
+class CatalogDialog(tk.Toplevel):
+    """
+    Auswahlfenster über einem catalog.Catalog.
+
+    ``zone`` liefert die aktuell gewählte GK-Zone, ``view_bbox`` die GK-Bounding-Box
+    des Kartenausschnitts (oder None); ``on_open(paths)`` wird mit den gewählten
+    Dateien aufgerufen.
+    """
+
+    def __init__(self, master, on_open, zone=None, view_bbox=None, db_path=None):
+        super().__init__(master)
+        self.title("TRA-Katalog")
+        self.on_open = on_open
+        self.zone = zone
+        self.view_bbox = view_bbox
+        self.catalog = catalog.Catalog(db_path)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        top = ttk.Frame(self)
+        top.pack(fill='x', padx=10, pady=5)
+        self.info = ttk.Label(top, text="")
+        self.info.pack(side=tk.LEFT)
+        ttk.Button(top, text="Verzeichnis aufnehmen...", command=self.add_directory).pack(side=tk.RIGHT)
+
+        filters = ttk.Frame(self)
+        filters.pack(fill='x', padx=10, pady=5)
+        ttk.Label(filters, text="km:").pack(side=tk.LEFT, padx=2)
+        self.km_var = tk.StringVar()
+        entry = ttk.Entry(filters, textvariable=self.km_var, width=16)
+        entry.pack(side=tk.LEFT, padx=2)
+        entry.bind("<Return>", lambda event: self.refresh())
+        self.view_var = tk.BooleanVar(value=False)
+        view_cb = ttk.Checkbutton(filters, text="Nur aktueller Kartenausschnitt", variable=self.view_var,
+                                  command=self.refresh)
+        view_cb.pack(side=tk.LEFT, padx=10)
+        if view_bbox is None:
+            view_cb.config(state='disabled')
+        ttk.Button(filters, text="Suchen", command=self.refresh).pack(side=tk.LEFT, padx=2)
+
+        columns = ("records", "km_from", "km_to", "zone")
+        self.tree = ttk.Treeview(self, columns=columns, selectmode='extended', height=20)
+        self.tree.heading("#0", text="Datei")
+        self.tree.column("#0", width=380)
+        for col, text, width in (("records", "Datensätze", 90), ("km_from", "km von", 90),
+                                 ("km_to", "km bis", 90), ("zone", "Zone", 50)):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=width, anchor='e')
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.tree.bind("<Double-1>", lambda event: self.open_selected())
+
+        buttons = ttk.Frame(self)
+        buttons.pack(fill='x', padx=10, pady=(0, 10))
+        ttk.Button(buttons, text="Öffnen (mehrere: Netzansicht)", command=self.open_selected).pack(side=tk.RIGHT)
+        ttk.Button(buttons, text="Alle Treffer öffnen", command=self.open_all).pack(side=tk.RIGHT, padx=5)
+
+        self.refresh()
+
+    def close(self):
+        self.catalog.close()
+        self.destroy()
+
+    def add_directory(self):
+        directory = filedialog.askdirectory(title="Verzeichnis mit TRA-Dateien", parent=self)
+        if not directory:
+            return
+        changed, unchanged, failed, removed = self.catalog.update([directory])
+        if failed:
+            messagebox.showwarning("Katalog", f"{failed} Datei(en) konnten nicht gelesen werden.", parent=self)
+        self.refresh()
+
+    def refresh(self):
+        km_text = self.km_var.get().strip()
+        try:
+            station_range = stations.parse_km_range(km_text) if km_text else None
+        except ValueError as e:
+            messagebox.showerror("Fehler", str(e), parent=self)
+            return
+        bbox = self.view_bbox() if self.view_var.get() and self.view_bbox else None
+        zone = self.zone() if self.zone else None
+
+        rows = self.catalog.query(bbox, station_range, zone or None)
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            if row["min_station"] is None:
+                km_from = km_to = ""
+            else:
+                km_from, km_to = f"{row['min_station'] / 1000:.3f}", f"{row['max_station'] / 1000:.3f}"
+            self.tree.insert("", "end", iid=row["path"], text=os.path.basename(row["path"]),
+                             values=(row["records"], km_from, km_to, row["zone"] or ""))
+        self.info.config(text=f"{len(rows)} von {len(self.catalog)} Dateien  ({self.catalog.path})")
+
+    def open_selected(self):
+        paths = list(self.tree.selection())
+        if paths:
+            self.on_open(paths)
+
+    def open_all(self):
+        paths = list(self.tree.get_children())
+        if paths:
+            self.on_open(paths)
@@ -0,0 +1,306 @@
+"""
+Austauschbare Exportformate für Trassen.
+
+Alle Formate werden aus derselben Quelle gespeist: Blöcken aus TRA-Datensätzen
+(Structured Array mit TRA_DTYPE) und den zugehörigen WGS84-Koordinaten. Eine Quelle
+ist entweder ein Satz bereits eingelesener und projizierter Arrays (ArraySource) oder
+eine TRA-Datei, die blockweise per mmap gelesen und projiziert wird (TRAFileSource).
+Jedes Format schreibt blockweise; der Speicherbedarf hängt nur von der Blockgröße ab.
+Geschrieben wird in eine temporäre Datei, die erst nach Erfolg umbenannt wird; bei einem
+Fehler bleibt keine halbe Ausgabe zurück.
+
+    kml, kmz   KML-Dokument wie bisher (kmlexport)
+    geojson    FeatureCollection mit einem LineString
+    ndjson     GeoJSON-Zeilen: ein Point-Feature je Datensatz mit allen TRA-Feldern
+    csv        alle 11 TRA-Felder und lon/lat je Datensatz
+    npy        NumPy-Datei (Little Endian) mit TRA-Feldern und lon/lat, per np.load(mmap_mode='r') lesbar
+"""
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+import kmlexport
+import parseTRAFile
+import projections
+import timing
+
+CHUNK_SIZE = kmlexport.COORDINATE_CHUNK_SIZE
+
+# Datensatz der npy-Ausgabe: TRA-Felder gefolgt von lon/lat
+EXPORT_DTYPE = np.dtype(parseTRAFile.TRA_DTYPE.descr + [('lon', '<f8'), ('lat', '<f8')])
+
+CSV_HEADER = ",".join(EXPORT_DTYPE.names) + "\n"
+
+
+def point_records(track, element, station, y, x):
+    """
+    TRA-Datensätze für beliebige Punkte auf der Trasse (z.B. verdichtete Samples oder
+    Schnittpunkte eines Kilometerbereichs): Felder des Elements ``element``, dazu Station
+    und Koordinaten des Punkts.
+    """
+    records = track.data[np.asarray(element, dtype=np.int64)]
+    records['rS'] = station
+    records['rY'] = y
+    records['rX'] = x
+    return records
+
+
+class ArraySource:
+    """
+    Eingelesene und projizierte Arrays: ``records`` (TRA_DTYPE) und ``lons``/``lats`` gleicher
+    Länge. Mit der booleschen Maske ``selected`` liefert chunks() nur die ausgewählten Punkte.
+    """
+
+    def __init__(self, records, lons, lats, selected=None, chunk_size=CHUNK_SIZE):
+        self.records = records
+        self.lons = lons
+        self.lats = lats
+        self.selected = selected
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return len(self.lons) if self.selected is None else int(np.count_nonzero(self.selected))
+
+    def chunks(self, selected_only=True):
+        """Blöcke (records, lons, lats); mit ``selected_only`` nur die ausgewählten Punkte."""
+        mask = self.selected if selected_only else None
+        for start in range(0, len(self.lons), self.chunk_size):
+            stop = start + self.chunk_size
+            records = self.records[start:stop]
+            lons, lats = self.lons[start:stop], self.lats[start:stop]
+            if mask is not None:
+                keep = mask[start:stop]
+                records, lons, lats = records[keep], lons[keep], lats[keep]
+            yield records, lons, lats
+
+
+class TRAFileSource:
+    """TRA-Datei, blockweise per mmap gelesen und je Block nach WGS84 (GK-Zone ``zone``) projiziert."""
+
+    selected = None  # keine Auswahl: chunks() liefert immer die ganze Datei
+
+    def __init__(self, tra_path, zone, chunk_size=parseTRAFile.DEFAULT_CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError(f"Ungültige Blockgröße: {chunk_size}")
+        self.tra_path = tra_path
+        self.zone = zone
+        self.chunk_size = chunk_size
+        # Einmal abbilden: Kopf und Hinweise (z.B. abgeschnittene Datei) nur einmal je Export
+        self.records = parseTRAFile.map_tra_records(tra_path)[1]
+
+    def __len__(self):
+        return len(self.records)
+
+    def chunks(self, selected_only=True):
+        for start in range(0, len(self.records), self.chunk_size):
+            records = self.records[start:start + self.chunk_size]
+            lons, lats = projections.gk_to_wgs84(self.zone, records['rY'], records['rX'])
+            yield records, lons, lats
+
+
+def _json_number(value):
+    """JSON-Zahl ohne Genauigkeitsverlust; NaN und Unendlich werden zu null."""
+    return repr(value) if math.isfinite(value) else "null"
+
+
+class Exporter:
+    """
+    Basisklasse eines Formats. Unterklassen setzen ``name``, ``extension``, ``description``
+    und ``content_type`` und implementieren write(outfile, source, name).
+    """
+    name = None
+    extension = None
+    description = None
+    content_type = "application/octet-stream"
+    stage = None
+
+    def write(self, outfile, source, name):
+        raise NotImplementedError
+
+    def export(self, outfile, source, name="Trasse"):
+        """
+        Schreibt ``source`` nach ``outfile`` (über eine temporäre Datei, die erst nach
+        Erfolg umbenannt wird) und gibt die Anzahl der Punkte zurück.
+        """
+        tmp_path = f"{outfile}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with timing.stage(self.stage or f"{self.name}_export") as st:
+            try:
+                count = self.write(tmp_path, source, name)
+                os.replace(tmp_path, outfile)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            st.add(points=count)
+        return count
+
+
+class KMLExporter(Exporter):
+    """KML bzw. KMZ mit "Ausgewählte Trasse" und "Gesamte Trasse" (siehe kmlexport)."""
+    name = "kml"
+    extension = ".kml"
+    description = "KML-Datei"
+    content_type = "application/vnd.google-earth.kml+xml"
+    stage = "kml_export"
+    kmz = False
+
+    def write(self, outfile, source, name):
+        def coordinates(selected_only):
+            return ((lons, lats) for _, lons, lats in source.chunks(selected_only))
+
+        with kmlexport.open_output(outfile, self.kmz) as f:
+            if source.selected is None:
+                # Ohne Auswahl sind beide Placemarks gleich: nur einmal lesen und projizieren
+                return kmlexport.write_kml_whole(f, coordinates(False))
+            return kmlexport.write_kml(f, coordinates(True), coordinates(False))
+
+
+class KMZExporter(KMLExporter):
+    name = "kmz"
+    extension = ".kmz"
+    description = "KMZ-Datei (komprimiert)"
+    content_type = "application/vnd.google-earth.kmz"
+    kmz = True
+
+
+class GeoJSONExporter(Exporter):
+    """FeatureCollection mit einem LineString über alle (ausgewählten) Punkte."""
+    name = "geojson"
+    extension = ".geojson"
+    description = "GeoJSON"
+    content_type = "application/geo+json"
+
+    def write(self, outfile, source, name):
+        with open(outfile, "w", encoding="utf-8", buffering=kmlexport.WRITE_BUFFER_SIZE) as f:
+            properties = json.dumps({"name": name, "points": len(source)}, ensure_ascii=False)
+            f.write('{"type": "FeatureCollection", "features": [{"type": "Feature", '
+                    f'"properties": {properties}, "geometry": {{"type": "LineString", "coordinates": [')
+            count = 0
+            for _, lons, lats in source.chunks():
+                text = ", ".join(f"[{_json_number(lon)}, {_json_number(lat)}]"
+                                 for lon, lat in zip(lons.tolist(), lats.tolist()))
+                if not text:
+                    continue
+                if count:
+                    f.write(", ")
+                f.write(text)
+                count += len(lons)
+            f.write("]}}]}\n")
+        return count
+
+
+class NDJSONExporter(Exporter):
+    """Eine Zeile je Datensatz: GeoJSON-Point-Feature mit allen TRA-Feldern als Eigenschaften."""
+    name = "ndjson"
+    extension = ".ndjson"
+    description = "GeoJSON-Zeilen (NDJSON)"
+    content_type = "application/x-ndjson"
+
+    def write(self, outfile, source, name):
+        fields = parseTRAFile.TRA_DTYPE.names
+        keys = [json.dumps(field) for field in fields]
+        count = 0
+        with open(outfile, "w", encoding="utf-8", buffering=kmlexport.WRITE_BUFFER_SIZE) as f:
+            for records, lons, lats in source.chunks():
+                lines = []
+                for values, lon, lat in zip(records.tolist(), lons.tolist(), lats.tolist()):
+                    properties = ", ".join(f"{key}: {_json_number(value)}" for key, value in zip(keys, values))
+                    lines.append('{"type": "Feature", "geometry": {"type": "Point", "coordinates": '
+                                 f'[{_json_number(lon)}, {_json_number(lat)}]}}, "properties": {{{properties}}}}}\n')
+                f.write("".join(lines))
+                count += len(lons)
+        return count
+
+
+class CSVExporter(Exporter):
+    """Kommagetrennt mit Kopfzeile: alle 11 TRA-Felder und lon/lat, Zahlen ohne Rundung."""
+    name = "csv"
+    extension = ".csv"
+    description = "CSV-Datei"
+    content_type = "text/csv"
+
+    def write(self, outfile, source, name):
+        count = 0
+        with open(outfile, "w", encoding="utf-8", newline="", buffering=kmlexport.WRITE_BUFFER_SIZE) as f:
+            f.write(CSV_HEADER)
+            for records, lons, lats in source.chunks():
+                if not len(lons):
+                    continue
+                # Spaltenweise formatieren (repr: kürzeste verlustfreie Darstellung), dann zeilenweise verbinden
+                columns = [list(map(repr, records[field].tolist())) for field in parseTRAFile.TRA_DTYPE.names]
+                columns += [list(map(repr, lons.tolist())), list(map(repr, lats.tolist()))]
+                f.write("\n".join(map(",".join, zip(*columns))) + "\n")
+                count += len(lons)
+        return count
+
+
+class NPYExporter(Exporter):
+    """
+    NumPy-Datei (.npy, Little Endian) mit EXPORT_DTYPE: unverändert gespeicherte Werte,
+    ohne Textumwandlung wieder einlesbar (``np.load(path, mmap_mode='r')['rY']``).
+    """
+    name = "npy"
+    extension = ".npy"
+    description = "NumPy-Datei (binär)"
+
+    def write(self, outfile, source, name):
+        expected = len(source)
+        count = 0
+        with open(outfile, "wb", buffering=kmlexport.WRITE_BUFFER_SIZE) as f:
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(EXPORT_DTYPE),
+                "fortran_order": False,
+                "shape": (expected,),
+            })
+            for records, lons, lats in source.chunks():
+                block = np.empty(len(lons), dtype=EXPORT_DTYPE)
+                for field in parseTRAFile.TRA_DTYPE.names:
+                    block[field] = records[field]
+                block['lon'] = lons
+                block['lat'] = lats
+                f.write(block.tobytes())
+                count += len(block)
+        if count != expected:
+            raise ValueError(f"Anzahl der Punkte ({count}) weicht vom Dateikopf ({expected}) ab.")
+        return count
+
+
+EXPORTERS = {cls.name: cls() for cls in (KMLExporter, KMZExporter, GeoJSONExporter, NDJSONExporter,
+                                         CSVExporter, NPYExporter)}
+
+
+def get_exporter(name):
+    try:
+        return EXPORTERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unbekanntes Exportformat: {name}. Möglich: {', '.join(EXPORTERS)}")
+
+
+def exporter_for_path(outfile, default="kml"):
+    """Exportformat nach der Dateiendung von ``outfile`` (unbekannte Endungen: ``default``)."""
+    lower = str(outfile).lower()
+    for exporter in EXPORTERS.values():
+        if lower.endswith(exporter.extension):
+            return exporter
+    return EXPORTERS[default]
+
+
+def is_kml(name):
+    return get_exporter(name).name in ("kml", "kmz")
+
+
+def export_arrays(outfile, records, lons, lats, selected=None, fmt=None, name="Trasse"):
+    """
+    Exportiert eingelesene und projizierte Arrays im Format ``fmt`` (Standard: nach
+    Dateiendung). Gibt die Anzahl der Punkte zurück (bei KML: der gesamten Trasse).
+    """
+    exporter = get_exporter(fmt) if fmt else exporter_for_path(outfile)
+    return exporter.export(outfile, ArraySource(records, lons, lats, selected), name)
+
+
+def export_tra_file(tra_path, zone, outfile, fmt=None, name="Trasse", chunk_size=parseTRAFile.DEFAULT_CHUNK_SIZE):
+    """Wie export_arrays, aber blockweise direkt aus der TRA-Datei (ohne sie ganz einzulesen)."""
+    exporter = get_exporter(fmt) if fmt else exporter_for_path(outfile)
+    return exporter.export(outfile, TRAFileSource(tra_path, zone, chunk_size), name)
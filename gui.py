@@ -1,15 +1,33 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from pyproj import Transformer
 import os
 from pathlib import Path
 import math
-import requests
-from PIL import Image, ImageTk, ImageDraw
-from io import BytesIO
+import queue
+from PIL import ImageTk
 
 import parseTRAFile    # Zum Parsen der .tra-Datei (angepasst)
 import projections     # Zur Auswahl der richtigen GK-CRS
+import exporters       # Exportformate (KML/KMZ, GeoJSON, CSV, NumPy)
+import geometry        # Verdichtung von Geraden, Bögen und Klothoiden
+import stations        # Stationsindex für Kilometerbereiche
+import wmscache        # Zwischenspeicher für WMS-Kartenbilder
+import mapworker       # Kartenaufbau im Hintergrund
+import simplify        # Detailstufen für das Zeichnen der Trasse
+import overlay         # Zeichnen der Trasse über der Grundkarte
+import recordtable     # Virtuelle Datensatztabelle mit Auswahlmodell
+import timing          # Zeitmessung der Verarbeitungsschritte
+import trackcache      # Zwischenspeicher für eingelesene und projizierte Trassen
+import network         # Netzansicht mehrerer Trassen mit Raumindex
+import kmltiles        # Gekachelter KML-Export (Regions/NetworkLinks)
+import catalogdialog   # Dateiauswahl über den TRA-Katalog
+
+# Abfrageintervall für fertige Kartenbilder und Verzögerung zum Zusammenfassen von Zoom-Schritten (ms)
+MAP_POLL_INTERVAL_MS = 50
+ZOOM_DEBOUNCE_MS = 250
+
+# Feinste Detailstufe der Trassendarstellung (Grad, ca. 10 cm)
+LOD_BASE_TOLERANCE = 1e-6
 
 def format_value(val):
     """Formatiert numerische Werte auf 3 Dezimalstellen; Werte nahe 0 werden als 0.000 dargestellt."""
@@ -30,6 +48,7 @@ class TRAConverterGUI:
             - Rot: Gesamte Trasse (alle Punkte),
             - Grün: Nur die ausgewählten Punkte.
       5) und ausgewählte Einträge als KML exportiert (Export-Button deaktiviert, wenn keine Zeile ausgewählt).
+    Über "Mehrere TRA-Dateien laden..." lassen sich außerdem viele Trassen gemeinsam als Netz ansehen.
     """
     def __init__(self, master):
         self.master = master
@@ -58,6 +77,13 @@ class TRAConverterGUI:
         self.load_btn.grid(row=0, column=2, padx=5, pady=5, sticky='w')
         self.load_btn.config(state='disabled')
 
+        self.load_network_btn = ttk.Button(top_frame, text="Mehrere TRA-Dateien laden...", command=self.load_network)
+        self.load_network_btn.grid(row=0, column=3, padx=5, pady=5, sticky='w')
+        self.load_network_btn.config(state='disabled')
+
+        ttk.Button(top_frame, text="Katalog...", command=self.open_catalog).grid(
+            row=0, column=4, padx=5, pady=5, sticky='w')
+
         # PanedWindow für Tabelle (links) und WMS-Karte (rechts)
         self.pw = tk.PanedWindow(master, orient=tk.HORIZONTAL)
         self.pw.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -66,27 +92,31 @@ class TRAConverterGUI:
         self.left_frame = ttk.Frame(self.pw)
         self.pw.add(self.left_frame)
 
-        columns = ("Auswahl", "Station", "Y", "X", "Richtung", "Radius")
-        self.tree = ttk.Treeview(self.left_frame, columns=columns, show='headings', selectmode="none")
-        self.tree.heading("Auswahl", text="Auswahl")
-        self.tree.heading("Station", text="Station")
-        self.tree.heading("Y", text="Rechtswert (Y)")
-        self.tree.heading("X", text="Hochwert (X)")
-        self.tree.heading("Richtung", text="Richtung")
-        self.tree.heading("Radius", text="Radius")
-        self.tree.column("Auswahl", width=70, anchor='center')
-        self.tree.column("Station", width=120)
-        self.tree.column("Y", width=120)
-        self.tree.column("X", width=120)
-        self.tree.column("Richtung", width=80)
-        self.tree.column("Radius", width=80)
-        vsb = ttk.Scrollbar(self.left_frame, orient="vertical", command=self.tree.yview)
-        hsb = ttk.Scrollbar(self.left_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        vsb.pack(side="right", fill="y")
-        hsb.pack(side="bottom", fill="x")
-        self.tree.pack(fill=tk.BOTH, expand=True)
-        self.tree.bind("<ButtonRelease-1>", self.on_toggle_check)
+        columns = (
+            ("Station", "Station", 120),
+            ("Y", "Rechtswert (Y)", 120),
+            ("X", "Hochwert (X)", 120),
+            ("Richtung", "Richtung", 80),
+            ("Radius", "Radius", 80),
+        )
+        self.selection = recordtable.SelectionModel()
+        self.table = recordtable.VirtualRecordTable(self.left_frame, columns, self.row_values,
+                                                    self.selection, on_change=self.on_selection_changed)
+        self.table.pack(fill=tk.BOTH, expand=True)
+
+        # Kilometerbereich auswählen/abwählen
+        range_frame = ttk.Frame(self.left_frame)
+        range_frame.pack(fill='x', pady=(5, 0))
+        ttk.Label(range_frame, text="km von:").pack(side=tk.LEFT, padx=2)
+        self.range_from_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.range_from_var, width=12).pack(side=tk.LEFT, padx=2)
+        ttk.Label(range_frame, text="bis:").pack(side=tk.LEFT, padx=2)
+        self.range_to_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.range_to_var, width=12).pack(side=tk.LEFT, padx=2)
+        ttk.Button(range_frame, text="Auswählen",
+                   command=lambda: self.select_station_range(True)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(range_frame, text="Abwählen",
+                   command=lambda: self.select_station_range(False)).pack(side=tk.LEFT, padx=2)
 
         # Button zum Alle auswählen/abwählen
         self.toggle_all_btn = ttk.Button(self.left_frame, text="Alle abwählen", command=self.toggle_all_selection)
@@ -107,16 +137,51 @@ class TRAConverterGUI:
         self.zoom_out_btn.pack(side=tk.LEFT, padx=5)
         self.reset_btn = ttk.Button(zoom_frame, text="Reset", command=self.reset_view)
         self.reset_btn.pack(side=tk.LEFT, padx=5)
+        self.map_status = ttk.Label(zoom_frame, text="")
+        self.map_status.pack(side=tk.LEFT, padx=10)
+        self.preview_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(zoom_frame, text="Schnelle Vorschau-Projektion", variable=self.preview_var,
+                        command=self.on_preview_toggled).pack(side=tk.RIGHT, padx=5)
+        self.projection_label = ttk.Label(zoom_frame, text="")
+        self.projection_label.pack(side=tk.RIGHT, padx=5)
+
+        # Messwerte der Verarbeitungsschritte (nur bei aktivierter Zeitmessung)
+        self.stats_label = ttk.Label(self.right_frame, text="", font=("Courier", 8), justify=tk.LEFT)
+        if timing.is_enabled():
+            self.stats_label.pack(fill='x', padx=5)
 
         # Export-Button
-        self.save_btn = ttk.Button(master, text="Ausgewählte Trasse transformieren und als KML speichern", command=self.transform_and_save)
-        self.save_btn.pack(pady=10)
+        self.save_btn = ttk.Button(master, text="Ausgewählte Trasse transformieren und speichern (KML, GeoJSON, CSV, ...)", command=self.transform_and_save)
+        self.save_btn.pack(pady=(10, 0))
         self.save_btn.config(state='disabled')
+        self.densify_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(master, text="Bögen und Klothoiden beim Export verdichten",
+                        variable=self.densify_var).pack(pady=(2, 0))
+        self.tiles_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(master, text="Gekachelt exportieren (Regions/NetworkLinks, für große Netze)",
+                        variable=self.tiles_var).pack(pady=(2, 10))
 
         # Interne Speicherung
         self.records = []
         self.map_image = None
 
+        # WGS84-Koordinaten der Datensätze, einmal je Datei und Zone berechnet
+        self.lons = None
+        self.lats = None
+        self.wgs84_zone = None
+        # Koordinaten der Kartenvorschau (genähert oder exakt) und Detailstufen daraus
+        self.map_lons = None
+        self.map_lats = None
+        self.map_zone = None
+        self.preview = None
+        self.lod = None
+        self.station_index = None
+
+        # Netzansicht: mehrere TRA-Dateien mit gemeinsamem Raumindex (network.TrackNetwork)
+        self.network = None
+        self.network_paths = []
+        self.network_zone = None
+
         # Bounding Box
         self.min_lon = None
         self.max_lon = None
@@ -128,6 +193,18 @@ class TRAConverterGUI:
         self.width = 1200
         self.height = 800
 
+        # WMS-Karten (Speicher- und Plattencache, gepoolte HTTP-Verbindungen)
+        self.wms = wmscache.WMSCache()
+
+        # Kartenaufbau im Hintergrund-Thread; Ergebnisse werden per after() abgeholt
+        self.map_worker = mapworker.LatestJobWorker()
+        self.map_generation = 0
+        self.map_after_id = None
+        # Grundkarte des aktuellen Ausschnitts (nur vom Hintergrund-Thread verwendet)
+        self.base_map_bbox = None
+        self.base_map_image = None
+        self.master.after(MAP_POLL_INTERVAL_MS, self.poll_map_results)
+
         # Bind MouseWheel-Events
         self.map_label.bind("<MouseWheel>", self.on_mouse_wheel_windows)
         self.map_label.bind("<Button-4>", self.on_mouse_wheel_linux)
@@ -137,59 +214,219 @@ class TRAConverterGUI:
         zone_value = self.zone_var.get().strip()
         if zone_value:
             self.load_btn.config(state='normal')
+            self.load_network_btn.config(state='normal')
+        if self.network_paths:
+            if zone_value != self.network_zone and self.build_network():
+                self.init_bbox()
+                self.update_map()
+        elif zone_value != self.map_zone:
+            self.invalidate_wgs84()
+            if self.records:
+                self.init_bbox()
+                self.update_map()
+
+    def invalidate_wgs84(self):
+        """Verwirft die zwischengespeicherten WGS84-Koordinaten (nach Datei- oder Zonenwechsel)."""
+        self.lons = None
+        self.lats = None
+        self.wgs84_zone = None
+        self.invalidate_map_coords()
+
+    def invalidate_map_coords(self):
+        self.map_lons = None
+        self.map_lats = None
+        self.map_zone = None
+        self.preview = None
+        self.lod = None
+        self.projection_label.config(text="")
+
+    def get_wgs84(self):
+        """
+        Gibt die exakten WGS84-Koordinaten (lons, lats) aller Datensätze zurück (für den Export).
+        Sie werden nur beim ersten Zugriff nach dem Laden bzw. Zonenwechsel projiziert und
+        dabei mit der Vorschau-Näherung verglichen (siehe check_preview).
+        """
+        zone_value = self.zone_var.get().strip()
+        if self.lons is None or self.wgs84_zone != zone_value:
+            self.lons, self.lats = trackcache.track_wgs84(self.records, zone_value)
+            self.wgs84_zone = zone_value
+            self.check_preview(self.records.rY, self.records.rX, self.lons, self.lats)
+        return self.lons, self.lats
 
-    def load_file(self):
-        file_path = filedialog.askopenfilename(
-            title="TRA-Datei auswählen",
-            filetypes=[("TRA-Dateien", "*.tra"), ("Alle Dateien", "*.*")]
-        )
+    def get_map_coords(self):
+        """
+        Gibt die Koordinaten für die Kartenvorschau zurück und baut daraus die Detailstufen.
+        Liegen noch keine exakten Koordinaten vor (auch nicht im Zwischenspeicher), wird bei
+        aktiver Vorschau-Projektion eine Näherung über der Ausdehnung der Trasse angepasst
+        (projections.PreviewTransform); reicht ihre Genauigkeit nicht, wird exakt projiziert.
+        """
+        zone_value = self.zone_var.get().strip()
+        if self.map_lons is None or self.map_zone != zone_value:
+            self.preview = None
+            coords = None
+            if self.lons is not None and self.wgs84_zone == zone_value:
+                coords = self.lons, self.lats
+            elif self.preview_var.get():
+                coords = trackcache.cached_wgs84(self.records, zone_value)
+                if coords is None:
+                    lons, lats, preview = projections.gk_to_wgs84_preview(zone_value, self.records.rY,
+                                                                           self.records.rX)
+                    if preview.accurate:
+                        coords, self.preview = (lons, lats), preview
+            if coords is None:
+                coords = self.get_wgs84()
+            self.set_map_coords(zone_value, *coords)
+        return self.map_lons, self.map_lats
+
+    def set_map_coords(self, zone_value, lons, lats):
+        self.map_lons, self.map_lats, self.map_zone = lons, lats, zone_value
+        with timing.stage("lod_build", points=len(lons)):
+            self.lod = simplify.LODPyramid(lons, lats, LOD_BASE_TOLERANCE)
+        if self.preview is not None:
+            self.projection_label.config(
+                text=f"Vorschau genähert (Grad {self.preview.degree}, Fehler ≤ {self.preview.error_bound * 1000:.1f} mm)")
+        else:
+            self.projection_label.config(text="Vorschau exakt")
+
+    def check_preview(self, rY, rX, lons, lats):
+        """
+        Vergleicht exakt transformierte Punkte mit der Vorschau-Näherung. Weicht sie stärker
+        ab als zugesichert, wird die Karte auf die exakten Koordinaten umgestellt.
+        """
+        if self.preview is None:
+            return
+        deviation, valid = self.preview.validate(rY, rX, lons, lats)
+        if valid:
+            self.projection_label.config(
+                text=f"Vorschau genähert (Grad {self.preview.degree}, geprüft: {deviation * 1000:.1f} mm)")
+            return
+        print(f"Vorschau-Projektion weicht um {deviation:.3f} m ab, Karte wird exakt neu gezeichnet.")
+        self.preview = None
+        self.set_map_coords(self.map_zone, *self.get_wgs84())
+        self.update_map()
+
+    def on_preview_toggled(self):
+        if self.records and self.network is None:
+            self.invalidate_map_coords()
+            self.update_map()
+
+    def load_file(self, file_path=None):
+        if file_path is None:
+            file_path = filedialog.askopenfilename(
+                title="TRA-Datei auswählen",
+                filetypes=[("TRA-Dateien", "*.tra"), ("Alle Dateien", "*.*")]
+            )
         if not file_path:
             return
         self.tra_filename = file_path  # TRA-Dateiname speichern
+        self.network = None
+        self.network_paths = []
 
         try:
-            self.records = parseTRAFile.parse_tra_file(file_path)
+            with timing.stage("load_file"):
+                self.records = parseTRAFile.parse_tra_file(file_path)
         except Exception as e:
             messagebox.showerror("Fehler", f"TRA-Datei konnte nicht geladen werden:\n{e}")
             return
+        self.invalidate_wgs84()
+        self.station_index = None
+
+        # Standardmäßig alle ausgewählt; die Tabelle zeigt nur die sichtbaren Zeilen an
+        with timing.stage("table_populate", records=len(self.records)):
+            self.selection.reset(len(self.records), True)
+            self.table.reload()
+        self.update_toggle_all_text()
+
+        self.init_bbox()
+        self.update_map()
+        self.check_export_button()
 
-        # Tabelle leeren
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    def load_network(self, file_paths=None):
+        """
+        Lädt mehrere TRA-Dateien gemeinsam als Netz (nur Ansicht). Die Karte zeigt alle
+        Trassen; gezeichnet werden über den Raumindex nur die sichtbaren Teilstücke.
+        """
+        if file_paths is None:
+            file_paths = filedialog.askopenfilenames(
+                title="TRA-Dateien auswählen",
+                filetypes=[("TRA-Dateien", "*.tra"), ("Alle Dateien", "*.*")]
+            )
+        if not file_paths:
+            return
+        self.network_paths = list(file_paths)
+        if not self.build_network():
+            self.network_paths = []
+            return
 
-        for rec in self.records:
-            station_val = format_value(rec['station'])
-            y_val = f"{rec['rY']:.3f}"
-            x_val = f"{rec['rX']:.3f}"
-            dir_val = f"{rec['direction']:.3f}"
-            rad_val = f"{rec['radius']:.3f}"
-            # Standardmäßig alle ausgewählt ("☑")
-            self.tree.insert("", "end", values=("☑", station_val, y_val, x_val, dir_val, rad_val))
+        # Einzeldatei verwerfen: Tabelle und Export beziehen sich auf eine Trasse
+        self.tra_filename = None
+        self.records = parseTRAFile.TRATrack.empty()
+        self.invalidate_wgs84()
+        self.station_index = None
+        self.selection.reset(0, True)
+        self.table.reload()
+        self.update_toggle_all_text()
 
         self.init_bbox()
         self.update_map()
         self.check_export_button()
 
-    def init_bbox(self):
-        zone_value = self.zone_var.get().strip()
-        if zone_value not in ["2", "3", "4", "5"]:
+    def open_catalog(self):
+        """Öffnet die Dateiauswahl über den TRA-Katalog (eine Datei: Einzelansicht, mehrere: Netzansicht)."""
+        catalogdialog.CatalogDialog(self.master, self.open_from_catalog,
+                                    zone=lambda: self.zone_var.get().strip(), view_bbox=self.view_gk_bbox)
+
+    def open_from_catalog(self, paths):
+        if not self.zone_var.get().strip():
+            messagebox.showwarning("Zone wählen", "Bitte eine GK-Zone (2,3,4,5) auswählen.")
             return
+        if len(paths) == 1:
+            self.load_file(paths[0])
+        else:
+            self.load_network(paths)
+
+    def view_gk_bbox(self):
+        """GK-Bounding-Box (min_y, min_x, max_y, max_x) des aktuellen Kartenausschnitts oder None."""
+        zone_value = self.zone_var.get().strip()
+        if zone_value not in ["2", "3", "4", "5"] or None in (self.min_lon, self.max_lon, self.min_lat, self.max_lat):
+            return None
+        y, x = projections.wgs84_to_gk(zone_value, [self.min_lon, self.max_lon, self.min_lon, self.max_lon],
+                                       [self.min_lat, self.min_lat, self.max_lat, self.max_lat])
+        return float(y.min()), float(x.min()), float(y.max()), float(x.max())
+
+    def build_network(self):
+        """Liest die Dateien aus network_paths in der gewählten Zone ein und baut den Raumindex auf."""
+        zone_value = self.zone_var.get().strip()
         try:
-            gk_crs = projections.get_gk_crs(zone_value)
-            wgs84_crs = projections.WGS84
+            with timing.stage("load_network", files=len(self.network_paths)):
+                self.network = network.TrackNetwork.from_files(self.network_paths, zone_value)
         except Exception as e:
-            messagebox.showerror("Fehler", f"Ungültige GK-Zone: {e}")
+            self.network = None
+            self.network_zone = None
+            messagebox.showerror("Fehler", f"TRA-Dateien konnten nicht geladen werden:\n{e}")
+            return False
+        self.network_zone = zone_value
+        self.map_status.config(text=f"{len(self.network)} Trassen, {self.network.point_count} Punkte")
+        return True
+
+    def init_bbox(self):
+        zone_value = self.zone_var.get().strip()
+        if zone_value not in ["2", "3", "4", "5"]:
             return
-        transformer = Transformer.from_crs(gk_crs, wgs84_crs, always_xy=True)
-        lats, lons = [], []
-        for rec in self.records:
-            lon, lat = transformer.transform(rec['rY'], rec['rX'])
-            lons.append(lon)
-            lats.append(lat)
-        if not lons or not lats:
+        if self.network is not None:
+            if self.network.bounds is None:
+                return
+            min_lon, min_lat, max_lon, max_lat = self.network.bounds
+        elif not self.records:
             return
-        min_lat, max_lat = min(lats), max(lats)
-        min_lon, max_lon = min(lons), max(lons)
+        else:
+            try:
+                lons, lats = self.get_map_coords()
+            except Exception as e:
+                messagebox.showerror("Fehler", f"Ungültige GK-Zone: {e}")
+                return
+            min_lat, max_lat = float(lats.min()), float(lats.max())
+            min_lon, max_lon = float(lons.min()), float(lons.max())
         if (max_lat - min_lat) == 0 or (max_lon - min_lon) == 0:
             return
         lat_margin = 0.1 * (max_lat - min_lat)
@@ -204,36 +441,50 @@ class TRAConverterGUI:
         self.max_lat = max_lat
         self.orig_bbox = (min_lon, max_lon, min_lat, max_lat)
 
-    def on_toggle_check(self, event):
-        item = self.tree.identify_row(event.y)
-        col = self.tree.identify_column(event.x)
-        if not item or col != "#1":
-            return
-        current_val = self.tree.set(item, "Auswahl")
-        new_val = "☑" if current_val == "☐" else "☐"
-        self.tree.set(item, "Auswahl", new_val)
+    def row_values(self, index):
+        """Formatierte Tabellenwerte (ohne Auswahlspalte) für Datensatz ``index``."""
+        rec = self.records.data[index]
+        return (format_value(float(rec['rS'])), f"{rec['rY']:.3f}", f"{rec['rX']:.3f}",
+                f"{rec['rT']:.3f}", f"{rec['rR1']:.3f}")
+
+    def on_selection_changed(self):
+        self.update_toggle_all_text()
         self.check_export_button()
         self.update_map()
 
+    def update_toggle_all_text(self):
+        self.toggle_all_btn.config(text="Alle abwählen" if self.selection.all_selected else "Alle auswählen")
+
     def toggle_all_selection(self):
-        items = self.tree.get_children()
-        all_selected = all(self.tree.set(item, "Auswahl") == "☑" for item in items)
-        new_val = "☐" if all_selected else "☑"
-        for item in items:
-            self.tree.set(item, "Auswahl", new_val)
-        self.toggle_all_btn.config(text="Alle auswählen" if all_selected else "Alle abwählen")
-        self.check_export_button()
-        self.update_map()
+        self.selection.set_all(not self.selection.all_selected)
+        self.table.changed()
+
+    def get_station_index(self):
+        """Stationsindex der geladenen Trasse (wird beim ersten Zugriff nach dem Laden aufgebaut)."""
+        if self.station_index is None:
+            self.station_index = stations.StationIndex(self.records)
+        return self.station_index
+
+    def select_station_range(self, value):
+        """Wählt alle Elemente, die den eingegebenen Kilometerbereich berühren, aus bzw. ab."""
+        if not self.records:
+            return
+        try:
+            start, end = stations.parse_km_range(f"{self.range_from_var.get()}-{self.range_to_var.get()}")
+        except ValueError:
+            messagebox.showwarning("Ungültiger Bereich", "Bitte Anfangs- und End-km als Zahl eingeben.")
+            return
+        self.selection.set_where(self.get_station_index().range_mask(start, end), value)
+        self.table.changed()
 
     def check_export_button(self):
-        selected = any(self.tree.set(item, "Auswahl") == "☑" for item in self.tree.get_children())
-        if selected:
+        if self.selection.any_selected or self.network is not None:
             self.save_btn.config(state='normal')
         else:
             self.save_btn.config(state='disabled')
 
     def transform_and_save(self):
-        if not self.records:
+        if not self.records and self.network is None:
             messagebox.showwarning("Keine Daten", "Bitte laden Sie zuerst eine TRA-Datei.")
             return
         zone_value = self.zone_var.get().strip()
@@ -241,96 +492,94 @@ class TRAConverterGUI:
             messagebox.showwarning("Zone wählen", "Bitte eine GK-Zone (2,3,4,5) auswählen.")
             return
         try:
-            gk_crs = projections.get_gk_crs(zone_value)
-            wgs84_crs = projections.WGS84
+            projections.get_transformer(zone_value)
         except Exception as e:
             messagebox.showerror("Fehler", f"Ungültige GK-Zone: {e}")
             return
-        transformer = Transformer.from_crs(gk_crs, wgs84_crs, always_xy=True)
         # Verwende den TRA-Dateinamen als Namensvorschlag
         initial_name = ""
         if self.tra_filename:
             base = os.path.splitext(os.path.basename(self.tra_filename))[0]
             initial_name = base + ".kml"
         outfile = filedialog.asksaveasfilename(
-            title="KML-Datei speichern",
+            title="Trasse speichern",
             initialfile=initial_name,
             defaultextension=".kml",
-            filetypes=[("KML-Datei", "*.kml"), ("Alle Dateien", "*.*")]
+            filetypes=[(e.description, "*" + e.extension) for e in exporters.EXPORTERS.values()]
+                      + [("Alle Dateien", "*.*")]
         )
         if not outfile:
             return
-        coords_list = []
-        for i, item in enumerate(self.tree.get_children()):
-            if self.tree.set(item, "Auswahl") == "☑":
-                y_str = self.tree.set(item, "Y")
-                x_str = self.tree.set(item, "X")
-                y_val = float(y_str)
-                x_val = float(x_str)
-                lon, lat = transformer.transform(y_val, x_val)
-                coords_list.append(f"{lon:.6f},{lat:.6f},0")
-        if not coords_list:
+        exporter = exporters.exporter_for_path(outfile)
+        if (self.tiles_var.get() or self.network is not None) and exporter.name not in ("kml", "kmz"):
+            messagebox.showwarning("Format", "Gekachelter Export und Netzansicht sind nur als KML oder KMZ möglich.")
+            return
+        if self.network is not None:
+            self.save_network(outfile)
+            return
+        if not self.selection.any_selected:
             messagebox.showwarning("Keine Auswahl", "Bitte wählen Sie mindestens einen Datensatz aus.")
             return
+        name = os.path.splitext(os.path.basename(self.tra_filename or "Trasse"))[0]
         try:
-            with open(outfile, "w", encoding="utf-8") as f:
-                f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-                f.write('<kml xmlns="http://www.opengis.net/kml/2.2">\n')
-                f.write('  <Document>\n')
-                f.write('    <Style id="greenLineStyle">\n')
-                f.write('      <LineStyle>\n')
-                f.write('        <color>ff00ff00</color>\n')
-                f.write('        <width>5</width>\n')
-                f.write('      </LineStyle>\n')
-                f.write('    </Style>\n')
-                f.write('    <Placemark>\n')
-                f.write('      <name>Ausgewählte Trasse</name>\n')
-                f.write('      <styleUrl>#greenLineStyle</styleUrl>\n')
-                f.write('      <LineString>\n')
-                f.write('        <tessellate>1</tessellate>\n')
-                f.write('        <coordinates>\n')
-                f.write("          " + " ".join(coords_list) + "\n")
-                f.write('        </coordinates>\n')
-                f.write('      </LineString>\n')
-                f.write('    </Placemark>\n')
-                f.write('    <Placemark>\n')
-                f.write('      <name>Gesamte Trasse</name>\n')
-                f.write('      <Style>\n')
-                f.write('        <LineStyle>\n')
-                f.write('          <color>ff0000ff</color>\n')
-                f.write('          <width>5</width>\n')
-                f.write('        </LineStyle>\n')
-                f.write('      </Style>\n')
-                f.write('      <LineString>\n')
-                f.write('        <tessellate>1</tessellate>\n')
-                f.write('        <coordinates>\n')
-                all_coords = []
-                for i, item in enumerate(self.tree.get_children()):
-                    y_str = self.tree.set(item, "Y")
-                    x_str = self.tree.set(item, "X")
-                    y_val = float(y_str)
-                    x_val = float(x_str)
-                    lon, lat = transformer.transform(y_val, x_val)
-                    all_coords.append(f"{lon:.6f},{lat:.6f},0")
-                f.write("          " + " ".join(all_coords) + "\n")
-                f.write('        </coordinates>\n')
-                f.write('      </LineString>\n')
-                f.write('    </Placemark>\n')
-                f.write('  </Document>\n')
-                f.write('</kml>\n')
-            messagebox.showinfo("Erfolg", f"KML-Datei erfolgreich gespeichert:\n{outfile}")
+            if self.densify_var.get():
+                samples = geometry.densify_track(self.records)
+                lons, lats = projections.gk_to_wgs84(zone_value, samples.y, samples.x)
+                self.check_preview(samples.y, samples.x, lons, lats)
+                selected = self.selection.mask[samples.element]
+                station = samples.station
+                records = exporters.point_records(self.records, samples.element, samples.station, samples.y, samples.x)
+            else:
+                lons, lats = self.get_wgs84()
+                selected = self.selection.mask
+                station = self.records.station
+                records = self.records.data
+            if self.tiles_var.get():
+                # Je zusammenhängendem Auswahlbereich eine eigene Linie, damit keine Lücken überbrückt werden
+                starts, ends = simplify.selection_ranges(selected)
+                kmltiles.export_tiled(outfile, [(name, lons[a:b + 1], lats[a:b + 1], station[a:b + 1])
+                                                for a, b in zip(starts.tolist(), ends.tolist())])
+            else:
+                exporter.export(outfile, exporters.ArraySource(records, lons, lats, selected), name)
+            self.update_stats()
+            messagebox.showinfo("Erfolg", f"{exporter.description} erfolgreich gespeichert:\n{outfile}")
+        except Exception as e:
+            messagebox.showerror("Fehler", f"Fehler beim Speichern der Datei:\n{e}")
+
+    def save_network(self, outfile):
+        """Exportiert alle Trassen der Netzansicht als gekachelten KML-Baum (bzw. ein KMZ)."""
+        net = self.network
+        lines = [(os.path.splitext(name)[0], net.x[a:b], net.y[a:b], None)
+                 for name, a, b in zip(net.names, net.offsets[:-1].tolist(), net.offsets[1:].tolist())]
+        try:
+            count, tiles = kmltiles.export_tiled(outfile, lines)
+            self.update_stats()
+            messagebox.showinfo("Erfolg", f"{len(net)} Trassen ({count} Punkte, {tiles} Kacheln) gespeichert:\n{outfile}")
         except Exception as e:
             messagebox.showerror("Fehler", f"Fehler beim Speichern der KML-Datei:\n{e}")
 
-    def update_map(self):
+    def update_map(self, delay=0):
         """
-        Fragt den WMS-Dienst (Terrestris OSM-WMS) ab, passt die Bounding Box an das Bildseitenverhältnis
-        (1200×800, 10% Rand) an und zeichnet zwei Linien als Overlay:
-          - Rot: Gesamte Trasse (alle Punkte),
-          - Grün: Ausgewählte Punkte.
-        Das Ergebnis wird in einem Tkinter-Label angezeigt.
+        Fordert eine Neuzeichnung der Karte an. Laden und Zeichnen laufen im
+        Hintergrund-Thread (siehe render_map); mit ``delay`` (ms) werden schnell
+        aufeinanderfolgende Anforderungen, z.B. beim Mausrad-Zoom, zusammengefasst.
         """
-        if not self.records:
+        if self.map_after_id is not None:
+            self.master.after_cancel(self.map_after_id)
+            self.map_after_id = None
+        if delay:
+            self.map_after_id = self.master.after(delay, self.start_map_render)
+        else:
+            self.start_map_render()
+
+    def start_map_render(self):
+        """
+        Passt die Bounding Box an das Bildseitenverhältnis (1200×800, 10% Rand) an und
+        übergibt Ausschnitt, Koordinaten und Auswahl an den Hintergrund-Thread.
+        Ein noch laufender älterer Auftrag wird dabei überholt und verworfen.
+        """
+        self.map_after_id = None
+        if not self.records and self.network is None:
             return
         if None in (self.min_lon, self.max_lon, self.min_lat, self.max_lat):
             return
@@ -361,49 +610,73 @@ class TRAConverterGUI:
                 min_lon = center_lon - half
                 max_lon = center_lon + half
 
-        wms_url = (
-            "https://ows.terrestris.de/osm/service?"
-            "service=WMS&version=1.1.1&request=GetMap&"
-            "layers=OSM-WMS&styles=&format=image/png&transparent=true&"
-            "srs=EPSG:4326&"
-            f"bbox={min_lon},{min_lat},{max_lon},{max_lat}&"
-            f"width={self.width}&height={self.height}"
-        )
-        try:
-            response = requests.get(wms_url)
-            response.raise_for_status()
-            wms_image = Image.open(BytesIO(response.content))
-        except Exception as e:
-            messagebox.showerror("Fehler", f"WMS-Karte konnte nicht geladen werden:\n{e}")
+        bbox = (min_lon, min_lat, max_lon, max_lat)
+        self.map_status.config(text="Karte wird geladen...")
+        if self.network is not None:
+            self.map_generation = self.map_worker.submit(self.render_network_map, bbox, self.network)
             return
 
-        draw = ImageDraw.Draw(wms_image)
-        def lonlat_to_pixel(lon, lat):
-            x = (lon - min_lon) / (max_lon - min_lon) * self.width
-            y = (max_lat - lat) / (max_lat - min_lat) * self.height
-            return (x, y)
-
-        # Gesamte Trasse (rot)
-        transformer = Transformer.from_crs(projections.get_gk_crs(self.zone_var.get().strip()), projections.WGS84, always_xy=True)
-        coords = []
-        for rec in self.records:
-            lon, lat = transformer.transform(rec['rY'], rec['rX'])
-            coords.append([lat, lon])
-        pixel_coords_all = [lonlat_to_pixel(lon, lat) for lat, lon in coords]
-        if len(pixel_coords_all) >= 2:
-            draw.line(pixel_coords_all, fill="red", width=5)
-
-        # Ausgewählte Punkte (grün)
-        selected_coords = []
-        for i, item in enumerate(self.tree.get_children()):
-            if self.tree.set(item, "Auswahl") == "☑":
-                selected_coords.append(coords[i])
-        pixel_coords_sel = [lonlat_to_pixel(lon, lat) for lat, lon in selected_coords]
-        if len(pixel_coords_sel) >= 2:
-            draw.line(pixel_coords_sel, fill="green", width=5)
-
-        self.map_image = ImageTk.PhotoImage(wms_image)
-        self.map_label.config(image=self.map_image)
+        self.get_map_coords()
+        selected = self.selection.mask.copy()
+        self.map_generation = self.map_worker.submit(self.render_map, bbox, self.lod, selected)
+
+    def get_base_map(self, bbox):
+        """Grundkarte für ``bbox`` (RGBA); bei unverändertem Ausschnitt wird das letzte Bild wiederverwendet."""
+        if bbox != self.base_map_bbox:
+            base = self.wms.get_map(bbox, self.width, self.height).convert("RGBA")
+            self.base_map_bbox, self.base_map_image = bbox, base
+        return self.base_map_image
+
+    def render_map(self, cancelled, bbox, lod, selected):
+        """
+        Läuft im Hintergrund-Thread: holt die Grundkarte vom WMS-Dienst (Terrestris OSM-WMS)
+        bzw. aus dem Zwischenspeicher und legt eine Overlay-Ebene mit zwei Linien darüber:
+          - Rot: Gesamte Trasse (alle Punkte),
+          - Grün: Ausgewählte Punkte.
+        Ändert sich nur die Auswahl, wird die Grundkarte wiederverwendet und nur das Overlay
+        neu gezeichnet (siehe overlay.render_overlay). Gibt das fertige PIL-Bild zurück
+        (oder None, wenn der Auftrag überholt wurde).
+        """
+        base = self.get_base_map(bbox)
+        if cancelled():
+            return None
+
+        overlay_image = overlay.render_overlay(lod, selected, bbox, self.width, self.height)
+        return overlay.compose_map(base, overlay_image)
+
+    def render_network_map(self, cancelled, bbox, net):
+        """
+        Wie render_map für die Netzansicht: eine gemeinsame WMS-Anfrage für den Ausschnitt,
+        darüber nur die sichtbaren Teilstücke aller Trassen (siehe overlay.render_network).
+        """
+        base = self.get_base_map(bbox)
+        if cancelled():
+            return None
+        return overlay.compose_map(base, overlay.render_network(net, bbox, self.width, self.height))
+
+    def poll_map_results(self):
+        """Holt fertige Kartenbilder aus dem Hintergrund-Thread ab und zeigt das aktuellste an."""
+        try:
+            while True:
+                generation, image, error = self.map_worker.results.get_nowait()
+                if generation != self.map_generation:
+                    continue
+                self.map_status.config(text="")
+                if error is not None:
+                    messagebox.showerror("Fehler", f"WMS-Karte konnte nicht geladen werden:\n{error}")
+                elif image is not None:
+                    with timing.stage("map_display"):
+                        self.map_image = ImageTk.PhotoImage(image)
+                        self.map_label.config(image=self.map_image)
+                self.update_stats()
+        except queue.Empty:
+            pass
+        self.master.after(MAP_POLL_INTERVAL_MS, self.poll_map_results)
+
+    def update_stats(self):
+        """Zeigt die aufsummierten Messwerte unter der Karte an, falls die Zeitmessung aktiv ist."""
+        if timing.is_enabled():
+            self.stats_label.config(text=timing.summary())
 
     def zoom_in(self, factor=0.2):
         if None in (self.min_lon, self.max_lon, self.min_lat, self.max_lat):
@@ -416,7 +689,7 @@ class TRAConverterGUI:
         self.max_lon -= dw/2
         self.min_lat += dh/2
         self.max_lat -= dh/2
-        self.update_map()
+        self.update_map(delay=ZOOM_DEBOUNCE_MS)
 
     def zoom_out(self, factor=0.2):
         if None in (self.min_lon, self.max_lon, self.min_lat, self.max_lat):
@@ -429,7 +702,7 @@ class TRAConverterGUI:
         self.max_lon += dw/2
         self.min_lat -= dh/2
         self.max_lat += dh/2
-        self.update_map()
+        self.update_map(delay=ZOOM_DEBOUNCE_MS)
 
     def reset_view(self):
         if not self.orig_bbox:
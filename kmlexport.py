@@ -0,0 +1,180 @@
+"""
+KML-/KMZ-Export der Trasse.
+
+Koordinaten werden blockweise aus NumPy-Arrays formatiert und über einen
+gepufferten Datenstrom geschrieben; der Speicherbedarf hängt nur von der
+Blockgröße ab. Endet der Dateiname auf .kmz, wird das Dokument als doc.kml
+in ein ZIP-Archiv (Deflate) gestreamt.
+"""
+import contextlib
+import io
+import zipfile
+
+import parseTRAFile
+import projections
+
+# Punkte je formatiertem Koordinatenblock
+COORDINATE_CHUNK_SIZE = 65536
+
+# Puffergröße der Ausgabedatei (Bytes)
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+KML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+    '  <Document>\n'
+    '    <Style id="greenLineStyle">\n'
+    '      <LineStyle>\n'
+    '        <color>ff00ff00</color>\n'
+    '        <width>5</width>\n'
+    '      </LineStyle>\n'
+    '    </Style>\n'
+)
+
+KML_SELECTED_START = (
+    '    <Placemark>\n'
+    '      <name>Ausgewählte Trasse</name>\n'
+    '      <styleUrl>#greenLineStyle</styleUrl>\n'
+    '      <LineString>\n'
+    '        <tessellate>1</tessellate>\n'
+    '        <coordinates>\n'
+)
+
+KML_ALL_START = (
+    '    <Placemark>\n'
+    '      <name>Gesamte Trasse</name>\n'
+    '      <Style>\n'
+    '        <LineStyle>\n'
+    '          <color>ff0000ff</color>\n'
+    '          <width>5</width>\n'
+    '        </LineStyle>\n'
+    '      </Style>\n'
+    '      <LineString>\n'
+    '        <tessellate>1</tessellate>\n'
+    '        <coordinates>\n'
+)
+
+KML_PLACEMARK_END = (
+    '        </coordinates>\n'
+    '      </LineString>\n'
+    '    </Placemark>\n'
+)
+
+KML_FOOTER = (
+    '  </Document>\n'
+    '</kml>\n'
+)
+
+
+def write_coordinates(f, chunks):
+    """
+    Schreibt die Koordinatenzeile eines LineStrings blockweise.
+    ``chunks`` liefert Tupel (lons, lats); es wird nie mehr als ein Block formatiert im Speicher gehalten.
+    Gibt die Anzahl der geschriebenen Punkte zurück.
+    """
+    f.write("          ")
+    count = 0
+    for lons, lats in chunks:
+        text = " ".join(f"{lon:.6f},{lat:.6f},0" for lon, lat in zip(lons.tolist(), lats.tolist()))
+        if not text:
+            continue
+        if count:
+            f.write(" ")
+        f.write(text)
+        count += len(lons)
+    f.write("\n")
+    return count
+
+
+def write_kml(f, selected_chunks, all_chunks):
+    """
+    Schreibt das KML-Dokument mit den beiden Placemarks "Ausgewählte Trasse" (grün)
+    und "Gesamte Trasse" (rot) in die geöffnete Textdatei ``f``.
+    Beide Koordinatenquellen sind Iterables von (lons, lats)-Blöcken.
+    Gibt die Anzahl der Punkte der gesamten Trasse zurück.
+    """
+    f.write(KML_HEADER)
+    f.write(KML_SELECTED_START)
+    write_coordinates(f, selected_chunks)
+    f.write(KML_PLACEMARK_END)
+    f.write(KML_ALL_START)
+    count = write_coordinates(f, all_chunks)
+    f.write(KML_PLACEMARK_END)
+    f.write(KML_FOOTER)
+    return count
+
+
+def write_kml_whole(f, chunks):
+    """
+    Wie write_kml für eine Trasse ohne Auswahl, bei der beide Placemarks dieselben Punkte
+    zeigen: ``chunks`` wird nur einmal durchlaufen (z.B. nur einmal projiziert), die
+    Blöcke werden für "Gesamte Trasse" behalten (16 Bytes je Punkt).
+    """
+    kept = []
+
+    def first_pass():
+        for lons, lats in chunks:
+            kept.append((lons, lats))
+            yield lons, lats
+
+    return write_kml(f, first_pass(), kept)
+
+
+def array_chunks(lons, lats, selected=None, chunk_size=COORDINATE_CHUNK_SIZE):
+    """
+    Zerlegt Koordinaten-Arrays in Blöcke (lons, lats). Mit der booleschen Maske
+    ``selected`` werden nur die ausgewählten Punkte geliefert, ohne die gefilterten
+    Arrays vorab vollständig zu kopieren.
+    """
+    for start in range(0, len(lons), chunk_size):
+        stop = start + chunk_size
+        if selected is None:
+            yield lons[start:stop], lats[start:stop]
+        else:
+            mask = selected[start:stop]
+            yield lons[start:stop][mask], lats[start:stop][mask]
+
+
+def is_kmz(outfile):
+    return str(outfile).lower().endswith(".kmz")
+
+
+@contextlib.contextmanager
+def open_output(outfile, kmz=None):
+    """
+    Öffnet ``outfile`` als gepufferten UTF-8-Textstrom. Bei KMZ (Standard: nach Endung)
+    wird in den Eintrag doc.kml eines ZIP-Archivs mit Deflate-Kompression geschrieben.
+    """
+    if kmz is None:
+        kmz = is_kmz(outfile)
+    if kmz:
+        with zipfile.ZipFile(outfile, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open("doc.kml", "w", force_zip64=True) as raw:
+                with io.TextIOWrapper(io.BufferedWriter(raw, WRITE_BUFFER_SIZE), encoding="utf-8") as f:
+                    yield f
+    else:
+        with open(outfile, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            yield f
+
+
+def export_track(outfile, lons, lats, selected=None, kmz=None, chunk_size=COORDINATE_CHUNK_SIZE):
+    """
+    Schreibt die Trasse aus den WGS84-Arrays ``lons``/``lats`` als KML bzw. KMZ.
+    ``selected`` (boolesche Maske) bestimmt die "Ausgewählte Trasse"; ohne Maske
+    entspricht sie der gesamten Trasse. Gibt die Anzahl der Punkte zurück.
+    """
+    with open_output(outfile, kmz) as f:
+        return write_kml(f,
+                         array_chunks(lons, lats, selected, chunk_size),
+                         array_chunks(lons, lats, None, chunk_size))
+
+
+def export_tra_to_kml(tra_path, zone, outfile, chunk_size=parseTRAFile.DEFAULT_CHUNK_SIZE, kmz=None):
+    """
+    Konvertiert eine TRA-Datei blockweise nach KML bzw. KMZ, ohne die gesamte
+    Datensatzliste im Speicher zu halten. Die ausgewählte Trasse entspricht hier der
+    gesamten Trasse. Gibt die Anzahl der exportierten Punkte zurück.
+    """
+    chunks = projections.transform_chunks(parseTRAFile.iter_tra_chunks(tra_path, chunk_size), zone)
+    with open_output(outfile, kmz) as f:
+        return write_kml_whole(f, chunks)
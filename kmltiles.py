@@ -0,0 +1,276 @@
+"""
+Gekachelter KML-Export mit Regions und NetworkLinks für große Trassennetze.
+
+Der Ausschnitt wird als Quadtree in Kacheln zerlegt, bis eine Kachel höchstens
+``max_points`` Punkte in voller Auflösung enthält. Jede Kachel ist eine eigene
+KML-Datei mit
+  - der Geometrie ihres Ausschnitts, innere Kacheln generalisiert (Douglas-Peucker,
+    halbe Pixel Abweichung bei TILE_PIXELS Bildpunkten Kachelbreite), Blätter in
+    voller Auflösung,
+  - je einem NetworkLink mit Region/Lod auf die (nicht leeren) Unterkacheln.
+Ein Betrachter lädt damit Details erst, wenn der Ausschnitt groß genug auf dem
+Bildschirm erscheint. Je zusammenhängendem Abschnitt einer Trasse in einer Kachel gibt
+es ein Placemark, benannt nach dem Stationsbereich dieses Abschnitts.
+
+Ausgabe: ``netz.kml`` plus Kacheln im Verzeichnis ``netz_tiles/`` oder, bei .kmz,
+ein einziges Archiv mit doc.kml und tiles/.
+"""
+import contextlib
+import io
+import os
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+import kmlexport
+import simplify
+import timing
+
+# Höchstzahl Punkte (volle Auflösung) je Blattkachel und maximale Tiefe des Quadtrees
+DEFAULT_MAX_POINTS = 5000
+MAX_DEPTH = 18
+
+# Bildschirmbreite (Pixel), bis zu der die generalisierte Geometrie einer Kachel angezeigt wird
+TILE_PIXELS = 1024
+
+# Lod-Schwellen (Pixel) für das Einblenden von Unterkacheln und Ausblenden grober Geometrie
+MIN_LOD_PIXELS = 128
+MAX_LOD_PIXELS = TILE_PIXELS // 2
+
+# Feinste Generalisierungsstufe (Grad, ca. 10 cm)
+BASE_TOLERANCE = 1e-6
+
+TILE_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+    '  <Document>\n'
+    '    <name>{name}</name>\n'
+    '    <Style id="redLineStyle">\n'
+    '      <LineStyle>\n'
+    '        <color>ff0000ff</color>\n'
+    '        <width>3</width>\n'
+    '      </LineStyle>\n'
+    '    </Style>\n'
+)
+
+TILE_FOOTER = (
+    '  </Document>\n'
+    '</kml>\n'
+)
+
+
+def region_xml(bbox, min_lod, max_lod, indent="    "):
+    west, south, east, north = bbox
+    return (
+        f'{indent}<Region>\n'
+        f'{indent}  <LatLonAltBox>\n'
+        f'{indent}    <north>{north:.7f}</north>\n'
+        f'{indent}    <south>{south:.7f}</south>\n'
+        f'{indent}    <east>{east:.7f}</east>\n'
+        f'{indent}    <west>{west:.7f}</west>\n'
+        f'{indent}  </LatLonAltBox>\n'
+        f'{indent}  <Lod>\n'
+        f'{indent}    <minLodPixels>{min_lod}</minLodPixels>\n'
+        f'{indent}    <maxLodPixels>{max_lod}</maxLodPixels>\n'
+        f'{indent}  </Lod>\n'
+        f'{indent}</Region>\n'
+    )
+
+
+def format_coordinates(lons, lats):
+    return " ".join(f"{lon:.6f},{lat:.6f},0" for lon, lat in zip(lons.tolist(), lats.tolist()))
+
+
+def format_km(station):
+    return f"{station / 1000.0:.3f}"
+
+
+class TileLine:
+    """Eine Trasse des Exports: Koordinaten, optionale Stationen, Teilstück-Boxen und Detailstufen."""
+
+    def __init__(self, name, lons, lats, stations=None):
+        self.name = name
+        self.x = np.asarray(lons, dtype=float)
+        self.y = np.asarray(lats, dtype=float)
+        self.stations = None if stations is None else np.asarray(stations, dtype=float)
+        a, b = self.x[:-1], self.x[1:]
+        self.minx, self.maxx = np.minimum(a, b), np.maximum(a, b)
+        a, b = self.y[:-1], self.y[1:]
+        self.miny, self.maxy = np.minimum(a, b), np.maximum(a, b)
+        self.lod = simplify.LODPyramid(self.x, self.y, BASE_TOLERANCE)
+
+    def segments_in(self, bbox, candidates):
+        """Teilstücke aus ``candidates``, deren Box ``bbox`` schneidet."""
+        west, south, east, north = bbox
+        hit = ((self.maxx[candidates] >= west) & (self.minx[candidates] <= east) &
+               (self.maxy[candidates] >= south) & (self.miny[candidates] <= north))
+        return candidates[hit]
+
+    def generalized_paths(self, bbox, tolerance):
+        """Punktindex-Arrays der generalisierten Linie, soweit sie ``bbox`` schneidet."""
+        return self.lod.visible_indices(tolerance, bbox)
+
+    def full_paths(self, segments):
+        """Punktindex-Arrays in voller Auflösung für die Teilstücke ``segments``."""
+        if not len(segments):
+            return []
+        firsts, lasts = simplify.index_runs(segments)
+        return [np.arange(f, l + 2) for f, l in zip(firsts.tolist(), lasts.tolist())]
+
+    def placemarks(self, paths):
+        """Je Punktindex-Array aus ``paths`` ein Placemark mit LineString, benannt nach seinem Stationsbereich."""
+        parts = []
+        for p in paths:
+            name = self.name
+            if self.stations is not None:
+                first, last = sorted((float(self.stations[p[0]]), float(self.stations[p[-1]])))
+                name = f"{name} km {format_km(first)}–{format_km(last)}"
+            parts.append('    <Placemark>\n'
+                         f'      <name>{escape(name)}</name>\n'
+                         '      <styleUrl>#redLineStyle</styleUrl>\n'
+                         '      <LineString>\n'
+                         '        <tessellate>1</tessellate>\n'
+                         f'        <coordinates>{format_coordinates(self.x[p], self.y[p])}</coordinates>\n'
+                         '      </LineString>\n'
+                         '    </Placemark>\n')
+        return "".join(parts)
+
+
+class DirectorySink:
+    """
+    Schreibt die Wurzeldatei nach ``outfile`` und die Kacheln in ``<Basisname>_tiles/``.
+    Das Verzeichnis wird erst mit der ersten Kachel angelegt; passt alles in die Wurzel, entsteht keins.
+    """
+
+    def __init__(self, outfile):
+        self.outfile = outfile
+        base = os.path.splitext(os.path.basename(outfile))[0] + "_tiles"
+        self.tile_dir = os.path.join(os.path.dirname(outfile), base)
+        self.root_prefix = base + "/"
+        self._tile_dir_created = False
+
+    def open(self, name, root):
+        if root:
+            path = self.outfile
+        else:
+            if not self._tile_dir_created:
+                os.makedirs(self.tile_dir, exist_ok=True)
+                self._tile_dir_created = True
+            path = os.path.join(self.tile_dir, name)
+        return open(path, "w", encoding="utf-8", buffering=kmlexport.WRITE_BUFFER_SIZE)
+
+    def href(self, name, from_root):
+        return self.root_prefix + name if from_root else name
+
+    def close(self):
+        pass
+
+
+class KMZSink:
+    """Schreibt alles in ein KMZ-Archiv: doc.kml (als erster Eintrag) und tiles/."""
+
+    def __init__(self, outfile):
+        self.archive = zipfile.ZipFile(outfile, "w", compression=zipfile.ZIP_DEFLATED)
+
+    @contextlib.contextmanager
+    def open(self, name, root):
+        with self.archive.open("doc.kml" if root else "tiles/" + name, "w", force_zip64=True) as raw:
+            with io.TextIOWrapper(io.BufferedWriter(raw, kmlexport.WRITE_BUFFER_SIZE), encoding="utf-8") as f:
+                yield f
+
+    def href(self, name, from_root):
+        return "tiles/" + name if from_root else name
+
+    def close(self):
+        self.archive.close()
+
+
+class TileWriter:
+    """Zerlegt die Linien rekursiv in Kacheln und schreibt jede Kachel über ``sink``."""
+
+    def __init__(self, lines, sink, max_points=DEFAULT_MAX_POINTS, max_depth=MAX_DEPTH):
+        self.lines = lines
+        self.sink = sink
+        self.max_points = max_points
+        self.max_depth = max_depth
+        self.tiles = 0
+
+    def write(self, bbox):
+        candidates = [(line, np.arange(len(line.x) - 1)) for line in self.lines if len(line.x) > 1]
+        self._write_tile(bbox, 0, 0, 0, candidates)
+        return self.tiles
+
+    def _write_tile(self, bbox, depth, ix, iy, candidates):
+        root = depth == 0
+        name = f"t{depth}_{ix}_{iy}.kml"
+        points = sum(len(segments) + 1 for _, segments in candidates)
+        leaf = points <= self.max_points or depth >= self.max_depth
+
+        # Unterkacheln (Quadranten) mit ihren Teilstücken bestimmen
+        children = []
+        if not leaf:
+            west, south, east, north = bbox
+            mid_x, mid_y = (west + east) / 2, (south + north) / 2
+            quadrants = [((west, south, mid_x, mid_y), 0, 0), ((mid_x, south, east, mid_y), 1, 0),
+                         ((west, mid_y, mid_x, north), 0, 1), ((mid_x, mid_y, east, north), 1, 1)]
+            for child_bbox, dx, dy in quadrants:
+                child = [(line, line.segments_in(child_bbox, segments)) for line, segments in candidates]
+                child = [(line, segments) for line, segments in child if len(segments)]
+                if child:
+                    children.append((child_bbox, 2 * ix + dx, 2 * iy + dy, child))
+
+        with self.sink.open(name, root) as f:
+            f.write(TILE_HEADER.format(name=os.path.splitext(name)[0]))
+            f.write(region_xml(bbox, 0 if root else MIN_LOD_PIXELS, -1))
+
+            # Geometrie: Blätter in voller Auflösung, innere Kacheln generalisiert
+            f.write('    <Folder>\n')
+            f.write(region_xml(bbox, 0, -1 if leaf else MAX_LOD_PIXELS, indent="      "))
+            tolerance = (bbox[2] - bbox[0]) / TILE_PIXELS
+            for line, segments in candidates:
+                paths = line.full_paths(segments) if leaf else line.generalized_paths(bbox, tolerance)
+                f.write(line.placemarks(paths))
+            f.write('    </Folder>\n')
+
+            for child_bbox, cx, cy, _ in children:
+                child_name = f"t{depth + 1}_{cx}_{cy}.kml"
+                f.write('    <NetworkLink>\n'
+                        f'      <name>{os.path.splitext(child_name)[0]}</name>\n')
+                f.write(region_xml(child_bbox, MIN_LOD_PIXELS, -1, indent="      "))
+                f.write('      <Link>\n'
+                        f'        <href>{self.sink.href(child_name, root)}</href>\n'
+                        '        <viewRefreshMode>onRegion</viewRefreshMode>\n'
+                        '      </Link>\n'
+                        '    </NetworkLink>\n')
+            f.write(TILE_FOOTER)
+        self.tiles += 1
+
+        for child_bbox, cx, cy, child in children:
+            self._write_tile(child_bbox, depth + 1, cx, cy, child)
+
+
+def export_tiled(outfile, lines, kmz=None, max_points=DEFAULT_MAX_POINTS):
+    """
+    Schreibt die Liste von (Name, lons, lats, Stationen oder None) als gekachelten
+    KML-Baum nach ``outfile`` (bzw. als ein KMZ). Gibt (Anzahl Punkte, Anzahl Kacheln) zurück.
+    """
+    with timing.stage("kml_tiles") as st:
+        tile_lines = [TileLine(*line) for line in lines]
+        count = sum(len(line.x) for line in tile_lines)
+        if count == 0:
+            return 0, 0
+        bbox = (min(float(line.x.min()) for line in tile_lines if len(line.x)),
+                min(float(line.y.min()) for line in tile_lines if len(line.y)),
+                max(float(line.x.max()) for line in tile_lines if len(line.x)),
+                max(float(line.y.max()) for line in tile_lines if len(line.y)))
+
+        if kmz is None:
+            kmz = kmlexport.is_kmz(outfile)
+        sink = KMZSink(outfile) if kmz else DirectorySink(outfile)
+        try:
+            tiles = TileWriter(tile_lines, sink, max_points).write(bbox)
+        finally:
+            sink.close()
+        st.add(points=count, tiles=tiles)
+    return count, tiles
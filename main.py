@@ -1,10 +1,137 @@
-def main():
+import argparse
+import sys
+
+# Exportformate (siehe exporters.EXPORTERS; hier wiederholt, damit --help ohne NumPy-Import auskommt)
+EXPORT_FORMATS = ["kml", "kmz", "geojson", "ndjson", "csv", "npy"]
+
+
+def parse_km_range(text):
+    from stations import parse_km_range
+    try:
+        return parse_km_range(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="TRAtoKML",
+        description="Konvertiert TRA-Dateien nach KML. Ohne Befehl wird die grafische Oberfläche gestartet."
+    )
+    parser.add_argument("--timing", action="store_true",
+                        help="Dauer der Verarbeitungsschritte messen und protokollieren (wie TRATOKML_TIMING=1)")
+    parser.add_argument("--profile", metavar="DATEI",
+                        help="Sitzung mit cProfile aufzeichnen und als pstats-Datei speichern")
+    commands = parser.add_subparsers(dest="command")
+
+    # Gemeinsame Argumente von batch und watch
+    conversion = argparse.ArgumentParser(add_help=False)
+    conversion.add_argument("-z", "--zone", required=True, choices=["2", "3", "4", "5"], help="GK-Zone")
+    conversion.add_argument("-o", "--out-dir", help="Ausgabeverzeichnis (Standard: neben der TRA-Datei)")
+    conversion.add_argument("-j", "--jobs", type=int, help="Anzahl paralleler Prozesse (Standard: alle Kerne)")
+    conversion.add_argument("--kmz", action="store_true", help="Komprimierte KMZ- statt KML-Dateien schreiben")
+    conversion.add_argument("--spacing", type=float,
+                            help="Elemente (Geraden, Bögen, Klothoiden) mit diesem Punktabstand in m verdichten")
+    conversion.add_argument("--max-error", type=float,
+                            help="Elemente verdichten, maximale Pfeilhöhe der Sehnen in m")
+    conversion.add_argument("--km", type=parse_km_range, metavar="VON-BIS",
+                            help="Nur diesen Kilometerbereich exportieren, z.B. 12.4-37.9")
+    conversion.add_argument("--tiles", action="store_true",
+                            help="Gekachelten KML-Baum (Regions/NetworkLinks) für große Netze schreiben")
+    conversion.add_argument("--format", choices=EXPORT_FORMATS,
+                            help="Exportformat (Standard: kml bzw. kmz mit --kmz)")
+    conversion.add_argument("--track-cache", action="store_true",
+                            help="Eingelesene und projizierte Trassen zwischenspeichern (Standard: direkt aus der Datei streamen)")
+
+    batch_parser = commands.add_parser("batch", parents=[conversion],
+                                       help="TRA-Dateien ohne GUI stapelweise nach KML konvertieren")
+    batch_parser.add_argument("inputs", nargs="+", help="TRA-Dateien, Verzeichnisse oder Glob-Muster")
+
+    watch_parser = commands.add_parser("watch", parents=[conversion],
+                                       help="Verzeichnisse überwachen und neue oder geänderte TRA-Dateien konvertieren")
+    watch_parser.add_argument("inputs", nargs="+", help="Zu überwachende Verzeichnisse, Glob-Muster oder Dateien")
+    watch_parser.add_argument("--manifest", help="Manifestdatei (Standard: .tratokml-manifest.json im Ausgabeverzeichnis)")
+    watch_parser.add_argument("--interval", type=float, default=5.0, help="Abfrageintervall in Sekunden")
+    watch_parser.add_argument("--settle", type=float, default=2.0,
+                              help="Dateien erst übernehmen, wenn sie so viele Sekunden unverändert sind")
+    watch_parser.add_argument("--max-pending", type=int,
+                              help="Höchstens so viele Aufträge gleichzeitig einreichen (Standard: 2 × Prozesse)")
+    watch_parser.add_argument("--once", action="store_true",
+                              help="Nur einmal abfragen, alles Gefundene konvertieren und beenden")
+
+    catalog_parser = commands.add_parser("catalog", help="Katalog (SQLite) vieler TRA-Dateien aufbauen und abfragen")
+    catalog_commands = catalog_parser.add_subparsers(dest="catalog_command", required=True)
+    build_parser_ = catalog_commands.add_parser("build", help="Dateien aufnehmen bzw. geänderte aktualisieren")
+    build_parser_.add_argument("inputs", nargs="+", help="TRA-Dateien, Verzeichnisse oder Glob-Muster")
+    build_parser_.add_argument("--db", help="Katalogdatei (Standard: catalog.sqlite im Cache-Verzeichnis)")
+    query_parser = catalog_commands.add_parser("query", help="Dateien nach Bounding Box und/oder Kilometerbereich suchen")
+    query_parser.add_argument("--bbox", type=float, nargs=4, metavar=("MIN_Y", "MIN_X", "MAX_Y", "MAX_X"),
+                              help="GK-Bounding-Box (Rechtswert/Hochwert)")
+    query_parser.add_argument("--km", type=parse_km_range, metavar="VON-BIS",
+                              help="Kilometerbereich, z.B. 12.4-37.9")
+    query_parser.add_argument("-z", "--zone", choices=["2", "3", "4", "5"], help="Nur Dateien dieser GK-Zone")
+    query_parser.add_argument("--db", help="Katalogdatei (Standard: catalog.sqlite im Cache-Verzeichnis)")
+
+    serve_parser = commands.add_parser("serve", help="Lokalen HTTP-Dienst für Konvertierungen starten")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Adresse (Standard: nur lokal, 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8765, help="Port (0: beliebiger freier Port)")
+    serve_parser.add_argument("-j", "--jobs", type=int, help="Anzahl paralleler Prozesse (Standard: alle Kerne)")
+    serve_parser.add_argument("--max-pending", type=int,
+                              help="Höchstens so viele Konvertierungsanfragen gleichzeitig annehmen (Standard: 4 × Prozesse)")
+    serve_parser.add_argument("--cache-dir", help="Ablage für Uploads und Ergebnisse")
+
+    return parser
+
+
+def main(argv=None):
     """
     Einstiegspunkt des Programms:
-    Ruft das GUI aus gui.py auf.
+    Ohne Befehl wird das GUI aus gui.py aufgerufen, mit ``batch`` die
+    Headless-Stapelkonvertierung (ohne tkinter, PIL und requests).
     """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "tiles", False) and getattr(args, "format", None) not in (None, "kml", "kmz"):
+        parser.error("--tiles ist nur mit den Formaten kml und kmz möglich")
+
+    import timing
+    if args.timing:
+        timing.enable()
+    if args.profile:
+        timing.start_profile(args.profile)
+
+    if args.command == "batch":
+        import batch
+        failures = batch.run_batch(args.inputs, args.zone, args.out_dir, args.jobs, args.kmz,
+                                   args.spacing, args.max_error, args.km, args.tiles, args.format,
+                                   args.track_cache)
+        if timing.is_enabled() and timing.summary():
+            print(timing.summary())
+        return 1 if failures else 0
+
+    if args.command == "watch":
+        import watch
+        watcher = watch.Watcher(args.inputs, args.zone, args.out_dir, args.jobs, args.kmz, args.spacing,
+                                args.max_error, args.km, args.manifest, args.interval, args.settle,
+                                args.max_pending, args.tiles, args.format, args.track_cache)
+        failures = watcher.run(once=args.once)
+        if timing.is_enabled() and timing.summary():
+            print(timing.summary())
+        return 1 if failures else 0
+
+    if args.command == "catalog":
+        import catalog
+        if args.catalog_command == "build":
+            return 1 if catalog.run_build(args.inputs, args.db) else 0
+        return catalog.run_query(args.db, args.bbox, args.km, args.zone)
+
+    if args.command == "serve":
+        import service
+        return service.run_service(args.host, args.port, args.jobs, args.max_pending, args.cache_dir)
+
     from gui import start_gui
     start_gui()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+Hintergrund-Thread für das Laden und Zeichnen der Karte.
+
+Es wird immer nur der jeweils neueste Auftrag ausgeführt: ein neuer Auftrag
+ersetzt einen noch wartenden, und ein laufender Auftrag kann über die
+übergebene ``cancelled``-Funktion erkennen, dass er überholt wurde.
+Ergebnisse landen in ``results`` und werden vom Tk-Hauptthread per ``after()``
+abgeholt; der Worker selbst ruft nie Tk-Funktionen auf.
+"""
+import queue
+import threading
+
+
+class LatestJobWorker:
+    def __init__(self, name="map-render"):
+        self.results = queue.Queue()
+        self._cond = threading.Condition()
+        self._job = None
+        self._generation = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """
+        Plant ``func(cancelled, *args)`` ein und gibt die Generationsnummer des Auftrags zurück.
+        Ein noch nicht gestarteter älterer Auftrag wird verworfen.
+        """
+        with self._cond:
+            self._generation += 1
+            self._job = (self._generation, func, args)
+            self._cond.notify()
+            return self._generation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._job is None:
+                    self._cond.wait()
+                generation, func, args = self._job
+                self._job = None
+
+            def cancelled(generation=generation):
+                return generation != self._generation
+
+            try:
+                result = func(cancelled, *args)
+            except Exception as e:
+                self.results.put((generation, None, e))
+            else:
+                if not cancelled():
+                    self.results.put((generation, result, None))
@@ -0,0 +1,173 @@
+"""
+Netzansicht: viele Trassen gemeinsam auf einer Karte.
+
+Alle Trassen eines Netzes werden in WGS84 hintereinander in zwei Arrays gehalten.
+Über die Bounding Boxes aller Teilstücke (Verbindung zweier aufeinanderfolgender
+Punkte einer Trasse) wird ein gleichmäßiges Gitter als Raumindex aufgebaut; eine
+Ausschnittsabfrage kostet damit nur so viel, wie im Ausschnitt liegt, unabhängig
+von der Größe des ganzen Netzes.
+"""
+import os
+
+import numpy as np
+
+import timing
+import trackcache
+
+# Angestrebte Anzahl Teilstücke je Gitterzelle und Obergrenze der Zellenzahl
+SEGMENTS_PER_CELL = 8
+MAX_GRID_CELLS = 1 << 20
+
+
+class GridIndex:
+    """
+    Gleichmäßiges Gitter über Rechtecken (minx, miny, maxx, maxy). Jedes Rechteck ist in
+    allen Zellen eingetragen, die es berührt; die Einträge liegen nach Zellennummer
+    (Zeile * nx + Spalte) sortiert in einem Array (CSR), sodass die Zellen einer
+    Gitterzeile einen zusammenhängenden Bereich bilden.
+    """
+
+    def __init__(self, minx, miny, maxx, maxy):
+        self.minx, self.miny, self.maxx, self.maxy = (np.asarray(a, dtype=float) for a in (minx, miny, maxx, maxy))
+        n = len(self.minx)
+        if n:
+            self.bounds = (float(self.minx.min()), float(self.miny.min()),
+                           float(self.maxx.max()), float(self.maxy.max()))
+        else:
+            self.bounds = (0.0, 0.0, 0.0, 0.0)
+        x0, y0, x1, y1 = self.bounds
+        width, height = max(x1 - x0, 1e-12), max(y1 - y0, 1e-12)
+
+        # Zellgröße: etwa SEGMENTS_PER_CELL Einträge je Zelle, aber nicht kleiner als
+        # ein typisches Rechteck, damit lange Teilstücke nicht in sehr viele Zellen fallen
+        cells = min(max(n // SEGMENTS_PER_CELL, 1), MAX_GRID_CELLS)
+        cell = np.sqrt(width * height / cells)
+        if n:
+            cell = max(cell, float(np.median(np.maximum(self.maxx - self.minx, self.maxy - self.miny))))
+        self.nx = max(min(int(np.ceil(width / cell)), MAX_GRID_CELLS), 1)
+        self.ny = max(min(int(np.ceil(height / cell)), MAX_GRID_CELLS // self.nx), 1)
+        self.cell_w = width / self.nx
+        self.cell_h = height / self.ny
+
+        ix0, iy0 = self._cell(self.minx, self.miny)
+        ix1, iy1 = self._cell(self.maxx, self.maxy)
+        spans_x = ix1 - ix0 + 1
+        spans = spans_x * (iy1 - iy0 + 1)
+
+        # Je Rechteck alle berührten Zellen aufzählen (vektorisiert über np.repeat)
+        ids = np.repeat(np.arange(n), spans)
+        local = np.arange(len(ids)) - np.repeat(np.cumsum(spans) - spans, spans)
+        cx = ix0[ids] + local % spans_x[ids]
+        cy = iy0[ids] + local // spans_x[ids]
+        cell_ids = cy * self.nx + cx
+        order = np.argsort(cell_ids, kind='stable')
+        self.entries = ids[order]
+        self.cell_start = np.searchsorted(cell_ids[order], np.arange(self.nx * self.ny + 1))
+
+    def __len__(self):
+        return len(self.minx)
+
+    def _cell(self, x, y):
+        ix = np.clip(((np.asarray(x) - self.bounds[0]) / self.cell_w).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip(((np.asarray(y) - self.bounds[1]) / self.cell_h).astype(np.int64), 0, self.ny - 1)
+        return ix, iy
+
+    def query(self, bbox):
+        """Sortierte Nummern aller Rechtecke, die ``bbox`` = (minx, miny, maxx, maxy) schneiden."""
+        qx0, qy0, qx1, qy1 = bbox
+        x0, y0, x1, y1 = self.bounds
+        if not len(self) or qx1 < x0 or qx0 > x1 or qy1 < y0 or qy0 > y1:
+            return np.empty(0, dtype=np.int64)
+        if qx0 <= x0 and qy0 <= y0 and qx1 >= x1 and qy1 >= y1:
+            return np.arange(len(self))
+
+        ix0, iy0 = self._cell(qx0, qy0)
+        ix1, iy1 = self._cell(qx1, qy1)
+        rows = np.arange(iy0, iy1 + 1) * self.nx
+        candidates = np.concatenate([self.entries[self.cell_start[r + ix0]:self.cell_start[r + ix1 + 1]]
+                                     for r in rows.tolist()])
+        if len(candidates) > len(self) // 16:
+            # Viele Treffer: Markieren ist schneller als Sortieren
+            mark = np.zeros(len(self), dtype=bool)
+            mark[candidates] = True
+            candidates = np.flatnonzero(mark)
+        else:
+            candidates = np.unique(candidates)
+        hit = ((self.maxx[candidates] >= qx0) & (self.minx[candidates] <= qx1) &
+               (self.maxy[candidates] >= qy0) & (self.miny[candidates] <= qy1))
+        return candidates[hit]
+
+
+class TrackNetwork:
+    """
+    Mehrere Trassen in WGS84 mit gemeinsamem Raumindex über alle Teilstücke.
+
+    ``x``/``y`` (lon/lat) enthalten alle Punkte aller Trassen hintereinander;
+    ``offsets[i]:offsets[i+1]`` ist der Bereich der Trasse ``names[i]``. Teilstück s
+    verbindet die Punkte ``segment_start[s]`` und ``segment_start[s] + 1``.
+    """
+
+    def __init__(self, names, lons, lats):
+        self.names = list(names)
+        lengths = np.array([len(a) for a in lons], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.x = np.concatenate([np.asarray(a, dtype=float) for a in lons]) if lons else np.empty(0)
+        self.y = np.concatenate([np.asarray(a, dtype=float) for a in lats]) if lats else np.empty(0)
+
+        # Teilstücke: jeder Punkt außer dem letzten seiner Trasse
+        is_last = np.zeros(len(self.x), dtype=bool)
+        is_last[self.offsets[1:][lengths > 0] - 1] = True
+        self.segment_start = np.flatnonzero(~is_last)
+        a, b = self.segment_start, self.segment_start + 1
+        with timing.stage("network_index", segments=len(a)):
+            self.index = GridIndex(np.minimum(self.x[a], self.x[b]), np.minimum(self.y[a], self.y[b]),
+                                   np.maximum(self.x[a], self.x[b]), np.maximum(self.y[a], self.y[b]))
+
+    @classmethod
+    def from_tracks(cls, tracks, zone, names=None):
+        """Baut das Netz aus TRATrack-Objekten (Elementanfänge, projiziert in GK-Zone ``zone``)."""
+        lons, lats = [], []
+        for track in tracks:
+            lon, lat = trackcache.track_wgs84(track, zone)
+            lons.append(lon)
+            lats.append(lat)
+        if names is None:
+            names = [f"Trasse {i + 1}" for i in range(len(tracks))]
+        return cls(names, lons, lats)
+
+    @classmethod
+    def from_files(cls, paths, zone):
+        """Liest die TRA-Dateien ``paths`` (über trackcache) und baut daraus das Netz."""
+        tracks = [trackcache.parse_tra_file(p) for p in paths]
+        return cls.from_tracks(tracks, zone, [os.path.basename(p) for p in paths])
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def point_count(self):
+        return len(self.x)
+
+    @property
+    def bounds(self):
+        """(min_lon, min_lat, max_lon, max_lat) über alle Punkte."""
+        if not len(self.x):
+            return None
+        return float(self.x.min()), float(self.y.min()), float(self.x.max()), float(self.y.max())
+
+    def visible_segments(self, bbox):
+        """Nummern der Teilstücke, die den Ausschnitt ``bbox`` = (min_lon, min_lat, max_lon, max_lat) schneiden."""
+        return self.index.query(bbox)
+
+    def visible_runs(self, bbox):
+        """
+        Zusammenhängende sichtbare Abschnitte als Liste von Punktindex-Arrays. Aufeinander
+        folgende sichtbare Teilstücke derselben Trasse ergeben einen Abschnitt.
+        """
+        start = self.segment_start[self.visible_segments(bbox)]
+        if not len(start):
+            return []
+        breaks = np.flatnonzero(np.diff(start) != 1) + 1
+        firsts = start[np.concatenate(([0], breaks))]
+        lasts = start[np.concatenate((breaks - 1, [len(start) - 1]))] + 1
+        return [np.arange(a, b + 1) for a, b in zip(firsts.tolist(), lasts.tolist())]
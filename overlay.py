@@ -0,0 +1,91 @@
+"""
+Zeichnen der Trasse als transparente Overlay-Ebene über der Grundkarte.
+
+Unabhängig von tkinter, damit es im Hintergrund-Thread der GUI wie auch in
+Benchmarks verwendet werden kann.
+"""
+import numpy as np
+from PIL import Image, ImageDraw
+
+import simplify
+import timing
+
+
+def render_overlay(lod, selected, bbox, width, height):
+    """
+    Zeichnet zwei Linien auf eine transparente RGBA-Ebene der Größe width × height:
+      - Rot: Gesamte Trasse (alle Punkte),
+      - Grün: Ausgewählte Punkte.
+    ``lod`` ist eine simplify.LODPyramid in WGS84, ``bbox`` = (min_lon, min_lat, max_lon, max_lat).
+    Gezeichnet wird die gröbste Detailstufe mit höchstens einem halben Pixel Abweichung,
+    beschnitten auf die im Ausschnitt sichtbaren Abschnitte.
+    """
+    with timing.stage("draw_overlay") as st:
+        overlay, vertices = _render_overlay(lod, selected, bbox, width, height)
+        st.add(vertices=vertices)
+    return overlay
+
+
+def _render_overlay(lod, selected, bbox, width, height):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    vertices = 0
+    overlay = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    max_error = 0.5 * (max_lon - min_lon) / width
+    runs = lod.visible_indices(max_error, bbox)
+
+    def pixel_path(idx):
+        px = (lod.x[idx] - min_lon) / (max_lon - min_lon) * width
+        py = (max_lat - lod.y[idx]) / (max_lat - min_lat) * height
+        return simplify.to_pixel_path(px, py)
+
+    # Gesamte Trasse (rot), je sichtbarem Abschnitt
+    for idx in runs:
+        path = pixel_path(idx)
+        vertices += len(path)
+        if len(path) >= 2:
+            draw.line(path, fill="red", width=5)
+
+    # Ausgewählte Punkte (grün), je Auswahlbereich
+    if runs and selected.sum() >= 2:
+        ranges = simplify.selection_ranges(selected)
+        for idx in runs:
+            for selection in simplify.selection_paths(idx, selected, ranges):
+                path = pixel_path(selection)
+                vertices += len(path)
+                if len(path) >= 2:
+                    draw.line(path, fill="green", width=5)
+
+    return overlay, vertices
+
+
+def render_network(network, bbox, width, height):
+    """
+    Zeichnet die im Ausschnitt ``bbox`` sichtbaren Teilstücke eines network.TrackNetwork
+    rot auf eine transparente RGBA-Ebene. Über den Raumindex werden nur sichtbare
+    Teilstücke betrachtet; aufeinanderfolgende Pixelduplikate entfallen vor dem Zeichnen.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    overlay = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    with timing.stage("draw_network") as st:
+        runs = network.visible_runs(bbox)
+        vertices = 0
+        if runs:
+            idx = np.concatenate(runs)
+            px = (network.x[idx] - min_lon) / (max_lon - min_lon) * width
+            py = (max_lat - network.y[idx]) / (max_lat - min_lat) * height
+            bounds = np.cumsum([len(r) for r in runs])[:-1]
+            for rx, ry in zip(np.split(px, bounds), np.split(py, bounds)):
+                path = simplify.to_pixel_path(rx, ry)
+                vertices += len(path)
+                if len(path) >= 2:
+                    draw.line(path, fill="red", width=3)
+        st.add(runs=len(runs), vertices=vertices)
+    return overlay
+
+
+def compose_map(base_image, overlay_image):
+    """Legt die Overlay-Ebene über die (RGBA-)Grundkarte."""
+    return Image.alpha_composite(base_image, overlay_image)
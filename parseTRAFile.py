@@ -1,15 +1,207 @@
+import os
 import struct
 
+import numpy as np
+
+import timing
+
+# C++-Struktur TRA_DATA, Little Endian, ohne Padding
+RECORD_FORMAT = '<6dh3di'  # 6 doubles, 1 short, 3 doubles, 1 int
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)  # sollte 78 Bytes ergeben
+
+# Gepackter NumPy-Datentyp mit einer Spalte pro Feld (identisch zu RECORD_FORMAT)
+TRA_DTYPE = np.dtype([
+    ('rR1', '<f8'),   # Radius 1 (Start)
+    ('rR2', '<f8'),   # Radius 2 (End)
+    ('rY', '<f8'),    # East Coordinate (Start)
+    ('rX', '<f8'),    # North Coordinate (Start)
+    ('rT', '<f8'),    # Bearing (Start)
+    ('rS', '<f8'),    # Station (Start)
+    ('nKz', '<i2'),   # Element Type
+    ('rL', '<f8'),    # Length (Start)
+    ('rU1', '<f8'),   # Superelevation (Start)
+    ('rU2', '<f8'),   # Superelevation (End)
+    ('iC', '<i4'),    # Distance to Route
+])
+assert TRA_DTYPE.itemsize == RECORD_SIZE
+
+# Standard-Blockgröße (Datensätze) für das blockweise Lesen großer Dateien
+DEFAULT_CHUNK_SIZE = 65536
+
+# Bisherige Schlüssel der Datensatz-Dictionaries -> Feldname in TRA_DATA
+FIELD_ALIASES = {
+    'station': 'rS',
+    'direction': 'rT',
+    'radius': 'rR1',
+}
+
+
+class TRATrack:
+    """
+    Spaltenorientierte Trasse aus einer TRA-Datei.
+
+    Die Datensätze liegen in einem gepackten Structured Array (``data``) mit einer
+    Spalte pro TRA_DATA-Feld. Spalten sind direkt als Attribute erreichbar
+    (``track.rY``, ``track.nKz``, ... sowie die Aliase ``station``, ``direction``
+    und ``radius``).
+
+    Zusätzlich verhält sich das Objekt wie die bisherige Liste von Dictionaries:
+    ``len(track)``, ``track[i]['rY']`` und ``for rec in track`` funktionieren wie gehabt.
+    """
+
+    def __init__(self, data, header=None):
+        self.data = data
+        self.header = header
+        self.digest = None  # Inhaltshash der Quelldatei (gesetzt von trackcache)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=TRA_DTYPE))
+
+    def column(self, name):
+        """Gibt die Spalte ``name`` (Feldname oder Alias) als NumPy-Array zurück."""
+        return self.data[FIELD_ALIASES.get(name, name)]
+
+    def __getattr__(self, name):
+        if name in FIELD_ALIASES or name in TRA_DTYPE.names:
+            return self.column(name)
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for i in range(len(self.data)):
+            yield self.record(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.record(index)
+        return TRATrack(self.data[index], self.header)
+
+    def record(self, index):
+        """Gibt Datensatz ``index`` als Dictionary zurück (kompatibel zum alten Listenformat)."""
+        values = self.data[index].item()
+        rec = dict(zip(TRA_DTYPE.names, values))
+        for alias, field in FIELD_ALIASES.items():
+            rec[alias] = rec[field]
+        return rec
+
+    def to_dicts(self):
+        return list(self)
+
+
+def read_tra_header(filepath):
+    """
+    Liest nur den Header einer TRA-Datei und gibt (header, count) zurück.
+
+    ``count`` ist die Anzahl der tatsächlich vollständig vorhandenen Datensätze
+    (iNumData = nKz + 1, begrenzt durch die Dateigröße). Bei zu kurzen Dateien
+    ist ``header`` None und ``count`` 0.
+    """
+    with open(filepath, 'rb') as file:
+        raw = file.read(RECORD_SIZE)
+        size = os.fstat(file.fileno()).st_size
+    return parse_tra_header(raw, size)
+
+
+def parse_tra_header(raw, size):
+    """
+    Wie read_tra_header, aber aus den ersten Bytes ``raw`` einer TRA-Datei mit
+    ``size`` Bytes Gesamtgröße. Gibt (header, count) zurück.
+    """
+    if len(raw) < RECORD_SIZE:
+        print("Datei zu kurz für einen Header-Datensatz.")
+        return None, 0
+
+    header = np.frombuffer(raw[:RECORD_SIZE], dtype=TRA_DTYPE, count=1)[0].copy()
+    iNumData = int(header['nKz']) + 1
+
+    available = (size - RECORD_SIZE) // RECORD_SIZE
+    count = max(iNumData, 0)
+    if available < count:
+        print(f"Nicht genügend Daten für Datensatz {available+1}.")
+        count = available
+    return header, count
+
+
+def map_tra_records(filepath):
+    """
+    Bildet die Datensätze einer TRA-Datei per mmap als schreibgeschütztes
+    Structured Array ab, ohne die Datei einzulesen. Gibt (header, records) zurück.
+    """
+    header, count = read_tra_header(filepath)
+    if count == 0:
+        return header, np.empty(0, dtype=TRA_DTYPE)
+    records = np.memmap(filepath, dtype=TRA_DTYPE, mode='r', offset=RECORD_SIZE, shape=(count,))
+    return header, records
+
+
+def iter_tra_chunks(filepath, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Liefert die Datensätze einer TRA-Datei als Folge von Structured-Array-Blöcken
+    mit höchstens ``chunk_size`` Datensätzen.
+
+    Die Blöcke sind Views in die per mmap abgebildete Datei (keine Kopie); der
+    Speicherbedarf hängt damit nur von der Blockgröße ab, nicht von der Dateigröße.
+    Wer einen Block über die Iteration hinaus behalten will, muss ihn kopieren.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Ungültige Blockgröße: {chunk_size}")
+    _, records = map_tra_records(filepath)
+    for start in range(0, len(records), chunk_size):
+        yield records[start:start + chunk_size]
+
+
+def parse_tra_track(filepath):
+    """
+    Parst eine TRA-Datei spaltenorientiert in einem Durchgang und gibt ein TRATrack zurück.
+
+    Der Header ist selbst ein TRA_DATA-Datensatz; aus seinem nKz ergibt sich die
+    Anzahl der folgenden Datensätze (iNumData = nKz + 1). Ist die Datei kürzer,
+    werden nur die vollständig vorhandenen Datensätze übernommen.
+    """
+    with timing.stage("parse") as st:
+        header, records = map_tra_records(filepath)
+        if header is None:
+            return TRATrack.empty()
+
+        track = TRATrack(np.array(records), header)
+        st.add(records=len(track), bytes=len(track) * RECORD_SIZE)
+
+    print(f"TRA-Datei erfolgreich eingelesen. Anzahl der Datensätze: {len(track)}")
+    return track
+
+
+def parse_tra_buffer(buffer):
+    """
+    Wie parse_tra_track, aber aus dem bereits gelesenen Inhalt ``buffer`` (bytes) einer
+    TRA-Datei. Die Datensätze werden kopiert, das Ergebnis hängt nicht von ``buffer`` ab.
+    """
+    with timing.stage("parse") as st:
+        header, count = parse_tra_header(buffer[:RECORD_SIZE], len(buffer))
+        if header is None:
+            return TRATrack.empty()
+
+        records = np.frombuffer(buffer, dtype=TRA_DTYPE, count=count, offset=RECORD_SIZE)
+        track = TRATrack(records.copy(), header)
+        st.add(records=len(track), bytes=len(track) * RECORD_SIZE)
+
+    print(f"TRA-Datei erfolgreich eingelesen. Anzahl der Datensätze: {len(track)}")
+    return track
+
+
 def parse_tra_file(filepath):
     """
-    Parst eine TRA-Datei im Binärformat und gibt eine Liste von Datensätzen zurück.
-    Jeder Datensatz enthält:
+    Parst eine TRA-Datei im Binärformat und gibt die Datensätze als TRATrack zurück.
+    Jeder Datensatz ist als Dictionary abrufbar und enthält:
       - 'station'   : rS (double)
       - 'rY'        : rY (double)  --> Rechtswert (X im GK-System)
       - 'rX'        : rX (double)  --> Hochwert (Y im GK-System)
       - 'direction' : rT (double)
       - 'radius'    : rR1 (double)
-    
+    sowie alle übrigen Felder von TRA_DATA unter ihrem Originalnamen.
+
     C++-Struktur (TRA_DATA):
       double rR1;    // Radius 1 (Start)
       double rR2;    // Radius 2 (End)
@@ -22,43 +214,11 @@ def parse_tra_file(filepath):
       double rU1;    // Superelevation (Start)
       double rU2;    // Superelevation (End)
       int    iC;     // Distance to Route
-    
+
     Gesamtgröße pro Datensatz: 6*8 + 2 + 3*8 + 4 = 78 Bytes.
+
+    Bereits gelesene Dateien werden über trackcache (Inhaltshash) aus dem
+    Zwischenspeicher geladen; TRATOKML_TRACK_CACHE=0 schaltet das ab.
     """
-    records = []
-    record_format = '<6dh3di'  # 6 doubles, 1 short, 3 doubles, 1 int
-    record_size = struct.calcsize(record_format)  # sollte 78 Bytes ergeben
-    
-    with open(filepath, 'rb') as file:
-        data = file.read()
-    
-    offset = 0
-    if len(data) < record_size:
-        print("Datei zu kurz für einen Header-Datensatz.")
-        return records
-    
-    # Header auslesen
-    header_tuple = struct.unpack(record_format, data[offset:offset+record_size])
-    offset += record_size
-    # header_tuple = (rR1, rR2, rY, rX, rT, rS, nKz, rL, rU1, rU2, iC)
-    nKz = header_tuple[6]
-    iNumData = int(nKz) + 1
-    
-    # Lese iNumData Datensätze
-    for i in range(iNumData):
-        if offset + record_size > len(data):
-            print(f"Nicht genügend Daten für Datensatz {i+1}.")
-            break
-        values = struct.unpack(record_format, data[offset:offset+record_size])
-        offset += record_size
-        record = {
-            'station': values[5],      # rS
-            'rY': values[2],           # rY
-            'rX': values[3],           # rX
-            'direction': values[4],    # rT
-            'radius': values[0]        # rR1
-        }
-        records.append(record)
-    
-    print(f"TRA-Datei erfolgreich eingelesen. Anzahl der Datensätze: {len(records)}")
-    return records
+    import trackcache
+    return trackcache.parse_tra_file(filepath)
@@ -1,4 +1,20 @@
-import pyproj
+"""
+GK-Zonen (DHDN, EPSG:5682–5685) und Transformationen nach bzw. von WGS84.
+
+pyproj wird erst beim ersten Erzeugen eines CRS bzw. Transformers geladen, damit
+Werkzeuge, die nur TRA-Dateien lesen, den Import nicht bezahlen.
+
+Für die Kartenvorschau gibt es mit PreviewTransform eine Näherung: ein Polynom in
+Rechts- und Hochwert, angepasst an wenige exakt transformierte Stützpunkte über der
+Ausdehnung der Trasse. Alle Punkte werden danach mit reiner NumPy-Arithmetik
+projiziert; der Export verwendet weiterhin die exakte Transformation.
+"""
+import functools
+import threading
+
+import numpy as np
+
+import timing
 
 EPSG_5682 = (
     "+proj=tmerc +lat_0=0 +lon_0=6 +k=1 +x_0=2500000 +y_0=0 +ellps=bessel "
@@ -30,12 +46,215 @@ GK_PROJECTIONS = {
 
 WGS84 = "EPSG:4326"
 
+# Transformationsrichtungen für get_transformer
+TO_WGS84 = "to_wgs84"
+FROM_WGS84 = "from_wgs84"
+
+# Vorschau-Projektion: angestrebte Genauigkeit (m), höchster Polynomgrad,
+# Stützpunkte je Achse und Prüfpunkte je Achse für die Fehlerabschätzung
+PREVIEW_TOLERANCE = 0.05
+PREVIEW_MAX_DEGREE = 6
+PREVIEW_CONTROL_POINTS = 13
+PREVIEW_CHECK_POINTS = 25
+
+# Meter je Breitengrad (Näherung, genügt für Fehlerangaben)
+METERS_PER_DEGREE = 111320.0
+
+_transformers = {}
+_transformers_lock = threading.Lock()
+
+
+def _zone_key(zone):
+    zone_str = str(zone).strip()
+    if zone_str not in GK_PROJECTIONS:
+        raise ValueError(f"Unsupported GK zone: {zone_str}. Muss '2', '3', '4' oder '5' sein.")
+    return zone_str
+
+
+@functools.lru_cache(maxsize=None)
+def _build_gk_crs(zone_str):
+    import pyproj
+    return pyproj.CRS.from_proj4(GK_PROJECTIONS[zone_str])
+
+
 def get_gk_crs(zone):
     """
     Gibt ein pyproj.CRS-Objekt für die übergebene GK-Zone zurück (z.B. '2', '3', '4', '5').
+    Das CRS wird je Zone nur einmal erzeugt.
     """
-    zone_str = str(zone)
-    if zone_str not in GK_PROJECTIONS:
-        raise ValueError(f"Unsupported GK zone: {zone_str}. Muss '2', '3', '4' oder '5' sein.")
-    
-    return pyproj.CRS.from_proj4(GK_PROJECTIONS[zone_str])
+    return _build_gk_crs(_zone_key(zone))
+
+
+def get_transformer(zone, direction=TO_WGS84):
+    """
+    Gibt einen zwischengespeicherten pyproj.Transformer (always_xy) für die GK-Zone zurück.
+    ``direction`` ist TO_WGS84 (GK -> WGS84) oder FROM_WGS84 (WGS84 -> GK).
+    Die Registry ist threadsicher; pyproj-Transformer selbst sind ab pyproj 3.1 threadsicher.
+    """
+    key = (_zone_key(zone), direction)
+    transformer = _transformers.get(key)
+    if transformer is None:
+        with _transformers_lock:
+            transformer = _transformers.get(key)
+            if transformer is None:
+                import pyproj
+                gk_crs = get_gk_crs(key[0])
+                if direction == TO_WGS84:
+                    transformer = pyproj.Transformer.from_crs(gk_crs, WGS84, always_xy=True)
+                elif direction == FROM_WGS84:
+                    transformer = pyproj.Transformer.from_crs(WGS84, gk_crs, always_xy=True)
+                else:
+                    raise ValueError(f"Unbekannte Transformationsrichtung: {direction}")
+                _transformers[key] = transformer
+    return transformer
+
+
+def gk_to_wgs84(zone, rY, rX):
+    """
+    Transformiert ganze Koordinaten-Arrays (Rechtswert rY, Hochwert rX) in einem Aufruf
+    nach WGS84. Gibt (lons, lats) als NumPy-Arrays zurück.
+    """
+    rY = np.asarray(rY, dtype=float)
+    with timing.stage("projection", points=len(rY)):
+        lons, lats = get_transformer(zone, TO_WGS84).transform(rY, np.asarray(rX, dtype=float))
+    return np.asarray(lons), np.asarray(lats)
+
+
+def wgs84_to_gk(zone, lons, lats):
+    """Umkehrung von gk_to_wgs84: gibt (rY, rX) als NumPy-Arrays zurück."""
+    rY, rX = get_transformer(zone, FROM_WGS84).transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    return np.asarray(rY), np.asarray(rX)
+
+
+def transform_chunks(chunks, zone):
+    """
+    Transformiert eine Folge von TRA-Datensatzblöcken (z.B. aus
+    parseTRAFile.iter_tra_chunks) blockweise von GK nach WGS84.
+    Liefert für jeden Block ein Tupel (lons, lats) als NumPy-Arrays.
+    """
+    for chunk in chunks:
+        yield gk_to_wgs84(zone, chunk['rY'], chunk['rX'])
+
+
+def _degrees_to_meters(dlon, dlat, lats):
+    """Abstand in Metern zu Koordinatendifferenzen in Grad (lokale Näherung)."""
+    return np.hypot(dlon * np.cos(np.radians(lats)), dlat) * METERS_PER_DEGREE
+
+
+class PreviewTransform:
+    """
+    Näherung der Transformation GK -> WGS84 über der Bounding Box ``bounds`` =
+    (min_y, min_x, max_y, max_x) als Polynom in den normierten Koordinaten.
+
+    Die Koeffizienten werden per Ausgleichsrechnung aus einem Gitter von Stützpunkten
+    bestimmt, die einmal exakt (pyproj) transformiert werden. Der Grad wird erhöht, bis die
+    Abweichung auf einem versetzten Prüfgitter höchstens die Hälfte von ``tolerance`` (m)
+    beträgt, als Reserve für Punkte zwischen den Prüfpunkten; ``error_bound`` ist die dort
+    gemessene größte Abweichung.
+    """
+
+    def __init__(self, zone, bounds, tolerance=PREVIEW_TOLERANCE):
+        self.zone = _zone_key(zone)
+        self.bounds = tuple(float(b) for b in bounds)
+        self.tolerance = tolerance
+        min_y, min_x, max_y, max_x = self.bounds
+        self.center = ((min_y + max_y) / 2, (min_x + max_x) / 2)
+        # Halbe Ausdehnung, mindestens 1 m, damit auch gerade Nord-Süd-Trassen normierbar sind
+        self.half = (max((max_y - min_y) / 2, 1.0), max((max_x - min_x) / 2, 1.0))
+
+        # Stützpunkte auf Tschebyschow-Knoten, Prüfpunkte dazwischen und auf dem Rand
+        nodes = np.cos(np.pi * (np.arange(PREVIEW_CONTROL_POINTS) + 0.5) / PREVIEW_CONTROL_POINTS)
+        cu, cv = (a.ravel() for a in np.meshgrid(nodes, nodes))
+        check = np.linspace(-1.0, 1.0, PREVIEW_CHECK_POINTS)
+        ku, kv = (a.ravel() for a in np.meshgrid(check, check))
+        with timing.stage("preview_fit", points=len(cu) + len(ku)):
+            control = self._exact(cu, cv)
+            expected = self._exact(ku, kv)
+            for degree in range(1, PREVIEW_MAX_DEGREE + 1):
+                self._fit(degree, cu, cv, *control)
+                lons, lats = self._evaluate(ku, kv)
+                self.error_bound = float(_degrees_to_meters(lons - expected[0], lats - expected[1],
+                                                            expected[1]).max())
+                if self.error_bound <= tolerance / 2:
+                    break
+
+    @property
+    def accurate(self):
+        """True, wenn die Näherung die angestrebte Genauigkeit erreicht."""
+        return self.error_bound <= self.tolerance
+
+    def _normalize(self, rY, rX):
+        u = (np.asarray(rY, dtype=float) - self.center[0]) / self.half[0]
+        v = (np.asarray(rX, dtype=float) - self.center[1]) / self.half[1]
+        return u, v
+
+    def _exact(self, u, v):
+        rY = self.center[0] + u * self.half[0]
+        rX = self.center[1] + v * self.half[1]
+        lons, lats = get_transformer(self.zone, TO_WGS84).transform(rY, rX)
+        return np.asarray(lons), np.asarray(lats)
+
+    def _fit(self, degree, u, v, lons, lats):
+        """Koeffizienten c[i, j] von u**i * v**j (i + j <= degree) für lon und lat."""
+        terms = [(i, j) for i in range(degree + 1) for j in range(degree + 1 - i)]
+        design = np.stack([u ** i * v ** j for i, j in terms], axis=1)
+        solution = np.linalg.lstsq(design, np.stack((lons, lats), axis=1), rcond=None)[0]
+        self.degree = degree
+        self.coeffs = np.zeros((2, degree + 1, degree + 1))
+        for k, (i, j) in enumerate(terms):
+            self.coeffs[:, i, j] = solution[k]
+
+    def _evaluate(self, u, v):
+        """Horner-Schema in u, innen in v; je Koordinate degree * (degree + 3) / 2 Multiplikationen."""
+        result = []
+        for c in self.coeffs:
+            value = np.zeros_like(u)
+            for i in range(self.degree, -1, -1):
+                inner = np.full_like(v, c[i, self.degree - i])
+                for j in range(self.degree - i - 1, -1, -1):
+                    inner *= v
+                    inner += c[i, j]
+                value *= u
+                value += inner
+            result.append(value)
+        return result[0], result[1]
+
+    def transform(self, rY, rX):
+        """Projiziert ganze Arrays genähert nach WGS84; gibt (lons, lats) zurück."""
+        return self._evaluate(*self._normalize(rY, rX))
+
+    def deviation(self, rY, rX, lons, lats):
+        """
+        Größte Abweichung (m) der Näherung von den exakt transformierten Koordinaten
+        ``lons``/``lats`` derselben Punkte, z.B. zur Prüfung beim Export.
+        """
+        if not len(lons):
+            return 0.0
+        approx_lons, approx_lats = self.transform(rY, rX)
+        return float(_degrees_to_meters(approx_lons - lons, approx_lats - lats, lats).max())
+
+    def validate(self, rY, rX, lons, lats):
+        """Gibt (Abweichung in m, True wenn höchstens ``tolerance``) für exakt transformierte Punkte zurück."""
+        deviation = self.deviation(rY, rX, lons, lats)
+        return deviation, deviation <= self.tolerance
+
+
+def fit_preview_transform(zone, rY, rX, tolerance=PREVIEW_TOLERANCE):
+    """PreviewTransform über der Bounding Box der Punkte (rY, rX)."""
+    rY = np.asarray(rY, dtype=float)
+    rX = np.asarray(rX, dtype=float)
+    if not len(rY):
+        raise ValueError("Keine Punkte für die Vorschau-Projektion.")
+    return PreviewTransform(zone, (rY.min(), rX.min(), rY.max(), rX.max()), tolerance)
+
+
+def gk_to_wgs84_preview(zone, rY, rX, tolerance=PREVIEW_TOLERANCE):
+    """
+    Wie gk_to_wgs84, aber über eine an die Punkte angepasste Näherung (PreviewTransform).
+    Gibt (lons, lats, transform) zurück; ``transform.error_bound`` ist die geschätzte
+    größte Abweichung in Metern.
+    """
+    transform = fit_preview_transform(zone, rY, rX, tolerance)
+    with timing.stage("preview_projection", points=len(rY)):
+        lons, lats = transform.transform(rY, rX)
+    return lons, lats, transform
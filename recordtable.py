@@ -0,0 +1,184 @@
+"""
+Virtuelle Datensatztabelle mit Auswahlmodell.
+
+Die Auswahl liegt als boolesches NumPy-Array im SelectionModel; die Tabelle
+erzeugt nur so viele Treeview-Zeilen, wie sichtbar sind, und beschreibt sie beim
+Blättern neu. Laden und Klicken kosten damit unabhängig von der Anzahl der
+Datensätze gleich viel.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+CHECKED = "☑"
+UNCHECKED = "☐"
+
+# Tk-Zustandsbit der Umschalttaste in event.state
+SHIFT_MASK = 0x0001
+
+
+class SelectionModel:
+    """Auswahlzustand als boolesches Array mit mitgeführter Anzahl ausgewählter Einträge."""
+
+    def __init__(self, size=0, value=True):
+        self.reset(size, value)
+
+    def reset(self, size, value=True):
+        self.mask = np.full(size, bool(value))
+        self.count = size if value else 0
+
+    def __len__(self):
+        return len(self.mask)
+
+    @property
+    def all_selected(self):
+        return self.count == len(self.mask)
+
+    @property
+    def any_selected(self):
+        return self.count > 0
+
+    def is_selected(self, index):
+        return bool(self.mask[index])
+
+    def set(self, index, value):
+        value = bool(value)
+        if self.mask[index] != value:
+            self.mask[index] = value
+            self.count += 1 if value else -1
+
+    def toggle(self, index):
+        self.set(index, not self.mask[index])
+        return bool(self.mask[index])
+
+    def set_range(self, start, stop, value):
+        """Setzt die Einträge start..stop-1 auf ``value``."""
+        part = self.mask[start:stop]
+        self.count += (len(part) - int(part.sum())) if value else -int(part.sum())
+        part[:] = bool(value)
+
+    def set_where(self, condition, value):
+        """Setzt alle Einträge, für die das boolesche Array ``condition`` wahr ist, auf ``value``."""
+        condition = np.asarray(condition, dtype=bool)
+        if value:
+            self.mask |= condition
+        else:
+            self.mask &= ~condition
+        self.count = int(self.mask.sum())
+
+    def set_all(self, value):
+        self.reset(len(self.mask), value)
+
+
+class VirtualRecordTable(ttk.Frame):
+    """
+    Tabelle mit Auswahlspalte, die nur die sichtbaren Zeilen als Treeview-Einträge anlegt.
+
+    ``row_values(index)`` liefert die Werte der übrigen Spalten für Datensatz ``index``;
+    ``on_change`` wird nach jeder Auswahländerung aufgerufen. Klick in die Auswahlspalte
+    schaltet einen Datensatz um, Umschalt+Klick setzt den ganzen Bereich seit dem
+    letzten Klick auf denselben Zustand.
+    """
+
+    def __init__(self, master, columns, row_values, selection, on_change=None):
+        super().__init__(master)
+        self.columns = ("Auswahl",) + tuple(c for c, _, _ in columns)
+        self.row_values = row_values
+        self.selection = selection
+        self.on_change = on_change
+        self.first = 0
+        self.anchor = None
+        self.row_items = []
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show='headings', selectmode="none")
+        self.tree.heading("Auswahl", text="Auswahl")
+        self.tree.column("Auswahl", width=70, anchor='center')
+        for name, text, width in columns:
+            self.tree.heading(name, text=text)
+            self.tree.column(name, width=width)
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=hsb.set)
+        self.vsb.pack(side="right", fill="y")
+        hsb.pack(side="bottom", fill="x")
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<ButtonRelease-1>", self.on_click)
+        self.tree.bind("<Configure>", lambda event: self.refresh())
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel_windows)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.first - 3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.first + 3))
+
+    def visible_rows(self):
+        """Anzahl der Zeilen, die in die aktuelle Höhe des Treeviews passen."""
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or 20
+        row_height = int(row_height)
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return 30
+        return max(1, height // row_height - 1)
+
+    def scroll_to(self, first):
+        total = len(self.selection)
+        rows = self.visible_rows()
+        self.first = max(0, min(int(first), total - rows))
+        self.refresh()
+
+    def on_scrollbar(self, *args):
+        total = len(self.selection)
+        rows = self.visible_rows()
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1]) * (rows if args[2] == "pages" else 1)
+            self.scroll_to(self.first + step)
+
+    def on_mouse_wheel_windows(self, event):
+        self.scroll_to(self.first - int(event.delta / 120) * 3)
+
+    def refresh(self):
+        """Beschreibt die sichtbaren Zeilen mit den Datensätzen ab ``first`` neu."""
+        total = len(self.selection)
+        rows = min(self.visible_rows(), total)
+        while len(self.row_items) < rows:
+            self.row_items.append(self.tree.insert("", "end"))
+        while len(self.row_items) > rows:
+            self.tree.delete(self.row_items.pop())
+        self.first = max(0, min(self.first, total - rows))
+
+        for offset, item in enumerate(self.row_items):
+            index = self.first + offset
+            mark = CHECKED if self.selection.is_selected(index) else UNCHECKED
+            self.tree.item(item, values=(mark,) + tuple(self.row_values(index)))
+
+        if total:
+            self.vsb.set(self.first / total, (self.first + rows) / total)
+        else:
+            self.vsb.set(0.0, 1.0)
+
+    def reload(self):
+        """Nach dem Laden neuer Datensätze: an den Anfang springen und neu zeichnen."""
+        self.first = 0
+        self.anchor = None
+        self.refresh()
+
+    def on_click(self, event):
+        item = self.tree.identify_row(event.y)
+        col = self.tree.identify_column(event.x)
+        if not item or col != "#1" or item not in self.row_items:
+            return
+        index = self.first + self.row_items.index(item)
+        if event.state & SHIFT_MASK and self.anchor is not None:
+            value = self.selection.is_selected(self.anchor)
+            start, stop = sorted((self.anchor, index))
+            self.selection.set_range(start, stop + 1, value)
+        else:
+            self.selection.toggle(index)
+            self.anchor = index
+        self.changed()
+
+    def changed(self):
+        self.refresh()
+        if self.on_change:
+            self.on_change()
@@ -0,0 +1,411 @@
+"""
+Lokaler HTTP-Dienst für Konvertierungen (asyncio, nur Standardbibliothek).
+
+    POST /convert?zone=3&format=kml|kmz|geojson|ndjson|csv|npy[&name=Trasse]   Rumpf: TRA-Datei (binär)
+    GET  /health                                                                Zustand als JSON
+
+Die Konvertierung (Einlesen, Projektion, Export) läuft in einem Prozesspool; die
+Ereignisschleife nimmt nur Anfragen an und streamt Dateien. Hochgeladene Dateien und
+Ergebnisse werden nach Inhaltshash (BLAKE2b) in einem größenbegrenzten Verzeichnis
+abgelegt: dieselbe Datei mit derselben Zone, demselben Format und Namen wird nur einmal
+konvertiert, auch wenn sie gleichzeitig mehrfach angefragt wird. Dateien, die gerade
+konvertiert oder gesendet werden, sind von der Verdrängung ausgenommen.
+
+Es laufen höchstens ``jobs`` Konvertierungen gleichzeitig; sind bereits ``max_pending``
+Anfragen in Arbeit oder wartend, wird mit 503 (Retry-After) abgelehnt. Antworten werden
+blockweise aus der Ergebnisdatei gesendet, der Speicherbedarf hängt nicht von der
+Größe der Ergebnisse ab.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import time
+import unicodedata
+from collections import Counter
+from urllib.parse import parse_qs, quote, urlsplit
+
+import batch
+import exporters
+import projections
+import trackcache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Größte angenommene Upload-Größe (eine TRA-Datei hat höchstens 32768 Datensätze à 78 Bytes)
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+STREAM_BLOCK_SIZE = 64 * 1024
+HEADER_TIMEOUT = 30.0
+BODY_TIMEOUT = 120.0
+
+REASONS = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def default_service_dir():
+    """Ablage für Uploads und Ergebnisse: $TRATOKML_CACHE_DIR/service oder im Benutzer-Cacheverzeichnis."""
+    if os.environ.get("TRATOKML_CACHE_DIR"):
+        return os.path.join(os.environ["TRATOKML_CACHE_DIR"], "service")
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "TRAtoKML", "service")
+
+
+def convert_upload(tra_path, zone, fmt, outfile, name):
+    """
+    Läuft im Prozesspool: konvertiert die abgelegte TRA-Datei ``tra_path`` blockweise im
+    Format ``fmt`` nach ``outfile`` (atomar über eine temporäre Datei). Der trackcache wird
+    nicht benutzt, die Ablage des Dienstes hält Upload und Ergebnis bereits.
+    Gibt die Anzahl der Punkte zurück.
+    """
+    tmp_path = f"{outfile}.{os.getpid()}.tmp"
+    try:
+        count = exporters.export_tra_file(tra_path, zone, tmp_path, fmt=fmt, name=name)
+        if count == 0:
+            raise ValueError("Keine Datensätze in der TRA-Datei.")
+        os.replace(tmp_path, outfile)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def result_name(digest, zone, name, extension):
+    """Dateiname eines Ergebnisses; der Name fließt über einen kurzen Hash ein (er steht im Dokument)."""
+    name_digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{digest}_{zone}_{name_digest}{extension}"
+
+
+def content_disposition(filename):
+    """
+    Content-Disposition für den Download ``filename``: ohne Steuerzeichen, Anführungszeichen
+    und Backslashes; Namen außerhalb von ASCII zusätzlich als filename*=UTF-8''... (RFC 6266)
+    mit ASCII-Ersatz in filename.
+    """
+    filename = "".join(c for c in filename if unicodedata.category(c) != "Cc" and c not in '"\\')
+    fallback = "".join(c if c.isascii() else "_" for c in unicodedata.normalize("NFKD", filename)
+                       if not unicodedata.combining(c))
+    if fallback == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+class ConversionService:
+    """
+    HTTP-Dienst über asyncio.start_server. ``jobs`` Prozesse konvertieren, höchstens
+    ``max_pending`` Konvertierungsanfragen sind gleichzeitig angenommen (laufend oder wartend).
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, jobs=None, max_pending=None,
+                 cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.host = host
+        self.port = port
+        self.jobs = jobs or batch.available_cpus()
+        self.max_pending = max_pending or 4 * self.jobs
+        self.cache_dir = cache_dir or default_service_dir()
+        self.max_bytes = max_bytes
+        self.pool = None
+        self.server = None
+        self.slots = None
+        self.pending = 0
+        self.inflight = {}
+        self.in_use = Counter()  # Pfade, die gerade konvertiert oder gesendet werden (nicht verdrängen)
+        self.stats = {"requests": 0, "conversions": 0, "cache_hits": 0, "rejected": 0, "errors": 0}
+
+    async def start(self):
+        """
+        Startet Prozesspool und Server; mit ``port`` 0 wird ein freier Port gewählt (siehe self.port).
+
+        Die Prozesse entstehen erst bei Bedarf. Mit fork erbten sie die gerade offenen
+        Client-Verbindungen, deren writer.close() dann kein FIN mehr sendet; daher
+        forkserver (bzw. spawn, wo es kein forkserver gibt).
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.slots = asyncio.Semaphore(self.jobs)
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.pool = ProcessPoolExecutor(max_workers=self.jobs, mp_context=multiprocessing.get_context(method))
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Konvertierungsdienst auf http://{self.host}:{self.port} mit {self.jobs} Prozess(en), "
+              f"Ablage: {self.cache_dir}")
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    # --- HTTP ---------------------------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        """Bearbeitet genau eine Anfrage je Verbindung (Connection: close)."""
+        self.stats["requests"] += 1
+        try:
+            try:
+                method, target, headers = await asyncio.wait_for(self.read_head(reader), HEADER_TIMEOUT)
+                await self.dispatch(method, target, headers, reader, writer)
+            except HTTPError as e:
+                if e.status == 503:
+                    self.stats["rejected"] += 1
+                await self.send_json(writer, e.status, {"error": str(e)}, e.headers)
+            except asyncio.TimeoutError:
+                await self.send_json(writer, 400, {"error": "Zeitüberschreitung beim Lesen der Anfrage."})
+            except Exception as e:
+                self.stats["errors"] += 1
+                await self.send_json(writer, 500, {"error": str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_head(self, reader):
+        try:
+            raw = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Anfragekopf zu groß.")
+        except asyncio.IncompleteReadError:
+            raise ConnectionResetError("Verbindung vor Ende des Anfragekopfs geschlossen.")
+        lines = raw.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Ungültige Anfragezeile.")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def dispatch(self, method, target, headers, reader, writer):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if method == "OPTIONS":
+            await self.send_head(writer, 204, {"Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+                                               "Access-Control-Allow-Headers": "Content-Type"})
+        elif url.path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "Nur GET.", {"Allow": "GET"})
+            await self.send_json(writer, 200, dict(self.stats, status="ok", jobs=self.jobs, pending=self.pending,
+                                                   max_pending=self.max_pending))
+        elif url.path == "/convert":
+            if method != "POST":
+                raise HTTPError(405, "Nur POST.", {"Allow": "POST"})
+            await self.convert(query, headers, reader, writer)
+        else:
+            raise HTTPError(404, f"Unbekannter Pfad: {url.path}")
+
+    async def send_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", "Connection: close",
+                 "Access-Control-Allow-Origin: *"]
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        if "Content-Length" not in headers:
+            lines.append("Content-Length: 0")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def send_json(self, writer, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await self.send_head(writer, status, dict(headers or {}, **{
+            "Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body))}))
+        writer.write(body)
+        await writer.drain()
+
+    async def send_file(self, writer, path, headers):
+        """Sendet ``path`` blockweise; drain() bremst, wenn der Client langsamer liest."""
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            await self.send_head(writer, 200, dict(headers, **{"Content-Length": str(size)}))
+            for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b""):
+                writer.write(block)
+                await writer.drain()
+
+    # --- Konvertierung --------------------------------------------------------------------
+
+    async def convert(self, query, headers, reader, writer):
+        zone = query.get("zone", "").strip()
+        if zone not in projections.GK_PROJECTIONS:
+            raise HTTPError(400, f"Ungültige GK-Zone: '{zone}'. Muss '2', '3', '4' oder '5' sein.")
+        fmt = query.get("format", "kml").lower()
+        if fmt not in exporters.EXPORTERS:
+            raise HTTPError(400, f"Unbekanntes Format: {fmt}. Möglich: {', '.join(exporters.EXPORTERS)}")
+        name = query.get("name") or "Trasse"
+        if "\r" in name or "\n" in name:
+            raise HTTPError(400, "Ungültiger Name: Zeilenumbrüche sind nicht erlaubt.")
+        if "chunked" in headers.get("transfer-encoding", "").lower() or "content-length" not in headers:
+            raise HTTPError(411, "Content-Length erforderlich.")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HTTPError(400, "Ungültige Content-Length.")
+        if length > MAX_UPLOAD_BYTES:
+            raise HTTPError(413, f"Upload größer als {MAX_UPLOAD_BYTES} Bytes.")
+        if self.pending >= self.max_pending:
+            raise HTTPError(503, "Dienst ausgelastet, bitte später erneut versuchen.", {"Retry-After": "1"})
+
+        self.pending += 1
+        try:
+            digest, tra_path = await asyncio.wait_for(self.receive_upload(reader, length), BODY_TIMEOUT)
+            exporter = exporters.EXPORTERS[fmt]
+            extension, content_type = exporter.extension, exporter.content_type
+            outfile = os.path.join(self.cache_dir, result_name(digest, zone, name, extension))
+            self.in_use[outfile] += 1  # bis zum Ende des Sendens
+            try:
+                hit = await self.provide(outfile, tra_path, zone, fmt, name)
+            except BaseException:
+                self.release(outfile)
+                raise
+        finally:
+            self.pending -= 1
+
+        try:
+            filename = os.path.splitext(os.path.basename(name))[0] + extension
+            await self.send_file(writer, outfile, {
+                "Content-Type": content_type,
+                "Content-Disposition": content_disposition(filename),
+                "X-Content-Digest": digest,
+                "X-Cache": "hit" if hit else "miss",
+            })
+        finally:
+            self.release(outfile)
+
+    async def provide(self, outfile, tra_path, zone, fmt, name):
+        """Stellt das Ergebnis ``outfile`` bereit; gibt True zurück, wenn es bereits vorlag."""
+        try:
+            os.utime(outfile)
+        except FileNotFoundError:
+            pass
+        else:
+            self.stats["cache_hits"] += 1
+            return True
+        self.in_use[tra_path] += 1
+        try:
+            await self.run_conversion(outfile, tra_path, zone, fmt, name)
+        finally:
+            self.release(tra_path)
+        return False
+
+    def release(self, path):
+        self.in_use[path] -= 1
+        if self.in_use[path] <= 0:
+            del self.in_use[path]
+
+    async def receive_upload(self, reader, length):
+        """
+        Liest den Rumpf blockweise in eine temporäre Datei, bildet dabei den Inhaltshash und
+        legt die Datei als <hash>.tra ab. Gibt (hash, Pfad) zurück.
+        """
+        h = hashlib.blake2b(digest_size=trackcache.DIGEST_SIZE)
+        tmp_path = os.path.join(self.cache_dir, f"upload.{os.getpid()}.{id(reader)}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                remaining = length
+                while remaining:
+                    block = await reader.read(min(remaining, STREAM_BLOCK_SIZE))
+                    if not block:
+                        raise HTTPError(400, "Upload unvollständig.")
+                    h.update(block)
+                    f.write(block)
+                    remaining -= len(block)
+            digest = h.hexdigest()
+            tra_path = os.path.join(self.cache_dir, f"{digest}.tra")
+            os.replace(tmp_path, tra_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return digest, tra_path
+
+    async def run_conversion(self, outfile, tra_path, zone, fmt, name):
+        """
+        Konvertiert im Prozesspool, höchstens ``jobs`` gleichzeitig. Gleichzeitige Anfragen
+        nach demselben Ergebnis warten auf dieselbe Konvertierung.
+        """
+        task = self.inflight.get(outfile)
+        if task is None:
+            task = asyncio.ensure_future(self._convert(outfile, tra_path, zone, fmt, name))
+            self.inflight[outfile] = task
+            task.add_done_callback(lambda _: self.inflight.pop(outfile, None))
+        try:
+            await asyncio.shield(task)
+        except ValueError as e:
+            raise HTTPError(422, f"TRA-Datei nicht konvertierbar: {e}")
+
+    async def _convert(self, outfile, tra_path, zone, fmt, name):
+        async with self.slots:
+            start = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            count = await loop.run_in_executor(self.pool, convert_upload, tra_path, zone, fmt, outfile, name)
+            self.stats["conversions"] += 1
+            print(f"OK     {os.path.basename(outfile)} ({count} Punkte, {time.perf_counter() - start:.3f} s)")
+        self.evict()
+        return count
+
+    def evict(self):
+        """
+        Löscht die ältesten Dateien, bis die Ablage höchstens ``max_bytes`` groß ist.
+        Uploads und Ergebnisse, die gerade konvertiert oder gesendet werden, bleiben erhalten.
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            if entry.path in self.in_use or entry.path in self.inflight:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+def run_service(host=DEFAULT_HOST, port=DEFAULT_PORT, jobs=None, max_pending=None, cache_dir=None):
+    service = ConversionService(host, port, jobs, max_pending, cache_dir)
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        print("Dienst beendet.")
+    return 0
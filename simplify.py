@@ -0,0 +1,176 @@
+"""
+Linienvereinfachung für die Kartendarstellung.
+
+douglas_peucker arbeitet nicht rekursiv, sondern verfeinert in jedem Durchgang
+alle noch zu groben Teilstücke gleichzeitig mit NumPy-Operationen. LODPyramid
+hält darauf aufbauend mehrere Detailstufen vor, aus denen je Zoomstufe die
+gröbste noch pixelgenaue gewählt und auf den sichtbaren Ausschnitt beschnitten wird.
+"""
+import numpy as np
+
+
+def segment_distances(x, y, points, a, b):
+    """Abstand der Punkte ``points`` zur Strecke zwischen den Punkten ``a`` und ``b`` (elementweise)."""
+    ax, ay = x[a], y[a]
+    dx, dy = x[b] - ax, y[b] - ay
+    px, py = x[points] - ax, y[points] - ay
+    length2 = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(length2 > 0, (px * dx + py * dy) / length2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def douglas_peucker(x, y, tolerance, indices=None):
+    """
+    Vereinfacht die Linie (x, y) nach Douglas-Peucker mit der Toleranz ``tolerance``
+    (gleiche Einheit wie x/y). Mit ``indices`` wird nur die Teilmenge dieser Punkte
+    betrachtet. Gibt die sortierten Indizes der behaltenen Punkte zurück.
+
+    Jeder Durchgang teilt alle noch zu groben Teilstücke auf einmal am Punkt mit dem
+    größten Abstand. Mitgeführt werden nur die noch offenen Punkte mit den Enden ihres
+    Teilstücks; ein Durchgang kostet daher O(offene Punkte) statt O(len(indices)), und
+    Teilstücke, die die Toleranz einhalten, scheiden mit ihren Punkten sofort aus.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if indices is None:
+        indices = np.arange(len(x))
+    indices = np.asarray(indices)
+    if len(indices) <= 2:
+        return indices.copy()
+
+    sx, sy = x[indices], y[indices]
+    keep = np.zeros(len(indices), dtype=bool)
+    keep[0] = keep[-1] = True
+    points = np.arange(1, len(indices) - 1)
+    lo = np.zeros(len(points), dtype=np.int64)
+    hi = np.full(len(points), len(indices) - 1, dtype=np.int64)
+    while len(points):
+        dist = segment_distances(sx, sy, points, lo, hi)
+
+        # Punkte sind nach Teilstück sortiert: Gruppen über die Wechsel von lo bilden
+        new_group = np.concatenate(([True], lo[1:] != lo[:-1]))
+        starts = np.flatnonzero(new_group)
+        group = np.cumsum(new_group) - 1
+        group_max = np.maximum.reduceat(dist, starts)
+        split = group_max > tolerance
+
+        # Je zu grobem Teilstück den (ersten) Punkt mit maximalem Abstand übernehmen
+        candidates = np.flatnonzero(split[group] & (dist == group_max[group]))
+        if not len(candidates):
+            break
+        first = candidates[np.concatenate(([True], np.diff(group[candidates]) != 0))]
+        pivot = np.full(len(starts), -1, dtype=np.int64)
+        pivot[group[first]] = points[first]
+        keep[points[first]] = True
+
+        # Übrige Punkte zu grober Teilstücke gehören zur linken oder rechten Hälfte
+        pivot = pivot[group]
+        remaining = split[group] & (points != pivot)
+        points, lo, hi, pivot = points[remaining], lo[remaining], hi[remaining], pivot[remaining]
+        right = points > pivot
+        lo = np.where(right, pivot, lo)
+        hi = np.where(right, hi, pivot)
+    return indices[keep]
+
+
+def index_runs(positions):
+    """Zerlegt sortierte Teilstücknummern in zusammenhängende Läufe: gibt (erste, letzte) zurück."""
+    breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+    firsts = positions[np.concatenate(([0], breaks))]
+    lasts = positions[np.concatenate((breaks - 1, [len(positions) - 1]))]
+    return firsts, lasts
+
+
+class LODPyramid:
+    """
+    Detailstufen einer Linie: Stufe k ist mit Toleranz ``base_tolerance * factor**k``
+    vereinfacht und wird aus Stufe k-1 abgeleitet. Stufen werden erzeugt, bis nur noch
+    Anfangs- und Endpunkt übrig sind.
+    """
+
+    def __init__(self, x, y, base_tolerance, factor=2.0):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.tolerances = []
+        self.levels = []
+        indices = np.arange(len(self.x))
+        tolerance = base_tolerance
+        while True:
+            indices = douglas_peucker(self.x, self.y, tolerance, indices)
+            self.tolerances.append(tolerance)
+            self.levels.append(indices)
+            if len(indices) <= 2:
+                break
+            tolerance *= factor
+
+    def indices_for(self, max_error):
+        """Indizes der gröbsten Stufe, deren Toleranz ``max_error`` nicht überschreitet."""
+        level = np.searchsorted(self.tolerances, max_error, side='right') - 1
+        if level < 0:
+            return np.arange(len(self.x))
+        return self.levels[level]
+
+    def visible_indices(self, max_error, bbox):
+        """
+        Wie indices_for, aber beschnitten auf den Ausschnitt ``bbox`` = (minx, miny, maxx, maxy):
+        je zusammenhängendem Abschnitt von Teilstücken, deren Box ``bbox`` schneidet, ein
+        Index-Array. Der erste und letzte Punkt eines Abschnitts ist der Nachbar außerhalb,
+        damit die Linie bis über den Bildrand reicht.
+        """
+        idx = self.indices_for(max_error)
+        if len(idx) < 2:
+            return []
+        west, south, east, north = bbox
+        x, y = self.x[idx], self.y[idx]
+        ax, bx, ay, by = x[:-1], x[1:], y[:-1], y[1:]
+        hit = np.flatnonzero((np.maximum(ax, bx) >= west) & (np.minimum(ax, bx) <= east) &
+                             (np.maximum(ay, by) >= south) & (np.minimum(ay, by) <= north))
+        if not len(hit):
+            return []
+        firsts, lasts = index_runs(hit)
+        return [idx[f:l + 2] for f, l in zip(firsts.tolist(), lasts.tolist())]
+
+
+def selection_ranges(selected):
+    """Anfangs- und Endindizes (einschließlich) aller zusammenhängenden Auswahlbereiche."""
+    padded = np.concatenate(([False], np.asarray(selected, dtype=bool), [False]))
+    change = np.diff(padded.astype(np.int8))
+    return np.flatnonzero(change == 1), np.flatnonzero(change == -1) - 1
+
+
+def selection_paths(lod_indices, selected, ranges=None):
+    """
+    Index-Arrays für die Darstellung der ausgewählten Punkte auf Basis einer Detailstufe
+    (oder eines sichtbaren Abschnitts davon), eines je Auswahlbereich: die ausgewählten
+    Punkte von ``lod_indices`` plus Anfang und Ende des Bereichs, soweit sie zwischen
+    erstem und letztem Punkt von ``lod_indices`` liegen, damit die Grenzen exakt bleiben.
+    ``ranges`` (siehe selection_ranges) kann für mehrere Abschnitte vorab berechnet werden.
+    """
+    selected = np.asarray(selected, dtype=bool)
+    if not len(lod_indices):
+        return []
+    starts, ends = selection_ranges(selected) if ranges is None else ranges
+    first, last = lod_indices[0], lod_indices[-1]
+    bounds = np.concatenate((starts[(starts >= first) & (starts <= last)],
+                             ends[(ends >= first) & (ends <= last)]))
+    points = np.union1d(lod_indices[selected[lod_indices]], bounds)
+    if not len(points):
+        return []
+    # Bereichsnummer je Punkt; an jedem Wechsel beginnt ein neuer Pfad
+    area = np.searchsorted(starts, points, side='right')
+    return np.split(points, np.flatnonzero(np.diff(area)) + 1)
+
+
+def to_pixel_path(px, py):
+    """
+    Rundet Pixelkoordinaten und entfernt aufeinanderfolgende Duplikate.
+    Gibt eine Liste von (x, y)-Tupeln für ImageDraw.line zurück.
+    """
+    ix = np.round(px).astype(np.int64)
+    iy = np.round(py).astype(np.int64)
+    if len(ix) > 1:
+        moved = np.concatenate(([True], (np.diff(ix) != 0) | (np.diff(iy) != 0)))
+        ix, iy = ix[moved], iy[moved]
+    return list(zip(ix.tolist(), iy.tolist()))
@@ -0,0 +1,140 @@
+"""
+Stationsindex (Kilometrierung) einer Trasse.
+
+Die Stationen rS der Elementanfänge werden einmal sortiert; alle Abfragen laufen
+als Binärsuche (np.searchsorted) über ganze Arrays von Stationen auf einmal.
+Positionen innerhalb eines Elements liefert die Elementgeometrie aus geometry.
+"""
+import re
+
+import numpy as np
+
+import geometry
+import projections
+
+_KM_RANGE = re.compile(r"^\s*(?:km)?\s*([-+]?\d+(?:[.,]\d+)?)\s*(?:-|–|—|bis)\s*([-+]?\d+(?:[.,]\d+)?)\s*$", re.IGNORECASE)
+
+
+def parse_km_range(text):
+    """
+    Liest einen Kilometerbereich wie "km 12.4–37.9", "12,4-37,9" oder "12.4 bis 37.9"
+    und gibt (Anfang, Ende) in Metern zurück.
+    """
+    match = _KM_RANGE.match(text)
+    if not match:
+        raise ValueError(f"Ungültiger Kilometerbereich: {text!r}")
+    start, end = (float(v.replace(",", ".")) * 1000.0 for v in match.groups())
+    return (start, end) if start <= end else (end, start)
+
+
+class StationIndex:
+    """
+    Sortierter Index über die Stationen der Elementanfänge eines TRATrack.
+
+    ``locate`` liefert zu beliebig vielen Stationen Position und Richtung,
+    ``range_slice``/``range_mask`` die Datensätze eines Stationsbereichs. Jede
+    einzelne Abfrage kostet O(log n).
+    """
+
+    def __init__(self, track):
+        stations = np.asarray(track.station, dtype=float)
+        self.alignment = geometry.Alignment(track.data)
+        if len(stations) > 1 and np.any(np.diff(stations) < 0):
+            self.order = np.argsort(stations, kind='stable')
+        else:
+            self.order = None
+        self.stations = stations if self.order is None else stations[self.order]
+        self.ends = self.stations + (self.alignment.length if self.order is None
+                                     else self.alignment.length[self.order])
+
+    def __len__(self):
+        return len(self.stations)
+
+    @property
+    def start(self):
+        return float(self.stations[0])
+
+    @property
+    def end(self):
+        return float(self.ends.max())
+
+    def _records(self, positions):
+        return positions if self.order is None else self.order[positions]
+
+    def element_at(self, stations):
+        """Datensatzindex des Elements, in dem jede der ``stations`` liegt."""
+        stations = np.atleast_1d(np.asarray(stations, dtype=float))
+        positions = np.searchsorted(self.stations, stations, side='right') - 1
+        positions = np.clip(positions, 0, len(self.stations) - 1)
+        return self._records(positions)
+
+    def locate(self, stations):
+        """
+        Position (Rechtswert y, Hochwert x) und Richtung zu jeder der ``stations``.
+        Innerhalb eines Elements wird dessen Geometrie ausgewertet; Elemente ohne Länge
+        werden linear bis zum Anfang des nächsten Datensatzes interpoliert.
+        Gibt (y, x, bearing) als Arrays zurück.
+        """
+        stations = np.atleast_1d(np.asarray(stations, dtype=float))
+        positions = np.clip(np.searchsorted(self.stations, stations, side='right') - 1,
+                            0, len(self.stations) - 1)
+        element = self._records(positions)
+        offset = stations - self.stations[positions]
+
+        length = self.alignment.length[element]
+        y, x, bearing = self.alignment.evaluate(element, np.clip(offset, 0.0, length))
+
+        # Elemente ohne Länge: lineare Interpolation zum nächsten Elementanfang
+        linear = (length == 0) & (positions < len(self.stations) - 1) & (offset > 0)
+        if linear.any():
+            nxt = self._records(positions[linear] + 1)
+            cur = element[linear]
+            span = self.stations[positions[linear] + 1] - self.stations[positions[linear]]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                t = np.clip(np.where(span > 0, offset[linear] / span, 0.0), 0.0, 1.0)
+            a = self.alignment
+            y[linear] = a.y0[cur] + t * (a.y0[nxt] - a.y0[cur])
+            x[linear] = a.x0[cur] + t * (a.x0[nxt] - a.x0[cur])
+            bearing[linear] = np.arctan2(a.y0[nxt] - a.y0[cur], a.x0[nxt] - a.x0[cur])
+        return y, x, bearing
+
+    def locate_wgs84(self, stations, zone):
+        """Wie locate, aber mit WGS84-Koordinaten: gibt (lons, lats, bearing) zurück."""
+        y, x, bearing = self.locate(stations)
+        lons, lats = projections.gk_to_wgs84(zone, y, x)
+        return lons, lats, bearing
+
+    def range_slice(self, start, end):
+        """
+        Bereich der (nach Station sortierten) Elemente, die den Stationsbereich
+        [start, end] berühren, als slice über die sortierte Reihenfolge.
+        """
+        first = max(int(np.searchsorted(self.stations, start, side='right')) - 1, 0)
+        stop = int(np.searchsorted(self.stations, end, side='right'))
+        return slice(first, max(stop, first))
+
+    def range_mask(self, start, end):
+        """Boolesche Maske über die Datensätze, deren Element den Bereich [start, end] berührt."""
+        mask = np.zeros(len(self.stations), dtype=bool)
+        sl = self.range_slice(start, end)
+        mask[self._records(np.arange(len(self.stations))[sl])] = True
+        return mask
+
+    def cut(self, start, end, points_station, points_y, points_x, return_station=False):
+        """
+        Schneidet eine Punktfolge (z.B. Elementanfänge oder verdichtete Samples) auf den
+        Stationsbereich [start, end] zu. Anfang und Ende werden exakt auf der Trasse
+        ergänzt. Gibt (y, x) zurück, mit ``return_station`` (y, x, Stationen).
+        """
+        start = max(start, self.start)
+        end = min(end, self.end)
+        if end < start:
+            empty = (np.empty(0), np.empty(0), np.empty(0))
+            return empty if return_station else empty[:2]
+        inside = (points_station > start) & (points_station < end)
+        ey, ex, _ = self.locate([start, end])
+        y = np.concatenate(([ey[0]], points_y[inside], [ey[1]]))
+        x = np.concatenate(([ex[0]], points_x[inside], [ex[1]]))
+        if return_station:
+            return y, x, np.concatenate(([start], points_station[inside], [end]))
+        return y, x
@@ -0,0 +1,106 @@
+"""
+Erzeugung synthetischer TRA-Dateien für Tests und Benchmarks.
+
+Die Trassen bestehen aus realistischen Elementfolgen Gerade – Klothoide – Kreisbogen –
+Klothoide mit zufälligen Längen und Radien. Anfangspunkte, Richtungen und Stationen
+werden aus der Elementgeometrie berechnet, sodass jedes Element exakt am Anfang des
+nächsten endet.
+
+Der Header speichert die Anzahl der Datensätze als short (iNumData = nKz + 1); eine
+Datei fasst daher höchstens MAX_RECORDS_PER_FILE Datensätze. Größere Netze werden mit
+write_tra_network auf mehrere Dateien verteilt.
+"""
+import os
+
+import numpy as np
+
+import geometry
+from parseTRAFile import TRA_DTYPE
+
+MAX_RECORDS_PER_FILE = np.iinfo(np.int16).max + 1
+
+# Wertebereiche der Elementparameter (m)
+LINE_LENGTH = (200.0, 2000.0)
+CLOTHOID_LENGTH = (60.0, 200.0)
+ARC_LENGTH = (100.0, 1000.0)
+ARC_RADIUS = (300.0, 5000.0)
+
+
+def generate_records(count, seed=0, start=(3500000.0, 5500000.0), bearing=0.5):
+    """
+    Erzeugt ``count`` Datensätze (Structured Array im TRA_DTYPE-Format). Der letzte
+    Datensatz ist der Endpunkt der Trasse (Länge 0).
+    """
+    rng = np.random.default_rng(seed)
+    records = np.zeros(count, dtype=TRA_DTYPE)
+    if count == 0:
+        return records
+
+    elements = count - 1
+    phase = np.arange(elements) % 4     # 0 Gerade, 1 Klothoide, 2 Kreis, 3 Klothoide
+    curves = elements // 4 + 1
+    radius = rng.uniform(*ARC_RADIUS, curves) * rng.choice([-1.0, 1.0], curves)
+    radius = radius[np.arange(elements) // 4]
+
+    kind = np.choose(phase, [geometry.ELEMENT_LINE, geometry.ELEMENT_CLOTHOID,
+                             geometry.ELEMENT_ARC, geometry.ELEMENT_CLOTHOID])
+    length = np.choose(phase, [rng.uniform(*LINE_LENGTH, elements),
+                               rng.uniform(*CLOTHOID_LENGTH, elements),
+                               rng.uniform(*ARC_LENGTH, elements),
+                               rng.uniform(*CLOTHOID_LENGTH, elements)])
+    r1 = np.choose(phase, [0.0, 0.0, radius, radius])
+    r2 = np.choose(phase, [0.0, radius, radius, 0.0])
+
+    records['nKz'][:-1] = kind
+    records['rL'][:-1] = length
+    records['rR1'][:-1] = r1
+    records['rR2'][:-1] = r2
+
+    # Richtungsänderung je Element: Kreis k*L, Klothoide (k1 + k2) * L / 2
+    k1 = np.where(r1 != 0, 1.0 / np.where(r1 != 0, r1, 1.0), 0.0)
+    k2 = np.where(r2 != 0, 1.0 / np.where(r2 != 0, r2, 1.0), 0.0)
+    turn = (k1 + k2) * length / 2.0
+    records['rT'] = bearing + np.concatenate(([0.0], np.cumsum(turn)))
+    records['rS'] = np.concatenate(([0.0], np.cumsum(length)))
+
+    # Elementenden relativ zum Anfang berechnen und aufsummieren
+    records['rY'][:-1] = 0.0
+    records['rX'][:-1] = 0.0
+    alignment = geometry.Alignment(records[:-1])
+    dy, dx, _ = alignment.end_points()
+    records['rY'] = start[0] + np.concatenate(([0.0], np.cumsum(dy)))
+    records['rX'] = start[1] + np.concatenate(([0.0], np.cumsum(dx)))
+    return records
+
+
+def write_tra_file(path, records):
+    """Schreibt Header und Datensätze als TRA-Datei."""
+    if len(records) > MAX_RECORDS_PER_FILE:
+        raise ValueError(f"Eine TRA-Datei fasst höchstens {MAX_RECORDS_PER_FILE} Datensätze.")
+    header = np.zeros(1, dtype=TRA_DTYPE)
+    header['nKz'] = len(records) - 1
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(np.ascontiguousarray(records).tobytes())
+
+
+def write_tra_network(directory, count, seed=0, per_file=MAX_RECORDS_PER_FILE, prefix="synth"):
+    """
+    Schreibt insgesamt ``count`` Datensätze als Folge von TRA-Dateien mit je höchstens
+    ``per_file`` Datensätzen nach ``directory``. Die Dateien werden nebeneinander
+    versetzt angelegt. Gibt die Liste der Dateipfade zurück.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    remaining = count
+    index = 0
+    while remaining > 0:
+        n = min(per_file, remaining)
+        records = generate_records(n, seed=seed + index,
+                                   start=(3500000.0 + 5000.0 * index, 5500000.0))
+        path = os.path.join(directory, f"{prefix}_{index:05d}.tra")
+        write_tra_file(path, records)
+        paths.append(path)
+        remaining -= n
+        index += 1
+    return paths
@@ -0,0 +1,144 @@
+"""
+Exportformate (exporters): verlustfreie Rundreisen für npy, CSV, NDJSON und GeoJSON,
+Auswahl und KML/KMZ, gleiche Ausgabe aus Arrays und gestreamter TRA-Datei sowie
+atomares Schreiben.
+"""
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import numpy as np
+
+import exporters
+import parseTRAFile
+import projections
+import synthtra
+
+
+class ExportersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.records = synthtra.generate_records(700, seed=11)
+        self.records['rU1'] = np.random.default_rng(1).normal(size=700)  # Werte ohne kurze Dezimaldarstellung
+        self.records['iC'] = np.arange(700) - 350
+        self.tra_path = os.path.join(self.workdir, "trasse.tra")
+        synthtra.write_tra_file(self.tra_path, self.records)
+        self.lons, self.lats = projections.gk_to_wgs84("3", self.records['rY'], self.records['rX'])
+        self.selected = np.zeros(700, dtype=bool)
+        self.selected[100:250] = self.selected[400:410] = True
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def export(self, name, selected=None, **kwargs):
+        return exporters.export_arrays(self.path(name), self.records, self.lons, self.lats, selected, **kwargs)
+
+    def test_npy_round_trip(self):
+        self.assertEqual(self.export("a.npy", self.selected), 160)
+        data = np.load(self.path("a.npy"), mmap_mode='r')
+        self.assertEqual(data.dtype, exporters.EXPORT_DTYPE)
+        for field in parseTRAFile.TRA_DTYPE.names:
+            np.testing.assert_array_equal(data[field], self.records[field][self.selected])
+        np.testing.assert_array_equal(data['lon'], self.lons[self.selected])
+        np.testing.assert_array_equal(data['lat'], self.lats[self.selected])
+
+    def test_csv_round_trip(self):
+        self.export("a.csv")
+        with open(self.path("a.csv"), encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], list(exporters.EXPORT_DTYPE.names))
+        self.assertEqual(len(rows), 701)
+        columns = dict(zip(rows[0], zip(*rows[1:])))
+        for field in parseTRAFile.TRA_DTYPE.names:
+            kind = int if self.records.dtype[field].kind == "i" else float
+            self.assertEqual([kind(v) for v in columns[field]], self.records[field].tolist(), field)
+        self.assertEqual([float(v) for v in columns['lon']], self.lons.tolist())
+        self.assertEqual([float(v) for v in columns['lat']], self.lats.tolist())
+
+    def test_ndjson_round_trip(self):
+        self.export("a.ndjson", self.selected)
+        with open(self.path("a.ndjson"), encoding="utf-8") as f:
+            features = [json.loads(line) for line in f]
+        self.assertEqual(len(features), 160)
+        expected = self.records[self.selected]
+        for i in (0, 77, 159):
+            self.assertEqual(features[i]["properties"], dict(zip(parseTRAFile.TRA_DTYPE.names, expected[i].item())))
+            self.assertEqual(features[i]["geometry"]["coordinates"],
+                             [self.lons[self.selected][i], self.lats[self.selected][i]])
+
+    def test_geojson_round_trip_and_non_finite_values(self):
+        lons = self.lons.copy()
+        lons[3] = np.nan
+        exporters.export_arrays(self.path("a.geojson"), self.records, lons, self.lats, name="Trasse ä")
+        with open(self.path("a.geojson"), encoding="utf-8") as f:
+            feature = json.load(f)["features"][0]
+        self.assertEqual(feature["properties"], {"name": "Trasse ä", "points": 700})
+        coordinates = feature["geometry"]["coordinates"]
+        self.assertEqual(coordinates[3], [None, self.lats[3]])
+        del coordinates[3]
+        self.assertEqual(coordinates, np.column_stack((np.delete(self.lons, 3), np.delete(self.lats, 3))).tolist())
+
+    def test_kml_and_kmz(self):
+        self.assertEqual(self.export("a.kml", self.selected), 700)
+        self.assertEqual(self.export("a.kmz", self.selected), 700)
+        with open(self.path("a.kml"), encoding="utf-8") as f:
+            kml = f.read()
+        with zipfile.ZipFile(self.path("a.kmz")) as archive:
+            self.assertEqual(archive.read("doc.kml").decode("utf-8"), kml)
+        selected_part, all_part = kml.split("Gesamte Trasse")
+        self.assertEqual(selected_part.split("<coordinates>")[1].split("</coordinates>")[0].count(",0"), 160)
+        self.assertEqual(all_part.split("<coordinates>")[1].split("</coordinates>")[0].count(",0"), 700)
+
+    def test_streamed_file_matches_arrays(self):
+        for fmt in exporters.EXPORTERS:
+            with self.subTest(fmt=fmt):
+                extension = exporters.EXPORTERS[fmt].extension
+                self.export("arrays" + extension, fmt=fmt)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    count = exporters.export_tra_file(self.tra_path, "3", self.path("file" + extension),
+                                                      chunk_size=64)
+                self.assertEqual(count, 700)
+                if fmt == "kmz":
+                    with zipfile.ZipFile(self.path("arrays.kmz")) as a, zipfile.ZipFile(self.path("file.kmz")) as b:
+                        self.assertEqual(a.read("doc.kml"), b.read("doc.kml"))
+                    continue
+                with open(self.path("arrays" + extension), "rb") as a, open(self.path("file" + extension), "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+
+    def test_failed_export_keeps_previous_output(self):
+        self.export("a.npy")
+        with open(self.path("a.npy"), "rb") as f:
+            previous = f.read()
+
+        class ShortSource(exporters.ArraySource):
+            def __len__(self):
+                return 5  # Dateikopf passt nicht zu den gelieferten Punkten
+
+        with self.assertRaises(ValueError):
+            exporters.EXPORTERS["npy"].export(self.path("a.npy"), ShortSource(self.records, self.lons, self.lats))
+        self.assertEqual(sorted(os.listdir(self.workdir)), ["a.npy", "trasse.tra"])
+        with open(self.path("a.npy"), "rb") as f:
+            self.assertEqual(f.read(), previous)
+
+    def test_format_lookup(self):
+        self.assertEqual(exporters.exporter_for_path("x.GeoJSON").name, "geojson")
+        self.assertEqual(exporters.exporter_for_path("x.txt").name, "kml")
+        self.assertTrue(exporters.is_kml("KMZ"))
+        with self.assertRaises(ValueError):
+            exporters.get_exporter("shp")
+        with self.assertRaises(ValueError):
+            exporters.TRAFileSource(self.tra_path, "3", chunk_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Endpunkte der Trassenelemente (geometry.Alignment) gegen geschlossene Lösungen:
+Gerade, Rechts- und Linksbogen, Klothoide (Reihenentwicklung) und Verdichtung.
+"""
+import math
+import unittest
+
+import numpy as np
+
+import geometry
+from parseTRAFile import TRA_DTYPE
+
+
+def elements(*specs):
+    """Datensätze aus (nKz, rL, rR1, rR2, rT) mit Anfang (0, 0) und Station 0."""
+    records = np.zeros(len(specs), dtype=TRA_DTYPE)
+    for record, (kind, length, r1, r2, bearing) in zip(records, specs):
+        record['nKz'], record['rL'], record['rR1'], record['rR2'], record['rT'] = kind, length, r1, r2, bearing
+    return records
+
+
+def clothoid_local(length, radius):
+    """Klothoide ab Krümmung 0: (quer, längs) zur Anfangsrichtung als Reihe mit A² = R·L."""
+    a2 = radius * length
+    along = (length - length ** 5 / (40 * a2 ** 2) + length ** 9 / (3456 * a2 ** 4)
+             - length ** 13 / (599040 * a2 ** 6))
+    across = (length ** 3 / (6 * a2) - length ** 7 / (336 * a2 ** 3) + length ** 11 / (42240 * a2 ** 5)
+              - length ** 15 / (9676800 * a2 ** 7))
+    return across, along
+
+
+class AlignmentTest(unittest.TestCase):
+
+    def test_line(self):
+        y, x, bearing = geometry.Alignment(elements((geometry.ELEMENT_LINE, 100.0, 0, 0, 0.3))).end_points()
+        self.assertAlmostEqual(y[0], 100.0 * math.sin(0.3), places=9)
+        self.assertAlmostEqual(x[0], 100.0 * math.cos(0.3), places=9)
+        self.assertAlmostEqual(bearing[0], 0.3)
+
+    def test_quarter_arcs(self):
+        radius = 500.0
+        quarter = radius * math.pi / 2
+        alignment = geometry.Alignment(elements((geometry.ELEMENT_ARC, quarter, radius, radius, 0.0),
+                                                (geometry.ELEMENT_ARC, quarter, -radius, -radius, 0.0)))
+        y, x, bearing = alignment.end_points()
+        # Nach Norden los: Rechtsbogen endet nach Osten, Linksbogen nach Westen gerichtet
+        np.testing.assert_allclose(y, [radius, -radius], atol=1e-9)
+        np.testing.assert_allclose(x, [radius, radius], atol=1e-9)
+        np.testing.assert_allclose(bearing, [math.pi / 2, -math.pi / 2])
+
+    def test_clothoid(self):
+        length, radius, start = 150.0, 400.0, 0.7
+        alignment = geometry.Alignment(elements((geometry.ELEMENT_CLOTHOID, length, 0.0, radius, start)))
+        y, x, bearing = alignment.end_points()
+        across, along = clothoid_local(length, radius)
+        # Lokales System gedreht auf die Anfangsrichtung (rechts = +quer)
+        self.assertAlmostEqual(y[0], along * math.sin(start) + across * math.cos(start), places=6)
+        self.assertAlmostEqual(x[0], along * math.cos(start) - across * math.sin(start), places=6)
+        self.assertAlmostEqual(bearing[0], start + length / (2 * radius))
+
+    def test_clothoid_midpoint_matches_series(self):
+        length, radius = 200.0, 300.0
+        alignment = geometry.Alignment(elements((geometry.ELEMENT_CLOTHOID, length, 0.0, radius, 0.0)))
+        # Bis zur Hälfte hat die Klothoide den Parameter A² = R·L mit R am Ende = 2R
+        y, x, _ = alignment.evaluate([0], [length / 2])
+        across, along = clothoid_local(length / 2, 2 * radius)
+        self.assertAlmostEqual(y[0], across, places=6)
+        self.assertAlmostEqual(x[0], along, places=6)
+
+    def test_kink_has_no_length(self):
+        alignment = geometry.Alignment(elements((geometry.ELEMENT_KINK, 25.0, 0, 0, 1.0)))
+        y, x, _ = alignment.end_points()
+        self.assertEqual((y[0], x[0]), (0.0, 0.0))
+
+    def test_densify_spacing_and_ends(self):
+        records = elements((geometry.ELEMENT_LINE, 95.0, 0, 0, 0.0),
+                           (geometry.ELEMENT_ARC, 100.0, 250.0, 250.0, 0.0),
+                           (geometry.ELEMENT_LINE, 0.0, 0, 0, 0.4))
+        ends_y, ends_x, _ = geometry.Alignment(records[:2]).end_points()
+        records['rX'][1] = 95.0
+        records['rS'] = [0.0, 95.0, 195.0]
+        records['rY'][2], records['rX'][2] = ends_y[1], 95.0 + ends_x[1]
+
+        samples = geometry.Alignment(records).densify(spacing=10.0)
+        self.assertTrue(np.all(np.diff(samples.station) <= 10.0 + 1e-9))
+        self.assertEqual((samples.station[0], samples.station[-1]), (0.0, 195.0))
+        self.assertAlmostEqual(samples.y[-1], records['rY'][2], places=9)
+        self.assertAlmostEqual(samples.x[-1], records['rX'][2], places=9)
+        # Jedes Element beginnt an seinem Anfangspunkt aus der Datei
+        for element in range(3):
+            first = np.flatnonzero(samples.element == element)[0]
+            self.assertAlmostEqual(samples.y[first], records['rY'][element], places=9)
+            self.assertAlmostEqual(samples.x[first], records['rX'][element], places=9)
+
+    def test_max_error_bounds_sagitta(self):
+        radius = 250.0
+        records = elements((geometry.ELEMENT_ARC, 300.0, radius, radius, 0.0))
+        samples = geometry.Alignment(records).densify(spacing=None, max_error=0.01)
+        chords = np.hypot(np.diff(samples.y), np.diff(samples.x))
+        self.assertLessEqual((chords ** 2 / (8 * radius)).max(), 0.01 + 1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+Gekachelter KML-Export (kmltiles): Zerlegung in zusammenhängende Abschnitte je
+Kachel mit eigenem Stationsbereich, vollständige Blätter und gültige Verweise,
+als Verzeichnis und als KMZ.
+"""
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import unittest
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+
+import kmltiles
+
+NS = {"kml": "http://www.opengis.net/kml/2.2"}
+
+
+def u_shape():
+    """Hin auf y=0, hoch bei x=10, zurück auf y=10: verlässt die linke Hälfte und kehrt zurück."""
+    x = np.concatenate((np.arange(0.0, 10.0), np.full(10, 10.0), np.arange(10.0, -1.0, -1.0)))
+    y = np.concatenate((np.zeros(10), np.arange(0.0, 10.0), np.full(11, 10.0)))
+    return x / 1000.0 + 13.0, y / 1000.0 + 52.0, np.arange(len(x)) * 100.0
+
+
+def placemark_names(document):
+    return [p.findtext("kml:name", namespaces=NS) for p in document.iterfind(".//kml:Placemark", NS)]
+
+
+def coordinates(document):
+    """Alle Punkte (lon, lat) der Placemarks eines Dokuments, je Placemark eine Liste."""
+    return [[tuple(map(float, point.split(",")[:2])) for point in text.split()]
+            for text in (c.text for c in document.iterfind(".//kml:coordinates", NS))]
+
+
+class TileLineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lons, self.lats, self.stations = u_shape()
+        self.line = kmltiles.TileLine("Strecke & Co", self.lons, self.lats, self.stations)
+
+    def test_full_paths_split_into_runs(self):
+        west_half = (12.9, 51.9, 13.0045, 52.1)
+        segments = self.line.segments_in(west_half, np.arange(len(self.lons) - 1))
+        paths = self.line.full_paths(segments)
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(paths[0].tolist(), list(range(0, 6)))
+        self.assertEqual(paths[1].tolist(), list(range(25, 31)))
+
+        document = ElementTree.fromstring(kmltiles.TILE_HEADER.format(name="t") + self.line.placemarks(paths)
+                                          + kmltiles.TILE_FOOTER)
+        self.assertEqual(placemark_names(document), ["Strecke & Co km 0.000–0.500", "Strecke & Co km 2.500–3.000"])
+
+    def test_full_paths_empty_and_without_stations(self):
+        self.assertEqual(self.line.full_paths(np.empty(0, dtype=np.int64)), [])
+        line = kmltiles.TileLine("Ohne", self.lons, self.lats)
+        self.assertIn("<name>Ohne</name>", line.placemarks([np.arange(3)]))
+
+    def test_generalized_paths_follow_visible_runs(self):
+        paths = self.line.generalized_paths((12.9, 51.9, 13.0045, 52.1), 1e-5)
+        self.assertEqual(len(paths), 2)
+        self.assertEqual((paths[0][0], paths[1][-1]), (0, 30))
+
+
+class ExportTiledTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        rng = np.random.default_rng(7)
+        self.lines = []
+        for i in range(3):
+            lons = 13.0 + np.cumsum(rng.normal(scale=1e-3, size=800))
+            lats = 52.0 + i * 0.01 + np.cumsum(rng.normal(scale=1e-3, size=800))
+            self.lines.append((f"T{i}", lons, lats, np.arange(800) * 50.0))
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def check_tree(self, read, root):
+        """
+        Folgt allen NetworkLinks ab ``root`` (Verweise relativ zum verweisenden Dokument,
+        wie in einem KML-Betrachter); gibt die Dokumente der Blätter zurück.
+        """
+        leaves = []
+        pending = [root]
+        while pending:
+            name = pending.pop()
+            document = ElementTree.fromstring(read(name))
+            hrefs = [link.text for link in document.iterfind(".//kml:NetworkLink/kml:Link/kml:href", NS)]
+            pending += [posixpath.join(posixpath.dirname(name), href) for href in hrefs]
+            if not hrefs:
+                leaves.append(document)
+        return leaves
+
+    def test_directory_tree(self):
+        outfile = os.path.join(self.workdir, "netz.kml")
+        count, tiles = kmltiles.export_tiled(outfile, self.lines, max_points=300)
+        self.assertEqual(count, 2400)
+        tile_dir = os.path.join(self.workdir, "netz_tiles")
+        self.assertEqual(len(os.listdir(tile_dir)) + 1, tiles)
+
+        def read(name):
+            with open(os.path.join(self.workdir, name), "rb") as f:
+                return f.read()
+
+        leaves = self.check_tree(read, "netz.kml")
+        # Die Blätter enthalten zusammen jeden Punkt aller Trassen in voller Auflösung
+        points = {p for leaf in leaves for path in coordinates(leaf) for p in path}
+        expected = {(round(lon, 6), round(lat, 6)) for _, lons, lats, _ in self.lines for lon, lat in zip(lons, lats)}
+        self.assertEqual(points, expected)
+        for leaf in leaves:
+            for name in placemark_names(leaf):
+                self.assertRegex(name, r"^T\d km \d+\.\d{3}–\d+\.\d{3}$")
+
+    def test_kmz_archive(self):
+        outfile = os.path.join(self.workdir, "netz.kmz")
+        _, tiles = kmltiles.export_tiled(outfile, self.lines, max_points=300)
+        with zipfile.ZipFile(outfile) as archive:
+            names = archive.namelist()
+            self.assertEqual(names[0], "doc.kml")
+            self.assertEqual(len(names), tiles)
+            self.assertTrue(all(re.match(r"tiles/t\d+_\d+_\d+\.kml$", n) for n in names[1:]))
+            self.assertTrue(self.check_tree(archive.read, "doc.kml"))
+        self.assertFalse(os.path.exists(os.path.join(self.workdir, "netz_tiles")))
+
+    def test_small_export_has_no_tile_directory(self):
+        outfile = os.path.join(self.workdir, "klein.kml")
+        lons, lats, stations = u_shape()
+        self.assertEqual(kmltiles.export_tiled(outfile, [("U", lons, lats, stations)]), (31, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.workdir, "klein_tiles")))
+        with open(outfile, "rb") as f:
+            self.assertEqual(placemark_names(ElementTree.fromstring(f.read())), ["U km 0.000–3.000"])
+
+    def test_empty_export(self):
+        empty = np.empty(0)
+        self.assertEqual(kmltiles.export_tiled(os.path.join(self.workdir, "leer.kml"), [("L", empty, empty, None)]),
+                         (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
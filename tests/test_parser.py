@@ -0,0 +1,122 @@
+"""
+Spaltenweises Einlesen (parseTRAFile) gegen die frühere struct-Schleife: gleiche Werte
+für alle Felder, und bei abgeschnittenen Dateien nur die vollständigen Datensätze laut nKz.
+"""
+import contextlib
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+import parseTRAFile
+import synthtra
+
+
+def struct_records(path):
+    """Die frühere Implementierung: Datensatz für Datensatz mit struct.unpack."""
+    with open(path, "rb") as f:
+        data = f.read()
+    size = struct.calcsize(parseTRAFile.RECORD_FORMAT)
+    if len(data) < size:
+        return []
+    count = struct.unpack(parseTRAFile.RECORD_FORMAT, data[:size])[6] + 1
+    records = []
+    for i in range(count):
+        offset = size * (i + 1)
+        if offset + size > len(data):
+            break
+        records.append(struct.unpack(parseTRAFile.RECORD_FORMAT, data[offset:offset + size]))
+    return records
+
+
+def quiet(func, *args):
+    """Ruft ``func`` auf und gibt (Ergebnis, Ausgabe) zurück."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = func(*args)
+    return result, out.getvalue()
+
+
+class ParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.records = synthtra.generate_records(500, seed=3)
+        # Alle Feldtypen mit Werten belegen, die synthtra auslässt
+        self.records['rU1'] = np.linspace(-0.1, 0.1, 500)
+        self.records['iC'] = np.arange(500) - 250
+        self.path = self.write("full.tra", self.records)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def write(self, name, records, cut=0):
+        path = os.path.join(self.workdir, name)
+        synthtra.write_tra_file(path, records)
+        if cut:
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) - cut)
+        return path
+
+    def test_matches_struct_loop(self):
+        track, _ = quiet(parseTRAFile.parse_tra_track, self.path)
+        expected = struct_records(self.path)
+        self.assertEqual(len(track), len(expected))
+        self.assertEqual(track.data.tolist(), expected)
+        self.assertEqual(track.data.dtype.itemsize, parseTRAFile.RECORD_SIZE)
+
+    def test_record_dicts_keep_old_keys(self):
+        track, _ = quiet(parseTRAFile.parse_tra_track, self.path)
+        values = struct_records(self.path)[7]
+        record = track[7]
+        self.assertEqual((record['station'], record['rY'], record['rX'], record['direction'], record['radius']),
+                         (values[5], values[2], values[3], values[4], values[0]))
+        self.assertEqual(len(track.to_dicts()), 500)
+
+    def test_truncated_file_keeps_complete_records(self):
+        # Letzter Datensatz nur zur Hälfte vorhanden, der vorletzte vollständig
+        path = self.write("cut.tra", self.records, cut=parseTRAFile.RECORD_SIZE + 39)
+        track, output = quiet(parseTRAFile.parse_tra_track, path)
+        self.assertEqual(len(track), 498)
+        self.assertIn("Nicht genügend Daten für Datensatz 499.", output)
+        self.assertEqual(track.data.tolist(), struct_records(path))
+
+        header, count = quiet(parseTRAFile.read_tra_header, path)[0]
+        self.assertEqual((int(header['nKz']), count), (499, 498))
+
+    def test_trailing_data_beyond_header_count_is_ignored(self):
+        path = self.write("long.tra", self.records)
+        with open(path, "ab") as f:
+            f.write(self.records[:3].tobytes())
+        track, output = quiet(parseTRAFile.parse_tra_track, path)
+        self.assertEqual(len(track), 500)
+        self.assertNotIn("Nicht genügend", output)
+
+    def test_file_shorter_than_header(self):
+        path = os.path.join(self.workdir, "short.tra")
+        with open(path, "wb") as f:
+            f.write(b"\x00" * 10)
+        track, output = quiet(parseTRAFile.parse_tra_track, path)
+        self.assertEqual(len(track), 0)
+        self.assertIsNone(track.header)
+        self.assertIn("Datei zu kurz", output)
+
+    def test_chunks_and_buffer_match_track(self):
+        track, _ = quiet(parseTRAFile.parse_tra_track, self.path)
+        chunks, _ = quiet(lambda: [c.copy() for c in parseTRAFile.iter_tra_chunks(self.path, 64)])
+        self.assertEqual([len(c) for c in chunks], [64] * 7 + [52])
+        self.assertEqual(np.concatenate(chunks).tolist(), track.data.tolist())
+
+        with open(self.path, "rb") as f:
+            buffered, _ = quiet(parseTRAFile.parse_tra_buffer, f.read())
+        self.assertEqual(buffered.data.tolist(), track.data.tolist())
+        with self.assertRaises(ValueError):
+            next(parseTRAFile.iter_tra_chunks(self.path, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
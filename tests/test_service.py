@@ -0,0 +1,176 @@
+"""
+ConversionService auf 127.0.0.1 mit freiem Port (port=0): Fehlschlag und Treffer der
+Ergebnisablage, nicht konvertierbare Uploads (422), Ablehnung bei Auslastung (503),
+Dateinamen im Content-Disposition-Kopf und das Verbindungsende nach der ersten Antwort.
+"""
+import asyncio
+import http.client
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import service
+import synthtra
+
+
+def tra_bytes(count=200):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "trasse.tra")
+        synthtra.write_tra_file(path, synthtra.generate_records(count))
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def raw_request(port, request):
+    """Sendet ``request`` und liest bis zum Verbindungsende (Zeitüberschreitung: socket.timeout)."""
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(request)
+        chunks = []
+        for chunk in iter(lambda: sock.recv(65536), b""):
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class FirstRequestTest(unittest.TestCase):
+    """Eigener Dienst, damit die Anfrage wirklich die erste nach dem Start ist."""
+
+    def test_first_response_closes_connection(self):
+        cache_dir = tempfile.mkdtemp()
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        conversion_service = service.ConversionService(port=0, jobs=2, cache_dir=cache_dir)
+        try:
+            asyncio.run_coroutine_threadsafe(conversion_service.start(), loop).result(30)
+            tra = tra_bytes()
+            response = raw_request(conversion_service.port,
+                                   f"POST /convert?zone=3&format=csv HTTP/1.1\r\nHost: x\r\n"
+                                   f"Content-Length: {len(tra)}\r\n\r\n".encode("latin-1") + tra)
+            head, body = response.split(b"\r\n\r\n", 1)
+            self.assertTrue(head.startswith(b"HTTP/1.1 200"))
+            self.assertEqual(len(body.splitlines()), 201)
+        finally:
+            asyncio.run_coroutine_threadsafe(conversion_service.close(), loop).result(30)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(10)
+            loop.close()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+class ConversionServiceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.loop = asyncio.new_event_loop()
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+        cls.service = service.ConversionService(port=0, jobs=1, max_pending=1, cache_dir=cls.cache_dir)
+        asyncio.run_coroutine_threadsafe(cls.service.start(), cls.loop).result(30)
+        cls.tra = tra_bytes()
+
+    @classmethod
+    def tearDownClass(cls):
+        asyncio.run_coroutine_threadsafe(cls.service.close(), cls.loop).result(30)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join(10)
+        cls.loop.close()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.service.port, timeout=60)
+        try:
+            conn.request(method, path, body=body)
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            conn.close()
+
+    def test_miss_then_hit(self):
+        status, headers, body = self.request("POST", "/convert?zone=3&format=geojson&name=Erste", self.tra)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["X-Cache"], "miss")
+        feature = json.loads(body)["features"][0]
+        self.assertEqual(feature["properties"]["name"], "Erste")
+        self.assertEqual(len(feature["geometry"]["coordinates"]), 200)
+
+        status, headers, again = self.request("POST", "/convert?zone=3&format=geojson&name=Erste", self.tra)
+        self.assertEqual((status, headers["X-Cache"]), (200, "hit"))
+        self.assertEqual(again, body)
+
+        # Anderer Name: eigenes Ergebnis, nicht das zwischengespeicherte
+        status, headers, other = self.request("POST", "/convert?zone=3&format=geojson&name=Zweite", self.tra)
+        self.assertEqual((status, headers["X-Cache"]), (200, "miss"))
+        self.assertEqual(json.loads(other)["features"][0]["properties"]["name"], "Zweite")
+
+    def test_filename_header(self):
+        status, headers, _ = self.request("POST", "/convert?zone=3&format=csv&name=Strecke%E2%82%AC", self.tra)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Disposition"],
+                         "attachment; filename=\"Strecke_.csv\"; filename*=UTF-8''Strecke%E2%82%AC.csv")
+
+        status, _, _ = self.request("POST", "/convert?zone=3&name=x%0D%0AX-Injected:%201", self.tra)
+        self.assertEqual(status, 400)
+
+        self.assertEqual(service.content_disposition('a"b\\c\x07.kml'), 'attachment; filename="abc.kml"')
+        self.assertEqual(service.content_disposition("Böhlen.kml"),
+                         "attachment; filename=\"Bohlen.kml\"; filename*=UTF-8''B%C3%B6hlen.kml")
+
+    def test_unconvertible_upload(self):
+        status, _, body = self.request("POST", "/convert?zone=3&format=kml", b"\x00" * 10)
+        self.assertEqual(status, 422)
+        self.assertIn("error", json.loads(body))
+
+    def test_invalid_zone(self):
+        status, _, _ = self.request("POST", "/convert?zone=9", self.tra)
+        self.assertEqual(status, 400)
+
+    def test_busy(self):
+        # Eine Anfrage mit angekündigtem, aber noch nicht gesendetem Rumpf belegt max_pending=1
+        blocker = socket.create_connection(("127.0.0.1", self.service.port), timeout=30)
+        try:
+            blocker.sendall(f"POST /convert?zone=3 HTTP/1.1\r\nHost: x\r\n"
+                            f"Content-Length: {len(self.tra)}\r\n\r\n".encode("latin-1"))
+            for _ in range(100):
+                if self.service.pending:
+                    break
+                threading.Event().wait(0.05)
+            status, headers, _ = self.request("POST", "/convert?zone=3", self.tra)
+            self.assertEqual(status, 503)
+            self.assertIn("Retry-After", headers)
+            blocker.sendall(self.tra)
+            self.assertTrue(blocker.recv(64).startswith(b"HTTP/1.1 200"))
+        finally:
+            blocker.close()
+
+    def test_evict_keeps_files_in_use(self):
+        busy = os.path.join(self.cache_dir, "busy.kml")
+        idle = os.path.join(self.cache_dir, "idle.kml")
+        for path in (busy, idle):
+            with open(path, "wb") as f:
+                f.write(b"x" * 1000)
+        max_bytes = self.service.max_bytes
+        self.service.in_use[busy] += 1
+        try:
+            self.service.max_bytes = 0
+            self.loop.call_soon_threadsafe(self.service.evict)
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0), self.loop).result(10)
+        finally:
+            self.service.max_bytes = max_bytes
+            self.service.release(busy)
+        self.assertTrue(os.path.exists(busy))
+        self.assertFalse(os.path.exists(idle))
+        os.remove(busy)
+
+    def test_health(self):
+        status, _, body = self.request("GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["status"], "ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Linienvereinfachung (simplify): Douglas-Peucker gegen eine rekursive Referenz,
+Detailstufen der LODPyramid, Beschnitt auf den Ausschnitt und Auswahlpfade.
+"""
+import unittest
+
+import numpy as np
+
+import simplify
+
+
+def recursive_dp(x, y, tolerance, first, last, keep):
+    """Lehrbuchfassung: rekursiv am (ersten) Punkt mit größtem Abstand teilen."""
+    if last - first < 2:
+        return
+    points = np.arange(first + 1, last)
+    dist = simplify.segment_distances(x, y, points, first, last)
+    split = int(np.argmax(dist))
+    if dist[split] > tolerance:
+        keep[points[split]] = True
+        recursive_dp(x, y, tolerance, first, points[split], keep)
+        recursive_dp(x, y, tolerance, points[split], last, keep)
+
+
+def random_walk(count, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.normal(size=count)), np.cumsum(rng.normal(size=count))
+
+
+class DouglasPeuckerTest(unittest.TestCase):
+
+    def test_matches_recursive_reference(self):
+        x, y = random_walk(2000)
+        for tolerance in (0.1, 1.0, 5.0, 50.0):
+            with self.subTest(tolerance=tolerance):
+                keep = np.zeros(len(x), dtype=bool)
+                keep[0] = keep[-1] = True
+                recursive_dp(x, y, tolerance, 0, len(x) - 1, keep)
+                np.testing.assert_array_equal(simplify.douglas_peucker(x, y, tolerance), np.flatnonzero(keep))
+
+    def test_subset_of_indices(self):
+        x, y = random_walk(500)
+        subset = np.arange(0, 500, 3)
+        result = simplify.douglas_peucker(x, y, 2.0, subset)
+        self.assertTrue(np.isin(result, subset).all())
+        self.assertEqual((result[0], result[-1]), (0, subset[-1]))
+
+        keep = np.zeros(len(subset), dtype=bool)
+        keep[0] = keep[-1] = True
+        recursive_dp(x[subset], y[subset], 2.0, 0, len(subset) - 1, keep)
+        np.testing.assert_array_equal(result, subset[keep])
+
+    def test_straight_line_and_short_input(self):
+        x = np.linspace(0.0, 10.0, 50)
+        np.testing.assert_array_equal(simplify.douglas_peucker(x, 2 * x, 1e-9), [0, 49])
+        np.testing.assert_array_equal(simplify.douglas_peucker([0.0, 1.0], [0.0, 1.0], 0.1), [0, 1])
+
+
+class LODPyramidTest(unittest.TestCase):
+
+    def setUp(self):
+        self.x, self.y = random_walk(3000, seed=2)
+        self.lod = simplify.LODPyramid(self.x, self.y, 0.5)
+
+    def test_levels_are_nested_and_coarsen(self):
+        levels = self.lod.levels
+        self.assertLessEqual(len(levels[-1]), 2)
+        for finer, coarser in zip(levels, levels[1:]):
+            self.assertTrue(np.isin(coarser, finer).all())
+            self.assertLessEqual(len(coarser), len(finer))
+        np.testing.assert_allclose(np.diff(np.log2(self.lod.tolerances)), 1.0)
+
+    def test_indices_for(self):
+        np.testing.assert_array_equal(self.lod.indices_for(0.1), np.arange(3000))
+        np.testing.assert_array_equal(self.lod.indices_for(0.5), self.lod.levels[0])
+        np.testing.assert_array_equal(self.lod.indices_for(1.9), self.lod.levels[1])
+
+    def test_visible_indices_reach_past_the_viewport(self):
+        bbox = (-10.0, -10.0, 10.0, 10.0)
+        paths = self.lod.visible_indices(0.5, bbox)
+        self.assertTrue(paths)
+        idx = self.lod.indices_for(0.5)
+        x, y = self.x[idx], self.y[idx]
+        inside = np.flatnonzero((x >= -10) & (x <= 10) & (y >= -10) & (y <= 10))
+        covered = np.concatenate(paths)
+        # Alle sichtbaren Punkte sind enthalten, jeder Abschnitt ist zusammenhängend
+        self.assertTrue(np.isin(idx[inside], covered).all())
+        for path in paths:
+            positions = np.searchsorted(idx, path)
+            self.assertTrue(np.all(np.diff(positions) == 1))
+        self.assertEqual(self.lod.visible_indices(0.5, (1e6, 1e6, 1e6 + 1, 1e6 + 1)), [])
+
+    def test_index_runs(self):
+        firsts, lasts = simplify.index_runs(np.array([2, 3, 4, 8, 10, 11]))
+        self.assertEqual((firsts.tolist(), lasts.tolist()), ([2, 8, 10], [4, 8, 11]))
+
+
+class SelectionTest(unittest.TestCase):
+
+    def test_selection_ranges(self):
+        selected = np.zeros(20, dtype=bool)
+        selected[3:7] = selected[12:20] = True
+        starts, ends = simplify.selection_ranges(selected)
+        self.assertEqual((starts.tolist(), ends.tolist()), ([3, 12], [6, 19]))
+        empty = simplify.selection_ranges(np.zeros(5, dtype=bool))
+        self.assertEqual((len(empty[0]), len(empty[1])), (0, 0))
+
+    def test_selection_paths_keep_exact_bounds(self):
+        selected = np.zeros(20, dtype=bool)
+        selected[3:7] = selected[12:20] = True
+        lod_indices = np.array([0, 5, 10, 15, 19])
+        paths = simplify.selection_paths(lod_indices, selected)
+        self.assertEqual([p.tolist() for p in paths], [[3, 5, 6], [12, 15, 19]])
+
+        # Abschnitt ohne Anfang des zweiten Bereichs: nur die Punkte innerhalb
+        paths = simplify.selection_paths(np.array([15, 19]), selected)
+        self.assertEqual([p.tolist() for p in paths], [[15, 19]])
+        self.assertEqual(simplify.selection_paths(np.array([8, 10]), selected), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
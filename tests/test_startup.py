@@ -0,0 +1,27 @@
+"""Die Einstiegsmodule laden schwere Abhängigkeiten erst bei Bedarf (siehe benchmark.LAZY_IMPORTS)."""
+import os
+import subprocess
+import sys
+import unittest
+
+from benchmark import LAZY_IMPORTS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_after_import(module, candidates):
+    code = f"import sys, {module}; print(','.join(m for m in {candidates!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return [m for m in out.strip().split(",") if m]
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def test_entry_modules_stay_light(self):
+        for module, forbidden in LAZY_IMPORTS.items():
+            with self.subTest(module=module):
+                self.assertEqual(loaded_after_import(module, forbidden), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Stationsindex (stations.StationIndex): Ortung über Stationen, Bereichsabfragen und
+Zuschnitt einer Punktfolge auf einen Kilometerbereich, auch an den Rändern.
+"""
+import unittest
+
+import numpy as np
+
+import parseTRAFile
+import stations
+import synthtra
+
+
+def synthetic_track(count=40, seed=5):
+    records = synthtra.generate_records(count, seed=seed)
+    return parseTRAFile.TRATrack(records, np.zeros(1, dtype=parseTRAFile.TRA_DTYPE)[0])
+
+
+class StationIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.track = synthetic_track()
+        self.index = stations.StationIndex(self.track)
+        self.s = self.track.station
+
+    def test_locate_element_starts_and_ends(self):
+        y, x, bearing = self.index.locate(self.s)
+        np.testing.assert_allclose(y, self.track.rY, atol=1e-6)
+        np.testing.assert_allclose(x, self.track.rX, atol=1e-6)
+        np.testing.assert_allclose(bearing, self.track.rT, atol=1e-9)
+        # Kurz vor dem nächsten Elementanfang liegt der Punkt noch im vorigen Element
+        y, x, _ = self.index.locate(self.s[1:] - 1e-6)
+        np.testing.assert_allclose(y, self.track.rY[1:], atol=1e-4)
+        np.testing.assert_allclose(x, self.track.rX[1:], atol=1e-4)
+
+    def test_element_at_clips_outside(self):
+        elements = self.index.element_at([self.s[0] - 100.0, self.s[3], self.s[3] - 1e-9, self.s[-1] + 1e6])
+        self.assertEqual(elements.tolist(), [0, 3, 2, len(self.s) - 1])
+
+    def test_unsorted_records(self):
+        order = np.random.default_rng(0).permutation(len(self.s))
+        shuffled = stations.StationIndex(parseTRAFile.TRATrack(self.track.data[order], self.track.header))
+        queries = np.linspace(self.index.start, self.index.end, 97)
+        for expected, actual in zip(self.index.locate(queries), shuffled.locate(queries)):
+            np.testing.assert_allclose(actual, expected, atol=1e-9)
+        np.testing.assert_array_equal(order[shuffled.element_at(queries)], self.index.element_at(queries))
+
+    def test_range_mask(self):
+        mask = self.index.range_mask(self.s[4] + 1.0, self.s[6] + 1.0)
+        self.assertEqual(np.flatnonzero(mask).tolist(), [4, 5, 6])
+        # Bereich beginnt genau an einem Elementanfang: das vorige Element gehört nicht dazu
+        mask = self.index.range_mask(self.s[4], self.s[5] - 1.0)
+        self.assertEqual(np.flatnonzero(mask).tolist(), [4])
+        self.assertFalse(self.index.range_mask(self.s[-1] + 10.0, self.s[-1] + 20.0)[:-1].any())
+
+    def test_cut_inside(self):
+        start, end = self.s[2] + 10.0, self.s[9] - 10.0
+        y, x, cut_stations = self.index.cut(start, end, self.s, self.track.rY, self.track.rX, return_station=True)
+        self.assertEqual(cut_stations.tolist(), [start] + self.s[3:9].tolist() + [end])
+        ey, ex, _ = self.index.locate([start, end])
+        self.assertEqual((y[0], x[0], y[-1], x[-1]), (ey[0], ex[0], ey[1], ex[1]))
+        np.testing.assert_array_equal(y[1:-1], self.track.rY[3:9])
+
+    def test_cut_edges(self):
+        # Bereich größer als die Trasse: auf Anfang und Ende begrenzt, keine doppelten Punkte
+        y, x, cut_stations = self.index.cut(-1e9, 1e9, self.s, self.track.rY, self.track.rX, return_station=True)
+        self.assertEqual(cut_stations.tolist(), self.s.tolist())
+        np.testing.assert_allclose(y, self.track.rY, atol=1e-6)
+
+        # Bereich genau auf einem Elementanfang: nur Anfangs- und Endpunkt
+        y, x = self.index.cut(self.s[5], self.s[5], self.s, self.track.rY, self.track.rX)
+        self.assertEqual(len(y), 2)
+        self.assertAlmostEqual(y[0], self.track.rY[5], places=6)
+        self.assertEqual((y[0], x[0]), (y[1], x[1]))
+
+        # Bereich außerhalb der Trasse: leer
+        for result in (self.index.cut(self.s[-1] + 1.0, self.s[-1] + 2.0, self.s, self.track.rY, self.track.rX),
+                       self.index.cut(-20.0, -10.0, self.s, self.track.rY, self.track.rX, return_station=True)):
+            self.assertTrue(all(len(part) == 0 for part in result))
+
+
+class KmRangeTest(unittest.TestCase):
+
+    def test_parse_km_range(self):
+        self.assertEqual(stations.parse_km_range("km 12.4–37.9"), (12400.0, 37900.0))
+        self.assertEqual(stations.parse_km_range("37,9 bis 12,4"), (12400.0, 37900.0))
+        with self.assertRaises(ValueError):
+            stations.parse_km_range("12.4")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Zwischenspeicher eingelesener und projizierter Trassen (trackcache.TrackCache) in
+einem temporären Verzeichnis: Fehlschlag und Treffer, geänderte Dateien, WGS84 je
+Zone, Hinweise bei Treffern, Größenbegrenzung und veraltete Versionen.
+"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import parseTRAFile
+import projections
+import synthtra
+import trackcache
+
+
+def load(path, cache):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        track = trackcache.parse_tra_file(path, cache)
+    return track, out.getvalue()
+
+
+class TrackCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.cache = trackcache.TrackCache(os.path.join(self.workdir, "cache"))
+        self.path = os.path.join(self.workdir, "a.tra")
+        synthtra.write_tra_file(self.path, synthtra.generate_records(300))
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def entries(self):
+        return [name for _, _, files in os.walk(self.cache.cache_dir) for name in files]
+
+    def test_miss_then_hit(self):
+        first, _ = load(self.path, self.cache)
+        self.assertNotIsInstance(first.data, np.memmap)
+        self.assertEqual(first.digest, trackcache.file_digest(self.path))
+        self.assertIn(trackcache.RECORDS_FILE, self.entries())
+
+        second, output = load(self.path, self.cache)
+        self.assertIsInstance(second.data, np.memmap)  # aus records.npy abgebildet
+        self.assertEqual(second.data.tolist(), first.data.tolist())
+        self.assertEqual(second.header.tolist(), first.header.tolist())
+        self.assertIn("Anzahl der Datensätze: 300", output)
+
+        # Gleicher Inhalt unter anderem Namen: ebenfalls ein Treffer
+        copy = os.path.join(self.workdir, "kopie.tra")
+        shutil.copy(self.path, copy)
+        self.assertIsInstance(load(copy, self.cache)[0].data, np.memmap)
+
+    def test_changed_file_is_a_miss(self):
+        first, _ = load(self.path, self.cache)
+        synthtra.write_tra_file(self.path, synthtra.generate_records(200, seed=9))
+        changed, _ = load(self.path, self.cache)
+        self.assertNotIsInstance(changed.data, np.memmap)
+        self.assertNotEqual(changed.digest, first.digest)
+        self.assertEqual(len(changed), 200)
+
+    def test_hit_repeats_truncation_notice(self):
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 10)
+        _, first_output = load(self.path, self.cache)
+        track, output = load(self.path, self.cache)
+        self.assertIsInstance(track.data, np.memmap)
+        self.assertEqual(len(track), 299)
+        self.assertIn("Nicht genügend Daten für Datensatz 300.", first_output)
+        self.assertIn("Nicht genügend Daten für Datensatz 300.", output)
+
+    def test_wgs84_per_zone(self):
+        track, _ = load(self.path, self.cache)
+        self.assertIsNone(trackcache.cached_wgs84(track, "3", self.cache))
+        lons, lats = trackcache.track_wgs84(track, "3", self.cache)
+        expected = projections.gk_to_wgs84("3", track.rY, track.rX)
+        np.testing.assert_array_equal(lons, expected[0])
+        np.testing.assert_array_equal(lats, expected[1])
+
+        cached = trackcache.cached_wgs84(track, " 3 ", self.cache)
+        self.assertIsNotNone(cached)
+        np.testing.assert_array_equal(cached[0], lons)
+        self.assertIsNone(trackcache.cached_wgs84(track, "4", self.cache))
+
+    def test_disabled_cache(self):
+        track, _ = load(self.path, False)
+        self.assertIsNone(track.digest)
+        self.assertEqual(self.entries(), [])
+        self.assertIsNone(trackcache.cached_wgs84(track, "3", False))
+
+        zero = trackcache.TrackCache(self.cache.cache_dir, max_bytes=0)
+        load(self.path, zero)
+        self.assertEqual(self.entries(), [])
+
+    def test_size_limit_evicts_least_recently_used(self):
+        paths = []
+        for i in range(4):
+            path = os.path.join(self.workdir, f"n{i}.tra")
+            synthtra.write_tra_file(path, synthtra.generate_records(300, seed=i))
+            paths.append(path)
+        entry_bytes = 300 * parseTRAFile.RECORD_SIZE
+        cache = trackcache.TrackCache(self.cache.cache_dir, max_bytes=int(2.5 * entry_bytes))
+        for path in paths:
+            load(path, cache)
+        digests = [trackcache.file_digest(p) for p in paths]
+        present = [os.path.isdir(cache._entry_dir(d)) for d in digests]
+        self.assertLessEqual(sum(present), 2)
+        self.assertTrue(present[-1])
+
+    def test_stale_versions_are_removed(self):
+        stale = [os.path.join(self.cache.cache_dir, name, "x") for name in ("v0", "ab")]
+        for path in stale:
+            os.makedirs(path)
+        load(self.path, self.cache)
+        self.cache._evict()
+        self.assertEqual(sorted(os.listdir(self.cache.cache_dir)), [f"v{trackcache.FORMAT_VERSION}"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Überwachung (watch.Watcher) in temporären Verzeichnissen: Manifest über Neustarts,
+unveränderte und nur berührte Dateien, geänderte Einstellungen, Ruhezeit und
+erneute Versuche nach Fehlern mit wachsendem Abstand.
+
+Abgefragt und eingesammelt wird wie in Watcher.run, konvertiert aber in einem
+Thread-Pool (timing.worker_call ruft im Hauptprozess direkt auf).
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import synthtra
+import watch
+
+
+class WatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.in_dir = os.path.join(self.workdir, "in")
+        self.out_dir = os.path.join(self.workdir, "out")
+        os.makedirs(self.in_dir)
+        os.makedirs(self.out_dir)  # legt sonst Watcher.run an
+        self.path = self.write("a.tra", 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def write(self, name, count, seed=0, age=60.0):
+        """Schreibt eine TRA-Datei, die schon ``age`` Sekunden unverändert ist."""
+        path = os.path.join(self.in_dir, name)
+        synthtra.write_tra_file(path, synthtra.generate_records(count, seed=seed))
+        self.age(path, age)
+        return path
+
+    @staticmethod
+    def age(path, seconds):
+        mtime = time.time() - seconds
+        os.utime(path, (mtime, mtime))
+
+    def watcher(self, **kwargs):
+        kwargs.setdefault("settle", 1.0)
+        return watch.Watcher([self.in_dir], "3", self.out_dir, jobs=1, **kwargs)
+
+    def poll(self, watcher):
+        """Ein Durchgang wie in Watcher.run: abfragen, einreichen, einsammeln. Gibt (neu, Fehler) zurück."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            added = watcher.scan()
+            failures = 0
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                while watcher.queue or watcher.running:
+                    watcher.submit(pool)
+                    done, _ = wait(list(watcher.running))
+                    failures += watcher.collect(done)
+        return added, failures
+
+    def test_converts_once_across_restarts(self):
+        watcher = self.watcher()
+        self.assertEqual(self.poll(watcher), (1, 0))
+        outfile = os.path.join(self.out_dir, "a.kml")
+        entry = watcher.manifest[self.path]
+        self.assertEqual((entry["output"], entry["digest"]), (outfile, watch.trackcache.file_digest(self.path)))
+        self.assertEqual(self.poll(watcher), (0, 0))
+
+        watcher.save(force=True)
+        restarted = self.watcher()
+        self.assertEqual(restarted.manifest, json.loads(json.dumps(watcher.manifest)))
+        self.assertEqual(self.poll(restarted), (0, 0))
+
+    def test_touched_file_is_not_converted_again(self):
+        watcher = self.watcher()
+        self.poll(watcher)
+        outfile = os.path.join(self.out_dir, "a.kml")
+        os.remove(outfile)
+        self.age(self.path, 30.0)  # nur die Änderungszeit ist neu
+        self.assertEqual(self.poll(watcher), (1, 0))
+        self.assertFalse(os.path.exists(outfile))
+        self.assertEqual(watcher.manifest[self.path]["mtime_ns"], os.stat(self.path).st_mtime_ns)
+        self.assertEqual(self.poll(watcher), (0, 0))
+
+    def test_changed_content_is_converted(self):
+        watcher = self.watcher()
+        self.poll(watcher)
+        digest = watcher.manifest[self.path]["digest"]
+        self.write("a.tra", 120, seed=4, age=30.0)
+        self.assertEqual(self.poll(watcher), (1, 0))
+        self.assertNotEqual(watcher.manifest[self.path]["digest"], digest)
+
+    def test_changed_settings_are_converted_again(self):
+        watcher = self.watcher()
+        self.poll(watcher)
+        watcher.save(force=True)
+        self.assertEqual(self.poll(self.watcher()), (0, 0))
+
+        csv_watcher = self.watcher(fmt="csv")
+        self.assertEqual(self.poll(csv_watcher), (1, 0))
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, "a.csv")))
+        self.assertNotEqual(csv_watcher.manifest[self.path]["settings"], watcher.settings)
+
+    def test_settle_time(self):
+        self.age(self.path, 0.0)
+        watcher = self.watcher(settle=30.0)
+        self.assertEqual(self.poll(watcher), (0, 0))
+        self.age(self.path, 60.0)
+        self.assertEqual(self.poll(watcher), (1, 0))
+
+    def test_failure_is_retried_with_backoff(self):
+        broken = os.path.join(self.in_dir, "kaputt.tra")
+        with open(broken, "wb") as f:
+            f.write(b"\x00" * 10)
+        self.age(broken, 60.0)
+        watcher = self.watcher()
+        self.assertEqual(self.poll(watcher), (2, 1))
+        entry = watcher.manifest[broken]
+        self.assertEqual(entry["attempts"], 1)
+        self.assertIn("Keine Datensätze", entry["error"])
+        self.assertAlmostEqual(entry["retry_at"] - time.time(), watch.RETRY_DELAY, delta=5.0)
+
+        # Vor Ablauf der Wartezeit kein neuer Versuch, danach schon (mit doppeltem Abstand)
+        self.assertEqual(self.poll(watcher), (0, 0))
+        entry["retry_at"] = time.time() - 1.0
+        self.assertEqual(self.poll(watcher), (1, 1))
+        self.assertEqual(watcher.manifest[broken]["attempts"], 2)
+        self.assertAlmostEqual(watcher.manifest[broken]["retry_at"] - time.time(), 2 * watch.RETRY_DELAY, delta=5.0)
+
+        # Repariert: beim nächsten Versuch konvertiert, der Fehler verschwindet
+        synthtra.write_tra_file(broken, synthtra.generate_records(50))
+        self.age(broken, 60.0)
+        self.assertEqual(self.poll(watcher), (1, 0))
+        self.assertNotIn("error", watcher.manifest[broken])
+
+    def test_retry_delay(self):
+        self.assertEqual([watch.retry_delay(n) for n in (1, 2, 3)],
+                         [watch.RETRY_DELAY, 2 * watch.RETRY_DELAY, 4 * watch.RETRY_DELAY])
+        self.assertEqual(watch.retry_delay(100), watch.MAX_RETRY_DELAY)
+
+    def test_deleted_files_leave_the_manifest(self):
+        watcher = self.watcher()
+        self.poll(watcher)
+        os.remove(self.path)
+        self.poll(watcher)
+        self.assertNotIn(self.path, watcher.manifest)
+
+    def test_unreadable_manifest_starts_fresh(self):
+        path = os.path.join(self.workdir, "manifest.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{kaputt")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(watch.load_manifest(path), {})
+        self.assertEqual(watch.load_manifest(os.path.join(self.workdir, "fehlt.json")), {})
+
+    def test_run_once_with_process_pool(self):
+        previous = signal.getsignal(signal.SIGTERM)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                failures = self.watcher().run(once=True)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+        self.assertEqual(failures, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, "a.kml")))
+        with open(os.path.join(self.out_dir, watch.MANIFEST_NAME), encoding="utf-8") as f:
+            self.assertIn(self.path, json.load(f))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+WMSCache gegen einen lokalen Ersatz-WMS (http.server auf 127.0.0.1).
+
+Der Ersatzdienst liefert je nach Layer ein PNG, eine ServiceException als XML mit
+Status 200 oder einen HTTP-Fehler und zählt die Anfragen.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+import wmscache
+
+BBOX = (13.0, 52.0, 13.1, 52.1)
+
+
+def png_bytes(width, height):
+    buffer = BytesIO()
+    Image.new("RGBA", (width, height), (10, 20, 30, 255)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class StandInWMS(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        StandInWMS.requests.append(query)
+        layer = query.get("layers")
+        if layer == "png":
+            body, content_type, status = png_bytes(int(query["width"]), int(query["height"])), "image/png", 200
+        elif layer == "exception":
+            body = b'<?xml version="1.0"?><ServiceExceptionReport><ServiceException>Layer not defined' \
+                   b'</ServiceException></ServiceExceptionReport>'
+            content_type, status = "application/vnd.ogc.se_xml", 200
+        else:
+            body, content_type, status = b"kaputt", "text/plain", 500
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WMSCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInWMS)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/wms"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInWMS.requests.clear()
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def cache(self, layer, **kwargs):
+        return wmscache.WMSCache(self.url, layer, cache_dir=self.cache_dir, **kwargs)
+
+    def disk_entries(self):
+        return [name for _, _, files in os.walk(self.cache_dir) for name in files if name.endswith(".png")]
+
+    def test_miss_then_memory_and_disk_hit(self):
+        cache = self.cache("png")
+        image = cache.get_map(BBOX, 64, 32)
+        self.assertEqual(image.size, (64, 32))
+        self.assertEqual(len(StandInWMS.requests), 1)
+        self.assertEqual(len(self.disk_entries()), 1)
+
+        cache.get_map(BBOX, 64, 32)
+        self.assertEqual(len(StandInWMS.requests), 1)  # aus dem Speicher
+
+        fresh = self.cache("png")
+        self.assertEqual(fresh.get_map(BBOX, 64, 32).size, (64, 32))
+        self.assertEqual(len(StandInWMS.requests), 1)  # von der Platte
+
+        fresh.get_map(BBOX, 32, 32)
+        self.assertEqual(len(StandInWMS.requests), 2)  # anderer Schlüssel
+
+    def test_service_exception_is_not_cached(self):
+        cache = self.cache("exception")
+        with self.assertRaises(ValueError):
+            cache.get_map(BBOX, 64, 32)
+        with self.assertRaises(ValueError):
+            cache.get_map(BBOX, 64, 32)
+        self.assertEqual(len(StandInWMS.requests), 2)
+        self.assertEqual(self.disk_entries(), [])
+
+    def test_http_error_is_not_cached(self):
+        import requests
+        cache = self.cache("error")
+        with self.assertRaises(requests.HTTPError):
+            cache.get_map(BBOX, 64, 32)
+        self.assertEqual(self.disk_entries(), [])
+
+    def test_corrupt_disk_entry_is_fetched_again(self):
+        cache = self.cache("png")
+        path = cache._disk_path(cache.cache_key(BBOX, 64, 32))
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"kein PNG")
+        self.assertEqual(cache.get_map(BBOX, 64, 32).size, (64, 32))
+        self.assertEqual(len(StandInWMS.requests), 1)
+        with open(path, "rb") as f:
+            self.assertTrue(f.read().startswith(b"\x89PNG"))
+
+    def test_disk_size_limit(self):
+        size = len(png_bytes(64, 32))
+        cache = self.cache("png", max_disk_bytes=3 * size)
+        for i in range(6):
+            cache.get_map((13.0 + i, 52.0, 13.1 + i, 52.1), 64, 32)
+        self.assertLessEqual(len(self.disk_entries()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+"""
+Leichtgewichtige Zeitmessung der Verarbeitungsschritte.
+
+Aktiviert über die Umgebungsvariable TRATOKML_TIMING=1 oder ``main.py --timing``.
+Jeder Schritt wird mit ``stage(name)`` umschlossen; bei aktivierter Messung
+werden Dauer und Zähler (z.B. Anzahl Datensätze) als JSON-Zeile über den Logger
+LOGGER_NAME ausgegeben und je Schritt aufsummiert. Ist die Messung aus,
+kostet ``stage`` nur einen Funktionsaufruf.
+
+``start_profile(path)`` zeichnet zusätzlich die ganze Sitzung mit cProfile auf
+und schreibt beim Beenden eine pstats-Datei.
+
+Aufträge in Prozesspools werden mit ``worker_call`` eingereicht und ihre Ergebnisse
+mit ``worker_result`` abgeholt: Die Messwerte des Kindprozesses kommen mit dem
+Ergebnis zurück, und bei aktivem Profiling schreibt jeder Kindprozess eine eigene
+pstats-Datei (``<path>.<pid>``), die beim Beenden in ``path`` zusammengeführt wird.
+"""
+import atexit
+import functools
+import glob
+import json
+import os
+import threading
+import time
+
+ENV_VAR = "TRATOKML_TIMING"
+PROFILE_ENV_VAR = "TRATOKML_PROFILE"
+LOGGER_NAME = "tratokml.timing"
+
+_enabled = os.environ.get(ENV_VAR, "") not in ("", "0")
+_lock = threading.Lock()
+_stats = {}
+_profiler = None
+_profiler_pid = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable():
+    """Schaltet die Messung ein (auch für Kindprozesse, die die Umgebung erben)."""
+    global _enabled
+    _enabled = True
+    os.environ[ENV_VAR] = "1"
+    _ensure_handler()
+
+
+def _ensure_handler():
+    # logging wird erst bei aktivierter Messung geladen (Startzeit)
+    import logging
+    logger = logging.getLogger(LOGGER_NAME)
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+class _Stage:
+    __slots__ = ("name", "counters", "start")
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+        self.start = None
+
+    def add(self, **counters):
+        """Ergänzt Zähler (z.B. records=1234) für diesen Schritt."""
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        with _lock:
+            entry = _stats.setdefault(self.name, {"calls": 0, "seconds": 0.0, "last": 0.0, "counters": {}})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["last"] = seconds
+            for key, value in self.counters.items():
+                entry["counters"][key] = entry["counters"].get(key, 0) + value
+        record = {"stage": self.name, "seconds": round(seconds, 6), "thread": threading.current_thread().name}
+        record.update(self.counters)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _ensure_handler().info(json.dumps(record, ensure_ascii=False))
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def add(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, **counters):
+    """Kontextmanager, der den Schritt ``name`` misst (ohne Wirkung, wenn die Messung aus ist)."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, dict(counters))
+
+
+def timed(name):
+    """Dekorator: misst jeden Aufruf der Funktion als Schritt ``name``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Kopie der aufsummierten Messwerte je Schritt."""
+    with _lock:
+        return {name: dict(entry, counters=dict(entry["counters"])) for name, entry in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def merge(other):
+    """Addiert Messwerte aus stats() eines anderen Prozesses zu den eigenen."""
+    with _lock:
+        for name, source in (other or {}).items():
+            entry = _stats.setdefault(name, {"calls": 0, "seconds": 0.0, "last": 0.0, "counters": {}})
+            entry["calls"] += source["calls"]
+            entry["seconds"] += source["seconds"]
+            entry["last"] = source["last"]
+            for key, value in source["counters"].items():
+                entry["counters"][key] = entry["counters"].get(key, 0) + value
+
+
+def summary():
+    """Mehrzeilige Übersicht (Schritt, Aufrufe, Gesamt-, letzte Dauer) für Ausgabe oder GUI."""
+    lines = []
+    for name, entry in sorted(stats().items(), key=lambda item: -item[1]["seconds"]):
+        counters = " ".join(f"{k}={v}" for k, v in entry["counters"].items())
+        lines.append(f"{name:16s} {entry['calls']:5d}x  {entry['seconds'] * 1000:9.1f} ms  "
+                     f"zuletzt {entry['last'] * 1000:8.1f} ms  {counters}".rstrip())
+    return "\n".join(lines)
+
+
+def start_profile(path):
+    """
+    Startet cProfile für die ganze Sitzung; beim Beenden wird eine pstats-Datei nach ``path``
+    geschrieben, zusammen mit den Profilen der über worker_call gestarteten Kindprozesse.
+    """
+    global _profiler, _profiler_pid
+    import cProfile
+    if _profiler is not None:
+        return
+    path = os.path.abspath(path)
+    os.environ[PROFILE_ENV_VAR] = path
+    _profiler = cProfile.Profile()
+    _profiler_pid = os.getpid()
+    _profiler.enable()
+
+    def dump():
+        import pstats
+        _profiler.disable()
+        _profiler.dump_stats(path)
+        worker_files = [p for p in glob.glob(glob.escape(path) + ".*") if p.rsplit(".", 1)[1].isdigit()]
+        if worker_files:
+            merged = pstats.Stats(path)
+            for worker_file in worker_files:
+                merged.add(worker_file)
+                os.remove(worker_file)
+            merged.dump_stats(path)
+        print(f"Profil geschrieben: {path}" +
+              (f" (mit {len(worker_files)} Kindprozess(en))" if worker_files else ""))
+
+    atexit.register(dump)
+
+
+def _worker_profiler():
+    """cProfile des Kindprozesses, falls die Sitzung profiliert wird (sonst None)."""
+    global _profiler, _profiler_pid
+    if not os.environ.get(PROFILE_ENV_VAR):
+        return None
+    if _profiler_pid != os.getpid():
+        # Per fork geerbtes Profil des Elternprozesses abschalten, eigenes anlegen
+        import cProfile
+        if _profiler is not None:
+            _profiler.disable()
+        _profiler = cProfile.Profile()
+        _profiler_pid = os.getpid()
+    return _profiler
+
+
+def worker_call(func, *args, **kwargs):
+    """
+    Führt ``func`` in einem Kindprozess aus (für ProcessPoolExecutor.submit) und gibt
+    (Ergebnis, Messwerte) zurück. Wird die Sitzung profiliert, wird der Aufruf in das Profil
+    des Kindprozesses aufgenommen und dieses nach ``<path>.<pid>`` geschrieben (Kindprozesse
+    eines Pools werden ohne atexit beendet). Bei Fehlern hängen die Messwerte als
+    ``timing_stats`` an der Ausnahme. Im Hauptprozess aufgerufen, zählt alles direkt dort.
+    """
+    import multiprocessing
+    if multiprocessing.parent_process() is None:
+        return func(*args, **kwargs), {}
+    reset()  # per fork geerbte Messwerte nicht erneut melden
+    profiler = _worker_profiler()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        e.timing_stats = stats()
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(f"{os.environ[PROFILE_ENV_VAR]}.{os.getpid()}")
+    return result, stats()
+
+
+def worker_result(future):
+    """Ergebnis eines mit worker_call eingereichten Auftrags; übernimmt dessen Messwerte."""
+    try:
+        result, worker_stats = future.result()
+    except Exception as e:
+        merge(getattr(e, "timing_stats", None))
+        raise
+    merge(worker_stats)
+    return result
@@ -0,0 +1,265 @@
+"""
+Zwischenspeicher für eingelesene und projizierte Trassen.
+
+Der Schlüssel ist ein Inhaltshash (BLAKE2b) der TRA-Datei; je Eintrag werden die
+Datensätze als records.npy und die WGS84-Koordinaten je GK-Zone als wgs84_<zone>.npy
+abgelegt. Gehasht werden dieselben Bytes, aus denen die Trasse gelesen wird, sodass eine
+währenddessen überschriebene Datei nicht unter dem alten Hash landet. Die Einträge liegen
+unter v<FORMAT_VERSION>; Einträge älterer Versionen werden nicht mehr gelesen. Ein erneutes Laden derselben Datei ist damit nur ein per mmap abgebildeter
+Lesezugriff, unabhängig von Dateiname und Speicherort.
+
+Das Verzeichnis ist größenbegrenzt; verdrängt werden die am längsten nicht benutzten
+Einträge. Mit TRATOKML_TRACK_CACHE=0 wird der Zwischenspeicher abgeschaltet. Die
+Funktionen nehmen als ``cache`` einen TrackCache, None für den gemeinsamen
+Zwischenspeicher des Prozesses oder False für keinen.
+"""
+import hashlib
+import os
+import shutil
+import threading
+
+import numpy as np
+
+import parseTRAFile
+import projections
+import timing
+
+ENV_VAR = "TRATOKML_TRACK_CACHE"
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DIGEST_SIZE = 20
+HASH_BLOCK_SIZE = 1024 * 1024
+
+RECORDS_FILE = "records.npy"
+HEADER_FILE = "header.npy"
+
+# Bei Änderungen an parseTRAFile.TRA_DTYPE, projections.GK_PROJECTIONS oder am Aufbau
+# der Einträge erhöhen: die alten Einträge werden dann nicht mehr benutzt und verdrängt
+FORMAT_VERSION = 1
+
+
+def is_enabled():
+    return os.environ.get(ENV_VAR, "") not in ("0", "off", "false")
+
+
+def default_cache_dir():
+    """Cache-Verzeichnis: $TRATOKML_CACHE_DIR oder das Benutzer-Cacheverzeichnis des Systems."""
+    if os.environ.get("TRATOKML_CACHE_DIR"):
+        return os.path.join(os.environ["TRATOKML_CACHE_DIR"], "tracks")
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "TRAtoKML", "tracks")
+
+
+def file_digest(filepath):
+    """Inhaltshash (BLAKE2b, hex) der Datei ``filepath``."""
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def buffer_digest(buffer):
+    """Inhaltshash (BLAKE2b, hex) wie file_digest, aber von bereits gelesenen Bytes."""
+    return hashlib.blake2b(buffer, digest_size=DIGEST_SIZE).hexdigest()
+
+
+class TrackCache:
+    """
+    Inhaltsadressierter Zwischenspeicher für TRATrack-Daten und ihre WGS84-Koordinaten.
+    Einträge werden atomar geschrieben und können von mehreren Prozessen (z.B. der
+    Stapelkonvertierung) gleichzeitig benutzt werden.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.version_dir = os.path.join(self.cache_dir, f"v{FORMAT_VERSION}")
+        self.max_bytes = max_bytes
+        self._approx_bytes = None  # Schätzung der Verzeichnisgröße, siehe _account
+
+    def _entry_dir(self, digest):
+        return os.path.join(self.version_dir, digest[:2], digest)
+
+    def _touch(self, digest):
+        try:
+            os.utime(self._entry_dir(digest))  # Zugriffszeitpunkt für die LRU-Verdrängung
+        except OSError:
+            pass
+
+    def _load(self, digest, name):
+        try:
+            return np.load(os.path.join(self._entry_dir(digest), name), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, digest, name, array):
+        if self.max_bytes <= 0:
+            return
+        path = os.path.join(self._entry_dir(digest), name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Trassen-Cache konnte nicht geschrieben werden: {e}")
+            return
+        self._account(array.nbytes)
+
+    def _account(self, nbytes):
+        """
+        Führt die geschätzte Verzeichnisgröße nach und verdrängt erst, wenn die Schätzung
+        die Obergrenze überschreitet; das Verzeichnis wird also nicht bei jedem Schreiben
+        durchsucht. Schreiben andere Prozesse mit, korrigiert der nächste Durchlauf die Schätzung.
+        """
+        if self._approx_bytes is None:
+            self._approx_bytes = self._evict()
+        self._approx_bytes += nbytes
+        if self._approx_bytes > self.max_bytes:
+            self._approx_bytes = self._evict()
+
+    def load_track(self, digest):
+        """Gibt das zwischengespeicherte TRATrack zu ``digest`` zurück (oder None)."""
+        records = self._load(digest, RECORDS_FILE)
+        if records is None:
+            return None
+        header = self._load(digest, HEADER_FILE)
+        self._touch(digest)
+        track = parseTRAFile.TRATrack(records, header[0] if header is not None and len(header) else None)
+        track.digest = digest
+        return track
+
+    def store_track(self, digest, track):
+        header = np.zeros(0 if track.header is None else 1, dtype=parseTRAFile.TRA_DTYPE)
+        if track.header is not None:
+            header[0] = track.header
+        self._save(digest, HEADER_FILE, header)
+        self._save(digest, RECORDS_FILE, np.ascontiguousarray(track.data))
+
+    def load_wgs84(self, digest, zone):
+        """Gibt (lons, lats) der Trasse ``digest`` in GK-Zone ``zone`` zurück (oder None)."""
+        coords = self._load(digest, f"wgs84_{zone}.npy")
+        if coords is None:
+            return None
+        self._touch(digest)
+        return coords[0], coords[1]
+
+    def store_wgs84(self, digest, zone, lons, lats):
+        self._save(digest, f"wgs84_{zone}.npy", np.stack([lons, lats]))
+
+    def _evict(self):
+        """
+        Löscht Einträge anderer Versionen und die am längsten nicht benutzten Einträge,
+        bis die Größenobergrenze eingehalten ist, und gibt die verbleibende Gesamtgröße zurück.
+        """
+        self._remove_stale_versions()
+        entries = []
+        total = 0
+        for prefix in os.scandir(self.version_dir) if os.path.isdir(self.version_dir) else ():
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                entries.append((mtime, size, entry.path))
+                total += size
+        if total <= self.max_bytes:
+            return total
+        entries.sort()
+        for _, size, path in entries:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            if total <= self.max_bytes:
+                break
+        return total
+
+    def _remove_stale_versions(self):
+        """Löscht Einträge älterer Versionen (v<n> und die Präfixverzeichnisse ohne Version)."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        current = os.path.basename(self.version_dir)
+        for item in os.scandir(self.cache_dir):
+            stale = (item.name[:1] == "v" and item.name[1:].isdigit()) or len(item.name) == 2
+            if item.name != current and stale and item.is_dir():
+                shutil.rmtree(item.path, ignore_errors=True)
+
+
+_default_cache = None
+
+
+def default_cache():
+    """Gemeinsamer TrackCache des Prozesses (None, wenn abgeschaltet)."""
+    global _default_cache
+    if not is_enabled():
+        return None
+    if _default_cache is None:
+        _default_cache = TrackCache()
+    return _default_cache
+
+
+def parse_tra_file(filepath, cache=None):
+    """
+    Wie parseTRAFile.parse_tra_track, aber über den Zwischenspeicher: bei einem Treffer
+    werden die Datensätze schreibgeschützt per mmap aus records.npy gelesen. Das
+    Ergebnis trägt den Inhaltshash als ``track.digest``.
+
+    Die Datei wird einmal gelesen (eine TRA-Datei hat höchstens 32768 Datensätze); Hash
+    und Trasse stammen aus denselben Bytes, auch wenn die Datei gerade überschrieben wird.
+    """
+    cache = default_cache() if cache is None else cache
+    if not cache:
+        return parseTRAFile.parse_tra_track(filepath)
+
+    with open(filepath, "rb") as f:
+        buffer = f.read()
+    digest = buffer_digest(buffer)
+    with timing.stage("track_cache_load") as st:
+        track = cache.load_track(digest)
+        st.add(hits=int(track is not None))
+    if track is not None:
+        # Kopf auswerten, damit Hinweise wie bei einer abgeschnittenen Datei auch bei Treffern erscheinen
+        parseTRAFile.parse_tra_header(buffer[:parseTRAFile.RECORD_SIZE], len(buffer))
+        print(f"TRA-Datei erfolgreich eingelesen. Anzahl der Datensätze: {len(track)}")
+        return track
+
+    track = parseTRAFile.parse_tra_buffer(buffer)
+    if track.header is not None:
+        cache.store_track(digest, track)
+    track.digest = digest
+    return track
+
+
+def cached_wgs84(track, zone, cache=None):
+    """
+    Bereits abgelegte WGS84-Koordinaten (lons, lats) eines TRATrack aus dem
+    Zwischenspeicher oder None; projiziert selbst nicht.
+    """
+    cache = default_cache() if cache is None else cache
+    digest = getattr(track, "digest", None)
+    zone = str(zone).strip()
+    if not cache or digest is None or zone not in projections.GK_PROJECTIONS:
+        return None
+    return cache.load_wgs84(digest, zone)
+
+
+def track_wgs84(track, zone, cache=None):
+    """
+    WGS84-Koordinaten (lons, lats) der Datensatzanfänge eines TRATrack. Stammt die Trasse
+    aus dem Zwischenspeicher (``track.digest``), werden die projizierten Arrays je Zone
+    wiederverwendet bzw. nach der ersten Projektion abgelegt.
+    """
+    cache = default_cache() if cache is None else cache
+    coords = cached_wgs84(track, zone, cache)
+    if coords is not None:
+        return coords
+    lons, lats = projections.gk_to_wgs84(zone, track.rY, track.rX)
+    digest = getattr(track, "digest", None)
+    zone = str(zone).strip()
+    if cache and digest is not None and zone in projections.GK_PROJECTIONS:
+        cache.store_wgs84(digest, zone, lons, lats)
+    return lons, lats
@@ -0,0 +1,241 @@
+"""
+Überwachung von Verzeichnissen: neue oder geänderte TRA-Dateien werden laufend
+nach KML (bzw. KMZ) konvertiert.
+
+Die Verzeichnisse werden in festen Abständen abgefragt (ohne plattformabhängige
+Dateisystem-Benachrichtigungen). Ein Manifest (JSON) hält je Datei Änderungszeit,
+Größe, Inhaltshash und einen Fingerabdruck der Einstellungen (Zone, Ausgabeverzeichnis,
+Format, Verdichtung, Kilometerbereich, Kacheln) fest; konvertiert wird nur, was neu ist,
+sich inhaltlich geändert hat oder mit anderen Einstellungen überwacht wird, auch über
+Neustarts hinweg. Gehasht wird nur bei geänderter Zeit oder
+Größe, und zwar im Prozesspool. Dateien, die sich noch ändern (Kopiervorgang), werden
+erst nach einer Ruhezeit übernommen. Fehlgeschlagene Konvertierungen werden mit dem
+Fehler vermerkt und mit wachsendem Abstand erneut versucht.
+
+Die Konvertierung läuft in einem Prozesspool fester Größe. Es sind höchstens
+``max_pending`` Aufträge gleichzeitig eingereicht; weitere Dateien warten in einer
+Warteschlange, sodass auch ein Schub von tausenden Dateien Speicher und CPU nicht überlastet.
+"""
+import hashlib
+import json
+import os
+import signal
+import time
+from collections import deque
+
+import batch
+import projections
+import timing
+import trackcache
+
+MANIFEST_NAME = ".tratokml-manifest.json"
+DEFAULT_INTERVAL = 5.0
+DEFAULT_SETTLE = 2.0
+
+# Das Manifest wird höchstens so oft (s) zwischendurch gespeichert, sonst beim Beenden
+MANIFEST_SAVE_INTERVAL = 5.0
+
+# Abstand (s) bis zum erneuten Versuch nach einem Fehler; verdoppelt sich je Fehlversuch
+RETRY_DELAY = 30.0
+MAX_RETRY_DELAY = 3600.0
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Manifest {path} nicht lesbar, beginne neu: {e}")
+        return {}
+
+
+def save_manifest(path, manifest):
+    """Schreibt das Manifest atomar (erst in eine temporäre Datei, dann umbenennen)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def settings_fingerprint(zone, out_dir, *options):
+    """Kurzer Hash der Konvertierungseinstellungen (Argumente wie bei batch.convert_file)."""
+    text = json.dumps([zone, out_dir, *options], default=repr)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def convert_if_changed(path, digest, zone, out_dir, *options):
+    """
+    Im Kindprozess: hasht ``path`` und konvertiert die Datei mit batch.convert_file, sofern
+    sich der Inhalt gegenüber ``digest`` geändert hat. Gibt (Inhaltshash, Ergebnis von
+    convert_file oder None bei unverändertem Inhalt) zurück.
+    """
+    new_digest = trackcache.file_digest(path)
+    if digest is not None and new_digest == digest:
+        return new_digest, None
+    return new_digest, batch.convert_file(path, zone, out_dir, *options)
+
+
+def retry_delay(attempts):
+    """Wartezeit (s) nach dem ``attempts``-ten Fehlversuch."""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+class Watcher:
+    """
+    Fragt ``patterns`` (Verzeichnisse, Glob-Muster, Dateien wie bei batch) alle
+    ``interval`` Sekunden ab und konvertiert neue oder geänderte TRA-Dateien mit
+    batch.convert_file in einem Pool aus ``jobs`` Prozessen.
+    """
+
+    def __init__(self, patterns, zone, out_dir=None, jobs=None, kmz=False, spacing=None,
+                 max_error=None, km_range=None, manifest_path=None, interval=DEFAULT_INTERVAL,
+                 settle=DEFAULT_SETTLE, max_pending=None, tiles=False, fmt=None, track_cache=False):
+        self.patterns = patterns
+        self.zone = zone
+        self.out_dir = out_dir
+        self.jobs = jobs or batch.available_cpus()
+        self.options = (kmz, spacing, max_error, km_range, tiles, fmt, track_cache)
+        self.settings = settings_fingerprint(zone, out_dir, *self.options)
+        self.interval = interval
+        self.settle = settle
+        self.max_pending = max_pending or 2 * self.jobs
+        if manifest_path is None:
+            base = out_dir or (patterns[0] if len(patterns) == 1 and os.path.isdir(patterns[0]) else ".")
+            manifest_path = os.path.join(base, MANIFEST_NAME)
+        self.manifest_path = manifest_path
+        self.manifest = load_manifest(manifest_path)
+        self.queue = deque()
+        self.queued = set()
+        self.running = {}
+        self.last_save = time.monotonic()
+
+    def save(self, force=False):
+        if force or time.monotonic() - self.last_save >= MANIFEST_SAVE_INTERVAL:
+            save_manifest(self.manifest_path, self.manifest)
+            self.last_save = time.monotonic()
+
+    def scan(self):
+        """
+        Sucht neue oder geänderte Dateien und reiht sie in die Warteschlange ein.
+        Gibt die Anzahl neu eingereihter Dateien zurück.
+        """
+        files = batch.collect_inputs(self.patterns)
+        now = time.time()
+        added = 0
+        for path in files:
+            if path in self.queued or path in self.running:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime < self.settle:
+                continue  # wird vermutlich noch geschrieben
+            entry = self.manifest.get(path)
+            same_settings = entry and entry.get("settings") == self.settings
+            unchanged = same_settings and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size
+            if unchanged and ("error" not in entry or now < entry.get("retry_at", 0)):
+                continue
+            # Nach einem Fehler oder mit anderen Einstellungen nicht auf den alten Hash
+            # vergleichen, sondern neu konvertieren
+            digest = entry.get("digest") if same_settings and "error" not in entry else None
+            self.queue.append((path, st.st_mtime_ns, st.st_size, digest))
+            self.queued.add(path)
+            added += 1
+
+        # Gelöschte Dateien aus dem Manifest entfernen (die KML-Dateien bleiben erhalten)
+        existing = set(files)
+        for path in [p for p in self.manifest if p not in existing]:
+            del self.manifest[path]
+        return added
+
+    def submit(self, pool):
+        """Reicht Aufträge aus der Warteschlange ein, solange weniger als max_pending laufen."""
+        while self.queue and len(self.running) < self.max_pending:
+            path, mtime_ns, size, digest = self.queue.popleft()
+            self.queued.discard(path)
+            future = pool.submit(timing.worker_call, convert_if_changed, path, digest, self.zone, self.out_dir,
+                                 *self.options)
+            self.running[future] = (path, mtime_ns, size, digest)
+
+    def collect(self, futures):
+        """
+        Übernimmt fertige Aufträge ins Manifest und gibt die Anzahl der Fehler zurück.
+        Fehlgeschlagene Dateien werden mit Fehler und Zeitpunkt des nächsten Versuchs vermerkt.
+        """
+        failures = 0
+        for future in futures:
+            path, mtime_ns, size, _ = self.running.pop(future)
+            try:
+                digest, result = timing.worker_result(future)
+            except Exception as e:
+                failures += 1
+                previous = self.manifest.get(path) or {}
+                same_file = previous.get("mtime_ns") == mtime_ns and previous.get("size") == size \
+                    and previous.get("settings") == self.settings
+                attempts = previous.get("attempts", 0) + 1 if same_file and "error" in previous else 1
+                delay = retry_delay(attempts)
+                self.manifest[path] = {"mtime_ns": mtime_ns, "size": size, "settings": self.settings,
+                                       "error": str(e), "attempts": attempts, "retry_at": time.time() + delay}
+                print(f"FEHLER {path}: {e} (neuer Versuch in {delay:.0f} s)")
+                continue
+            if result is None:
+                # Nur berührt, Inhalt unverändert
+                self.manifest[path] = dict(self.manifest.get(path, {}), mtime_ns=mtime_ns, size=size)
+                continue
+            outfile, count, seconds = result
+            self.manifest[path] = {"mtime_ns": mtime_ns, "size": size, "settings": self.settings,
+                                   "digest": digest, "output": outfile}
+            print(f"OK     {path} -> {outfile} ({count} Punkte, {seconds:.3f} s)")
+        if futures:
+            self.save()
+        return failures
+
+    def run(self, once=False):
+        """
+        Überwacht, bis mit Strg+C (oder SIGTERM) abgebrochen wird. Mit ``once`` wird nur einmal
+        abgefragt und nach dem Abarbeiten aller gefundenen Dateien beendet.
+        Gibt die Anzahl der fehlgeschlagenen Konvertierungen zurück.
+        """
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        projections.get_gk_crs(self.zone)  # ungültige Zonen vor dem Start abweisen
+        if self.out_dir:
+            os.makedirs(self.out_dir, exist_ok=True)
+        print(f"Überwache {', '.join(self.patterns)} mit {self.jobs} Prozess(en), "
+              f"Manifest: {self.manifest_path}")
+
+        def terminate(signum, frame):
+            raise KeyboardInterrupt
+        signal.signal(signal.SIGTERM, terminate)
+
+        failures = 0
+        next_scan = 0.0
+        scanned = False
+        try:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                while True:
+                    if not (once and scanned) and time.monotonic() >= next_scan:
+                        added = self.scan()
+                        if added:
+                            print(f"{added} neue oder geänderte Datei(en) gefunden.")
+                        next_scan = time.monotonic() + self.interval
+                        scanned = True
+                    self.submit(pool)
+                    if once and not self.running and not self.queue:
+                        break
+                    timeout = max(next_scan - time.monotonic(), 0.0) if not once else None
+                    if self.running:
+                        done, _ = wait(list(self.running), timeout=timeout, return_when=FIRST_COMPLETED)
+                        failures += self.collect(done)
+                    else:
+                        time.sleep(timeout or 0.0)
+        except KeyboardInterrupt:
+            print("Überwachung beendet.")
+        self.save(force=True)
+        return failures
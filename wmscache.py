@@ -0,0 +1,235 @@
+"""
+Zwischenspeicher für WMS-Kartenbilder.
+
+Abgerufene Karten werden dekodiert in einem kleinen LRU im Speicher und als PNG
+in einem größenbegrenzten Verzeichnis auf der Platte abgelegt. Der Schlüssel
+ergibt sich aus Dienst-URL, Layer, normalisierter Bounding Box und Bildgröße;
+ein erneuter Besuch desselben Ausschnitts benötigt daher kein Netzwerk.
+
+requests und PIL werden erst bei der ersten Sitzung bzw. dem ersten Bild geladen.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import timing
+
+DEFAULT_WMS_URL = "https://ows.terrestris.de/osm/service"
+DEFAULT_LAYER = "OSM-WMS"
+
+# Bounding-Box-Koordinaten werden auf 1e-7 Grad (ca. 1 cm) gerundet
+BBOX_DECIMALS = 7
+
+DEFAULT_MAX_DISK_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_MEMORY_ITEMS = 32
+
+
+def default_cache_dir():
+    """Cache-Verzeichnis: $TRATOKML_CACHE_DIR oder das Benutzer-Cacheverzeichnis des Systems."""
+    if os.environ.get("TRATOKML_CACHE_DIR"):
+        return os.path.join(os.environ["TRATOKML_CACHE_DIR"], "wms")
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "TRAtoKML", "wms")
+
+
+def normalize_bbox(bbox):
+    """Rundet (min_lon, min_lat, max_lon, max_lat), damit gleiche Ausschnitte denselben Schlüssel ergeben."""
+    return tuple(round(float(v), BBOX_DECIMALS) for v in bbox)
+
+
+class WMSCache:
+    """
+    Holt WMS-GetMap-Bilder über eine gepoolte requests.Session und speichert sie
+    im Speicher (LRU dekodierter Bilder) und auf der Platte (PNG, größenbegrenzt).
+    ``base_url`` kann auf einen lokalen Ersatzdienst zeigen.
+    """
+
+    def __init__(self, base_url=DEFAULT_WMS_URL, layer=DEFAULT_LAYER, cache_dir=None,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES, max_memory_items=DEFAULT_MAX_MEMORY_ITEMS,
+                 session=None, timeout=30):
+        self.base_url = base_url
+        self.layer = layer
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_items = max_memory_items
+        self.timeout = timeout
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._approx_disk_bytes = None  # Schätzung der Verzeichnisgröße, siehe _account_disk
+
+        self._session = session
+
+    @property
+    def session(self):
+        """Gepoolte requests.Session; wird beim ersten Abruf angelegt."""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def cache_key(self, bbox, width, height):
+        bbox = normalize_bbox(bbox)
+        raw = f"{self.base_url}|{self.layer}|{bbox}|{int(width)}x{int(height)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def get_map(self, bbox, width, height):
+        """
+        Gibt das Kartenbild für ``bbox`` = (min_lon, min_lat, max_lon, max_lat) in EPSG:4326
+        als PIL-Image zurück. Das Bild ist eine Kopie und darf bemalt werden.
+        """
+        key = self.cache_key(bbox, width, height)
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                return image.copy()
+
+        data = self._read_disk(key)
+        image = None
+        if data is not None:
+            try:
+                image = self._decode(data, width, height)
+            except OSError:
+                self._remove_disk(key)  # beschädigter Eintrag: neu abrufen
+        if image is None:
+            with timing.stage("wms_fetch") as st:
+                data = self._fetch(normalize_bbox(bbox), width, height)
+                st.add(bytes=len(data))
+            try:
+                image = self._decode(data, width, height)
+            except OSError as e:
+                raise ValueError(f"WMS-Antwort ist kein lesbares Bild: {e}") from e
+            # Erst nach erfolgreichem Dekodieren ablegen, damit keine Fehlerseiten im Cache landen
+            self._write_disk(key, data)
+
+        with self._lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+        return image.copy()
+
+    @staticmethod
+    def _decode(data, width, height):
+        from PIL import Image
+        with timing.stage("png_decode", pixels=int(width) * int(height)):
+            image = Image.open(BytesIO(data))
+            image.load()
+        return image
+
+    def _fetch(self, bbox, width, height):
+        min_lon, min_lat, max_lon, max_lat = bbox
+        params = {
+            "service": "WMS",
+            "version": "1.1.1",
+            "request": "GetMap",
+            "layers": self.layer,
+            "styles": "",
+            "format": "image/png",
+            "transparent": "true",
+            "srs": "EPSG:4326",
+            "bbox": f"{min_lon},{min_lat},{max_lon},{max_lat}",
+            "width": int(width),
+            "height": int(height),
+        }
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        # Fehler meldet WMS oft mit Status 200 als XML (ServiceException)
+        content_type = response.headers.get("Content-Type", "")
+        if not content_type.lower().startswith("image/"):
+            snippet = response.text[:200].strip() if content_type.lower().startswith(("text/", "application/")) else ""
+            raise ValueError(f"WMS lieferte kein Bild (Content-Type: {content_type or 'unbekannt'}). {snippet}".strip())
+        return response.content
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # Zugriffszeitpunkt für die LRU-Verdrängung
+        except OSError:
+            pass
+        return data
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _write_disk(self, key, data):
+        if self.max_disk_bytes <= 0:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"WMS-Cache konnte nicht geschrieben werden: {e}")
+            return
+        self._account_disk(len(data))
+
+    def _account_disk(self, nbytes):
+        """
+        Führt die geschätzte Verzeichnisgröße nach und verdrängt erst, wenn die Schätzung
+        die Obergrenze überschreitet (wie trackcache.TrackCache._account).
+        """
+        with self._disk_lock:
+            if self._approx_disk_bytes is None:
+                self._approx_disk_bytes = self._evict_disk()
+            self._approx_disk_bytes += nbytes
+            if self._approx_disk_bytes > self.max_disk_bytes:
+                self._approx_disk_bytes = self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Löscht die am längsten nicht benutzten Einträge, bis die Größenobergrenze
+        eingehalten ist, und gibt die verbleibende Gesamtgröße zurück.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_disk_bytes:
+            return total
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+        return total
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()